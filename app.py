@@ -1,34 +1,201 @@
-from flask import Flask, jsonify
+from flask import Flask, Blueprint, jsonify
 from flask_cors import CORS
 from config import Config
 from backend.models import init_db
-from backend.models import get_bnpl_records, insert_bnpl_record, clear_bnpl_records, get_user_salary, update_user_salary, get_user_profile, update_user_profile, update_bnpl_status, get_bnpl_record_by_id, is_gmail_message_processed
-from backend.finance import calculate_analysis, calculate_affordability
-from backend.gmail_service import create_flow, get_gmail_service, fetch_gmail_messages, get_user_email
-from flask import redirect, session, request
-from backend.gmail_service import get_credentials_from_session
-from backend.parser import parse_bnpl_email, is_bnpl_email
+from backend.models import get_bnpl_records, iter_bnpl_records, get_user_salary, update_user_salary, get_user_profile, update_user_profile, update_bnpl_status, get_bnpl_record_by_id
+from backend.models import update_bnpl_statuses
+from backend.models import verify_user_aggregates, get_score_totals, get_dashboard_data, normalize_date_param, BnplRecord
+from backend.models import purge_expired_sessions, fold_duplicate_records, DEFAULT_SALARY
+from backend.models import link_account, get_linked_accounts, unlink_account
+from backend.models import get_profiled_user_hashes, set_user_profiling
+from backend.finance import calculate_analysis, build_analysis, calculate_what_if
+from backend.gmail_service import create_flow, get_gmail_service, get_user_email
+from flask import redirect, session, request, Response, g, send_file, current_app
+from backend.gmail_service import get_credentials_from_session, credentials_to_dict, credentials_from_dict
+from backend.gmail_service import seal_credentials, open_credentials
+from backend.sync import sync_accounts
+from backend.export import export_chunks, gzip_chunks, EXPORT_FORMATS
+from backend.ingest import ingest_messages, iter_archive_messages, iter_mbox_messages
+from backend.archive import start_archive_compactor, run_compaction
+from backend.schedule import project_cash_flow
+from backend.calendar_index import upcoming_dues_total, total_due_between, next_dues, DEFAULT_WINDOW_DAYS
+from backend.snapshot import get_financial_snapshot
+from backend.response_cache import cached_per_user
+from backend.session_store import SqliteSessionInterface
+from backend.logging_setup import setup_logging, get_logger, bind_context, current_request_id, user_hash
+from backend.metrics import observe_request, render_metrics
+from backend.profiling import install_profiling, is_admin_request, list_profiles, profile_path, profile_summary, SUMMARY_SORTS
+from backend.profiling import forget_profiled_users, USER_HASH_PATTERN
 import os
-from dotenv import load_dotenv
+import json
+import time
+import uuid
+from datetime import date
+import base64
+import itertools
+import click
 
-load_dotenv()
+# NumPy-backed modules (backend.simulation, backend.scoring) and the Google
+# client libraries (inside backend.gmail_service) are imported on first use,
+# so a fresh worker only pays for what it actually serves.
 
-app = Flask(__name__)
-# Configure CORS origins from environment (comma-separated) so production frontend can be allowed
-cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
-CORS(app, supports_credentials=True, origins=cors_origins)
+app_log = get_logger("app")
+sync_log = get_logger("sync")
+
+# Routes, request hooks and CLI commands; create_app() puts them on an app
+bp = Blueprint("bnpl", __name__, cli_group=None)
 
 # Frontend URL for redirects (set in production to your GitHub Pages or deployed frontend)
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
-app.secret_key = os.getenv("SECRET_KEY", "default-secret-key-change-in-production")
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
+# Upper bound for ?limit= on /api/bnpl/records
+MAX_RECORDS_PAGE_SIZE = 500
+
+# Upper bound for the number of records in one bulk status update
+MAX_BULK_STATUS_UPDATES = 500
+
+BNPL_STATUSES = ("active", "paid")
+
+# Bounds for /api/simulation/stress
+MAX_SIMULATION_MONTHS = 36
+MAX_SIMULATION_SCENARIOS = 100000
+
+# Longest horizon for /api/cashflow/projection
+MAX_PROJECTION_MONTHS = 60
+
+# Sections /api/dashboard can return (all by default)
+DASHBOARD_FIELDS = ["profile", "records", "analysis", "affordability"]
+
+# Most candidates (and purchases per candidate) in one what-if request
+MAX_WHAT_IF_CANDIDATES = 100
+
+# Bounds for the upcoming-dues window and the "next K dues" list
+MAX_WINDOW_DAYS = 366
+MAX_NEXT_DUES = 100
+
+
+def create_app(config=Config):
+    """
+    Build the Flask app: logging, schema migrations (a no-op once the
+    database is current), CORS, profiling hooks, the archive compactor
+    and all routes. Gunicorn runs it as "app:create_app()".
+    """
+    setup_logging(config.LOG_LEVEL, config.LOG_FORMAT, config.LOG_DEBUG_RATE)
+    init_db()
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.secret_key = config.SECRET_KEY or "default-secret-key-change-in-production"
+    # The cookie holds only a session id; the session itself is kept in SQLite
+    app.session_interface = SqliteSessionInterface(config.SESSION_CACHE_SECONDS)
+
+    # Configure CORS origins from environment (comma-separated) so production frontend can be allowed
+    cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
+    CORS(app, supports_credentials=True, origins=cors_origins)
+
+    # Per-request cProfile capture (opt-in; no hooks are registered unless configured)
+    install_profiling(app, config.PROFILE_DIR, config.PROFILE_MAX_FILES, config.PROFILING_TOKEN, config.PROFILE_USER_HASHES)
+
+    # Move old paid records to the archive table in the background (opt-in)
+    if config.ARCHIVE_COMPACTION_INTERVAL > 0:
+        start_archive_compactor(config.ARCHIVE_COMPACTION_INTERVAL, config.ARCHIVE_MIN_AGE_DAYS)
+
+    app.register_blueprint(bp)
+    return app
+
+
+@bp.before_app_request
+def bind_log_context():
+    """Correlation id for every log record of this request (X-Request-ID if the caller sent one)"""
+    g.request_started = time.perf_counter()
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    bind_context(request_id[:64], session.get("user_email"))
+
+@bp.after_app_request
+def add_request_id_header(response):
+    response.headers["X-Request-ID"] = current_request_id() or ""
+    if "request_started" in g:
+        observe_request(request.endpoint, request.method, response.status_code, time.perf_counter() - g.request_started)
+    return response
+
+@bp.route("/api/admin/profiles")
+def admin_profiles():
+    """
+    Recent request profiles, newest first (bearer PROFILING_TOKEN).
+    Query params:
+    - limit: how many to list (default 50)
+    """
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({"profiles": list_profiles(max(1, limit))})
+
+@bp.route("/api/admin/profiles/<profile_id>")
+def admin_profile_download(profile_id):
+    """
+    Download one profile as a pstats file (open with pstats/snakeviz).
+    Query params:
+    - format=text: a pstats report instead, with sort=cumulative|tottime|calls
+    """
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    
+    path = profile_path(profile_id)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    
+    if request.args.get("format") == "text":
+        sort = request.args.get("sort", "cumulative")
+        if sort not in SUMMARY_SORTS:
+            return jsonify({"error": f"sort must be one of {', '.join(SUMMARY_SORTS)}"}), 400
+        return Response(profile_summary(profile_id, sort=sort), mimetype="text/plain")
+    
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True, download_name=f"{profile_id}.prof")
 
-@app.route("/api/health")
+@bp.route("/api/admin/profiled-users")
+def admin_profiled_users():
+    """User hashes whose requests are always profiled: switched on at runtime, and from PROFILE_USER_HASHES"""
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    
+    return jsonify({"user_hashes": get_profiled_user_hashes(), "configured": Config.PROFILE_USER_HASHES})
+
+@bp.route("/api/admin/profiled-users/<user_hash_value>", methods=["PUT", "DELETE"])
+def admin_toggle_profiled_user(user_hash_value):
+    """
+    Switch always-on profiling of one user's requests on (PUT) or off (DELETE),
+    by the user hash the logs show. Every worker picks it up within seconds.
+    """
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    if not USER_HASH_PATTERN.match(user_hash_value):
+        return jsonify({"error": "Expected a 12-digit hex user hash"}), 400
+    
+    enabled = request.method == "PUT"
+    changed = set_user_profiling(user_hash_value, enabled)
+    forget_profiled_users()
+    return jsonify({"user_hash": user_hash_value, "profiled": enabled, "changed": changed})
+
+@bp.route("/api/metrics")
+def metrics():
+    """
+    Prometheus text exposition of the app's metrics (all gunicorn workers
+    when PROMETHEUS_MULTIPROC_DIR is set). Requires METRICS_TOKEN as a
+    bearer token when that is configured.
+    """
+    if Config.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {Config.METRICS_TOKEN}":
+        return jsonify({"error": "Forbidden"}), 403
+    
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@bp.route("/api/health")
 def health():
     return jsonify({"status": "ok"})
 
-@app.route("/api/user/email")
+@bp.route("/api/user/email")
 def get_current_user_email():
     """Get authenticated user's email"""
     creds = get_credentials_from_session(session)
@@ -41,7 +208,8 @@ def get_current_user_email():
         return jsonify({"email": user_email})
     return jsonify({"error": "Could not fetch user email"}), 500
 
-@app.route("/api/user/salary", methods=["GET", "POST"])
+@bp.route("/api/user/salary", methods=["GET", "POST"])
+@cached_per_user
 def user_salary():
     """Get or update user salary"""
     if "user_email" not in session:
@@ -58,7 +226,8 @@ def user_salary():
     salary = get_user_salary(user_email)
     return jsonify({"salary": salary})
 
-@app.route("/api/user/profile", methods=["GET", "POST", "PUT"])
+@bp.route("/api/user/profile", methods=["GET", "POST", "PUT"])
+@cached_per_user
 def user_profile():
     """Get or update user profile"""
     if "user_email" not in session:
@@ -86,8 +255,8 @@ def user_profile():
                 "message": "Profile updated successfully",
                 "data": data
             })
-        except Exception as e:
-            print(f"[Profile] ERROR: {e}")
+        except Exception:
+            app_log.exception("Profile update failed")
             return jsonify({
                 "success": False,
                 "message": "Failed to update profile"
@@ -114,18 +283,53 @@ def user_profile():
             }
         })
 
-@app.route("/api/emails/sync")
+def credentials_secret():
+    """Secret the stored credentials of linked accounts are encrypted with"""
+    return Config.CREDENTIALS_KEY or current_app.secret_key
+
+def linked_sync_accounts(user_email):
+    """
+    Accounts for sync_accounts: every Gmail account linked to user_email.
+    The login account syncs with the session's credentials, and is linked
+    (again) when its stored credentials are missing or can't be decrypted.
+    Other accounts whose credentials can't be decrypted are left out until
+    they are linked again.
+    """
+    secret = credentials_secret()
+    linked = get_linked_accounts(user_email)
+    if "credentials" in session and not any(
+        account["account_email"] == user_email and open_credentials(account["credentials"], secret)
+        for account in linked
+    ):
+        link_account(user_email, user_email, seal_credentials(session["credentials"], secret))
+        linked = get_linked_accounts(user_email)
+
+    accounts = []
+    for account in linked:
+        if account["account_email"] == user_email and "credentials" in session:
+            # Carries a current access token, so no refresh is needed
+            credentials = session["credentials"]
+        else:
+            credentials = open_credentials(account["credentials"], secret)
+        if credentials is None:
+            sync_log.warning("Linked account skipped: credentials unreadable", extra={
+                "account": user_hash(account["account_email"])
+            })
+            continue
+        accounts.append(dict(account, credentials=credentials_from_dict(credentials)))
+    return accounts
+
+@bp.route("/api/emails/sync")
 def sync_emails():
     """
     Fetch Gmail messages, parse BNPL data with STRICT filtering, and store in database.
     Now with idempotent syncing - prevents duplicate records from re-processed emails.
+    Syncs every linked Gmail account concurrently into the user's one set of records.
     """
-    print("[Sync] Starting IDEMPOTENT email sync with STRICT filtering...")
-    
     creds = get_credentials_from_session(session)
     
     if not creds:
-        print("[Sync] ERROR: Not authenticated")
+        sync_log.warning("Sync rejected: not authenticated")
         return jsonify({
             "success": False,
             "message": "Not authenticated. Please login again.",
@@ -135,146 +339,356 @@ def sync_emails():
     # Get user email
     user_email = get_user_email(creds)
     if not user_email:
-        print("[Sync] ERROR: Could not fetch user email")
+        sync_log.error("Sync failed: could not fetch user email")
         return jsonify({
             "success": False,
             "message": "Could not fetch user email. Please try again.",
             "data": None
         }), 500
     
-    print(f"[Sync] User email: {user_email}")
     session["user_email"] = user_email
+    bind_context(current_request_id(), user_email)
     
-    # Fetch Gmail messages
-    success, messages, error = fetch_gmail_messages(creds, max_results=50)
+    # Run the pipeline to completion; /api/emails/sync/stream reports the same events live
+    result = None
+    accounts = linked_sync_accounts(user_email)
+    for event in sync_accounts(user_email, accounts, max_results=50,
+                               calls_per_second=Config.GMAIL_ACCOUNT_CALLS_PER_SECOND):
+        if event["stage"] in ("complete", "error"):
+            result = event
     
-    if not success:
-        print(f"[Sync] ERROR: Gmail API failed - {error}")
+    if result["stage"] == "error":
         return jsonify({
             "success": False,
-            "message": f"Failed to fetch emails: {error}",
+            "message": result["message"],
             "data": None
         }), 500
     
-    if not messages:
-        print("[Sync] No messages found")
+    data = {key: result[key] for key in ("synced_count", "bnpl_count", "filtered_count", "skipped_count", "folded_count")}
+    data["accounts"] = result["accounts"]
+    
+    if not data["synced_count"]:
         return jsonify({
             "success": True,
             "message": "No BNPL-related emails found in your inbox.",
-            "data": {
-                "synced_count": 0,
-                "bnpl_count": 0,
-                "filtered_count": 0,
-                "skipped_count": 0
-            }
+            "data": data
         })
     
-    print(f"[Sync] Processing {len(messages)} messages with IDEMPOTENT + STRICT filtering...")
+    return jsonify({
+        "success": True,
+        "message": f"Successfully synced {data['bnpl_count']} new BNPL transactions from {data['synced_count']} emails. Skipped {data['skipped_count']} already processed, merged {data['folded_count']} repeat reminders, filtered out {data['filtered_count']} non-financial emails.",
+        "data": data
+    })
+
+@bp.route("/api/emails/sync/stream")
+def sync_emails_stream():
+    """
+    Same sync as /api/emails/sync, streamed as Server-Sent Events while it runs:
+    listed, fetched (k/n), parsed, stored (with the record, already committed),
+    folded, skipped, filtered, fetch_failed, account_error, and finally
+    complete or error. Every event names its linked account; the accounts'
+    events are interleaved as they sync concurrently.
+    If the client disconnects, the sync stops at the next event.
+    """
+    creds = get_credentials_from_session(session)
+    if not creds:
+        sync_log.warning("Sync rejected: not authenticated")
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    user_email = get_user_email(creds)
+    if not user_email:
+        sync_log.error("Sync failed: could not fetch user email")
+        return jsonify({"error": "Could not fetch user email"}), 500
     
-    # Parse and store BNPL records with idempotent logic
-    bnpl_count = 0
-    filtered_count = 0
-    skipped_count = 0
+    session["user_email"] = user_email
+    request_id = current_request_id()
+    accounts = linked_sync_accounts(user_email)
     
-    for msg in messages:
-        gmail_message_id = msg["id"]
-        sender = msg["sender"]
-        subject = msg["subject"]
-        body = msg["body"]
+    def generate():
+        # The body is produced after the request hooks have run
+        bind_context(request_id, user_email)
+        events = sync_accounts(user_email, accounts, max_results=50,
+                               calls_per_second=Config.GMAIL_ACCOUNT_CALLS_PER_SECOND)
+        try:
+            for event in events:
+                yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            # Closed by the server when the client goes away; stops the pipeline too
+            events.close()
+    
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Don't let a reverse proxy buffer the events
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+def encode_records_cursor(record):
+    """Opaque keyset cursor for the record after which the next page starts"""
+    raw = f"{record['created_at']}|{record['id']}".encode("utf-8")  # BnplRecord or projected dict
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_records_cursor(token):
+    """Inverse of encode_records_cursor -> (created_at, id)"""
+    raw = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+    created_at, record_id = raw.rsplit("|", 1)
+    return created_at, int(record_id)
+
+@bp.route("/api/bnpl/records")
+@cached_per_user
+def bnpl_records():
+    """
+    Get BNPL records for authenticated user, newest first.
+    Query params:
+    - status: 'active', 'paid', or None for all
+    - vendor: exact vendor name
+    - due_from / due_to: inclusive due-date range (DD/MM/YYYY or YYYY-MM-DD)
+    - limit: page size (max 500); omit to get every record
+    - cursor: next_cursor from the previous page
+    - fields: comma-separated subset of columns (id and created_at are
+      always included when paginating, since the cursor is built from them)
+    The JSON body is streamed row by row.
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    user_email = session["user_email"]
+    status_filter = request.args.get("status")  # Can be 'active', 'paid', or None
+    
+    try:
+        limit = request.args.get("limit", type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_RECORDS_PAGE_SIZE))
         
-        # IDEMPOTENT CHECK: Skip if already processed
-        if is_gmail_message_processed(user_email, gmail_message_id):
-            skipped_count += 1
-            print(f"[Sync] SKIPPED (already processed): {subject[:50]}... (Gmail ID: {gmail_message_id[:10]}...)")
-            continue
+        cursor = request.args.get("cursor")
+        after = decode_records_cursor(cursor) if cursor else None
         
-        # STRICT VALIDATION: Check if email is from valid financial sender
-        if not is_bnpl_email(sender, subject, body):
-            filtered_count += 1
-            print(f"[Sync] FILTERED OUT: {subject[:50]}... (not from financial sender)")
-            continue
+        fields = None
+        if request.args.get("fields"):
+            fields = [f.strip() for f in request.args["fields"].split(",") if f.strip()]
+            if limit:
+                fields += [f for f in ("id", "created_at") if f not in fields]
         
-        # Parse the email
-        parsed = parse_bnpl_email(sender, subject, body)
+        records = iter_bnpl_records(
+            user_email,
+            status_filter=status_filter,
+            vendor=request.args.get("vendor"),
+            due_from=request.args.get("due_from"),
+            due_to=request.args.get("due_to"),
+            after=after,
+            limit=limit,
+            fields=fields
+        )
+        # Prime the generator so bad filters fail here, not mid-stream
+        first = next(records, None)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+    
+    def generate():
+        count = 0
+        last = None
+        yield '{"records": ['
+        if first is not None:
+            for record in itertools.chain([first], records):
+                payload = record.as_dict() if isinstance(record, BnplRecord) else record
+                yield ("," if count else "") + json.dumps(payload)
+                count += 1
+                last = record
         
-        # Only store if we found amount (critical field)
-        if parsed["amount"]:
-            # Insert with Gmail message ID for idempotent sync
-            success = insert_bnpl_record(
-                user_email=user_email,
-                gmail_message_id=gmail_message_id,
-                vendor=parsed["vendor"],
-                amount=parsed["amount"],
-                installments=parsed["installments"] or 1,
-                due_date=parsed["due_date"],
-                email_subject=subject
-            )
-            
-            if success:
-                bnpl_count += 1
-                print(f"[Sync] ✓ Stored: {parsed['vendor']} - ₹{parsed['amount']} ({parsed['installments']} EMI) Due: {parsed['due_date']} (Gmail ID: {gmail_message_id[:10]}...)")
+        next_cursor = encode_records_cursor(last) if limit and count == limit else None
+        yield f'], "count": {count}, "next_cursor": {json.dumps(next_cursor)}}}'
+    
+    return Response(generate(), mimetype="application/json")
+
+@bp.route("/api/ingest/mailbox", methods=["POST"])
+def ingest_mailbox():
+    """
+    Import BNPL records from uploaded mail archives (multipart field "file",
+    repeatable): mbox files, or single .eml messages. Messages already
+    imported or synced are skipped, so re-uploading an archive is harmless.
+    Uploads over INGEST_MAX_UPLOAD_MB are rejected with 413.
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    uploads = request.files.getlist("file")
+    if not uploads:
+        return jsonify({"error": "Upload one or more mailbox files as 'file'"}), 400
+    
+    user_email = session["user_email"]
+    
+    def messages():
+        for upload in uploads:
+            if (upload.filename or "").lower().endswith(".eml"):
+                yield upload.stream.read()
             else:
-                skipped_count += 1
-                print(f"[Sync] SKIPPED (duplicate): {subject[:50]}... (Gmail ID: {gmail_message_id[:10]}...)")
-        else:
-            filtered_count += 1
-            print(f"[Sync] FILTERED OUT: {subject[:50]}... (no valid amount found)")
+                yield from iter_mbox_messages(upload.stream)
     
-    print(f"[Sync] Complete! Stored {bnpl_count} new BNPL records, skipped {skipped_count} already processed, filtered out {filtered_count} non-financial emails")
+    result = ingest_messages(user_email, messages(), workers=Config.INGEST_WORKERS)
     
     return jsonify({
         "success": True,
-        "message": f"Successfully synced {bnpl_count} new BNPL transactions from {len(messages)} emails. Skipped {skipped_count} already processed, filtered out {filtered_count} non-financial emails.",
-        "data": {
-            "synced_count": len(messages),
-            "bnpl_count": bnpl_count,
-            "filtered_count": filtered_count,
-            "skipped_count": skipped_count
-        }
+        "message": f"Imported {result['bnpl_count']} new BNPL transactions from {result['message_count']} emails. Skipped {result['skipped_count']} already imported, merged {result['folded_count']} repeat reminders, filtered out {result['filtered_count']} non-financial emails.",
+        "data": result
     })
 
-@app.route("/api/bnpl/records")
-def bnpl_records():
+@bp.route("/api/bnpl/export")
+def export_bnpl_records():
     """
-    Get all BNPL records for authenticated user.
+    Download the user's BNPL history (including archived records), streamed
+    straight from the database so memory use doesn't grow with history size.
     Query params:
-    - status: 'active', 'paid', or None for all
+    - format: 'ndjson' (default) or 'csv'
+    - status: 'active' or 'paid' (default: all)
+    - vendor: exact vendor name
+    - due_from / due_to: inclusive due-date range (DD/MM/YYYY or YYYY-MM-DD)
+    - created_from / created_to: inclusive range of the date the record was created
+    - gzip=1: gzip the body (sent as Content-Encoding when the client accepts gzip)
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    status_filter = request.args.get("status")
+    if status_filter and status_filter not in BNPL_STATUSES:
+        return jsonify({"error": f"status must be one of {', '.join(BNPL_STATUSES)}"}), 400
+    
+    try:
+        records = iter_bnpl_records(
+            session["user_email"],
+            status_filter=status_filter,
+            vendor=request.args.get("vendor"),
+            due_from=request.args.get("due_from"),
+            due_to=request.args.get("due_to"),
+            created_from=request.args.get("created_from"),
+            created_to=request.args.get("created_to")
+        )
+        # Prime the generator so bad filters fail here, not mid-stream
+        first = next(records, None)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+    
+    rows = itertools.chain([first], records) if first is not None else iter(())
+    body = export_chunks(rows, fmt)
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    compress = request.args.get("gzip") == "1" and "gzip" in request.accept_encodings
+    if compress:
+        body = gzip_chunks(body)
+    
+    response = Response(body, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=bnpl-records-{date.today().isoformat()}.{extension}"
+    response.headers["Vary"] = "Accept-Encoding"
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+@bp.route("/api/dashboard")
+@cached_per_user
+def dashboard():
+    """
+    Profile, active records, analysis and affordability in one payload.
+    Profile and records are read in a single transaction; analysis and
+    affordability come from the shared financial snapshot.
+    Query params:
+    - fields: comma-separated subset of profile, records, analysis, affordability
     """
     if "user_email" not in session:
         return jsonify({"error": "Not authenticated"}), 401
     
     user_email = session["user_email"]
-    status_filter = request.args.get("status")  # Can be 'active', 'paid', or None
     
-    records = get_bnpl_records(user_email, status_filter=status_filter)
+    fields = DASHBOARD_FIELDS
+    if request.args.get("fields"):
+        fields = [f.strip() for f in request.args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in DASHBOARD_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
     
-    return jsonify({
-        "records": records,
-        "count": len(records)
-    })
+    data = get_dashboard_data(user_email)
+    profile = data["profile"]
+    records = data["records"]
+    result = {}
+    
+    if "profile" in fields:
+        result["profile"] = profile
+    if "records" in fields:
+        result["records"] = [record.as_dict() for record in records]
+    
+    if "analysis" in fields or "affordability" in fields:
+        # The same numbers /api/risk-score and /api/affordability report
+        snapshot = get_financial_snapshot(user_email)
+        
+        if "analysis" in fields:
+            result["analysis"] = snapshot["analysis"]
+        if "affordability" in fields:
+            # Same as /api/affordability: needs a saved profile
+            result["affordability"] = snapshot["affordability"] if profile else None
+    
+    return jsonify(result)
 
-@app.route("/api/risk-score")
+@bp.route("/api/risk-score")
+@cached_per_user
 def risk_score():
     """
     Calculate and return risk analysis.
+    Query params:
+    - window_days: look-ahead for upcoming_dues (default 30)
     """
     if "user_email" not in session:
         return jsonify({"error": "Not authenticated"}), 401
     
     user_email = session["user_email"]
     
-    # Get user salary
-    salary = get_user_salary(user_email)
-    
-    # Get BNPL records
-    records = get_bnpl_records(user_email)
+    window_days = request.args.get("window_days", DEFAULT_WINDOW_DAYS, type=int)
+    if not 1 <= window_days <= MAX_WINDOW_DAYS:
+        return jsonify({"error": f"window_days must be between 1 and {MAX_WINDOW_DAYS}"}), 400
     
-    # Calculate analysis
-    analysis = calculate_analysis(salary, records)
+    # Shared with /api/affordability and mark-paid; recomputed only after the user's next write
+    analysis = get_financial_snapshot(user_email, window_days)["analysis"]
     
     return jsonify(analysis)
 
-@app.route("/api/affordability")
+@bp.route("/api/upcoming-dues")
+@cached_per_user
+def upcoming_dues():
+    """
+    Installments coming due, from the user's due-date calendar.
+    Query params:
+    - window_days: total due after today within this many days (default 30)
+    - from / to: explicit inclusive date range instead of window_days
+    - limit: how many of the next dues to list (default 5, max 100)
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    user_email = session["user_email"]
+    window_days = request.args.get("window_days", DEFAULT_WINDOW_DAYS, type=int)
+    limit = request.args.get("limit", 5, type=int)
+    
+    if not 1 <= window_days <= MAX_WINDOW_DAYS or not 0 <= limit <= MAX_NEXT_DUES:
+        return jsonify({"error": f"window_days must be 1-{MAX_WINDOW_DAYS} and limit 0-{MAX_NEXT_DUES}"}), 400
+    
+    if request.args.get("from") or request.args.get("to"):
+        try:
+            start = date.fromisoformat(normalize_date_param(request.args.get("from") or date.today().isoformat()))
+            end = date.fromisoformat(normalize_date_param(request.args["to"]))
+        except (KeyError, ValueError):
+            return jsonify({"error": "from/to must be dates (DD/MM/YYYY or YYYY-MM-DD); to is required"}), 400
+        total = total_due_between(user_email, start, end)
+        result = {"from": start.isoformat(), "to": end.isoformat()}
+    else:
+        total = upcoming_dues_total(user_email, window_days)
+        result = {"window_days": window_days}
+    
+    result["total_due"] = round(total, 2)
+    result["next_dues"] = next_dues(user_email, limit)
+    return jsonify(result)
+
+@bp.route("/api/affordability")
+@cached_per_user
 def affordability():
     """
     Calculate affordability capacity for the user.
@@ -284,8 +698,52 @@ def affordability():
     
     user_email = session["user_email"]
     
-    # Get user profile
-    profile = get_user_profile(user_email)
+    snapshot = get_financial_snapshot(user_email)
+    if not snapshot["profile"]:
+        return jsonify({"error": "User profile not found"}), 404
+    
+    return jsonify(snapshot["affordability"])
+
+@bp.route("/api/affordability/what-if", methods=["POST"])
+def affordability_what_if():
+    """
+    Risk and affordability if hypothetical purchases were added.
+    Body: {"amount": 12000, "installments": 6}
+       or {"candidates": [{"amount": 12000, "installments": 6, "label": "Phone"},
+                          {"purchases": [{...}, {...}], "label": "Phone + laptop"}, ...]}
+    Each candidate is evaluated on its own against the current obligations;
+    a candidate with "purchases" applies all of them together.
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    user_email = session["user_email"]
+    data = request.get_json(silent=True) or {}
+    
+    candidates = data.get("candidates", [data] if "amount" in data else [])
+    if not isinstance(candidates, list) or not candidates:
+        return jsonify({"error": "No candidate purchases provided"}), 400
+    if len(candidates) > MAX_WHAT_IF_CANDIDATES:
+        return jsonify({"error": f"At most {MAX_WHAT_IF_CANDIDATES} candidates per request"}), 400
+    
+    scenarios = []
+    for candidate in candidates:
+        try:
+            items = candidate.get("purchases", [candidate])
+            if not isinstance(items, list) or not items or len(items) > MAX_WHAT_IF_CANDIDATES:
+                raise ValueError
+            purchases = [
+                {"amount": float(item["amount"]), "installments": int(item.get("installments", 1))}
+                for item in items
+            ]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({"error": "Each purchase needs a numeric amount and installments"}), 400
+        if any(p["amount"] <= 0 or p["installments"] <= 0 for p in purchases):
+            return jsonify({"error": "Amount and installments must be positive"}), 400
+        scenarios.append((candidate.get("label"), purchases))
+    
+    snapshot = get_financial_snapshot(user_email)
+    profile = snapshot["profile"]
     if not profile:
         return jsonify({"error": "User profile not found"}), 404
     
@@ -293,21 +751,22 @@ def affordability():
     rent = profile.get("monthly_rent", 0)
     other_expenses = profile.get("other_expenses", 0)
     
-    # Get BNPL records (only active)
-    records = get_bnpl_records(user_email, status_filter="active")
-    
-    # Calculate monthly obligation
-    monthly_bnpl_obligation = 0
-    for record in records:
-        if record["amount"] and record["installments"] and record["installments"] > 0:
-            monthly_bnpl_obligation += record["amount"] / record["installments"]
+    # Baseline totals come from the shared snapshot; candidates are applied as deltas
+    aggregates = snapshot["aggregates"]
     
-    # Calculate affordability
-    affordability_data = calculate_affordability(salary, monthly_bnpl_obligation, rent, other_expenses)
+    results = []
+    for label, purchases in scenarios:
+        result = calculate_what_if(salary, rent, other_expenses, aggregates, purchases)
+        if label is not None:
+            result["label"] = label
+        results.append(result)
     
-    return jsonify(affordability_data)
+    return jsonify({
+        "current": calculate_what_if(salary, rent, other_expenses, aggregates, []),
+        "candidates": results
+    })
 
-@app.route("/api/bnpl/<int:record_id>/mark-paid", methods=["PUT"])
+@bp.route("/api/bnpl/<int:record_id>/mark-paid", methods=["PUT"])
 def mark_bnpl_paid(record_id):
     """
     Mark a BNPL record as paid and recalculate financial metrics.
@@ -323,55 +782,191 @@ def mark_bnpl_paid(record_id):
         return jsonify({"error": "Record not found"}), 404
     
     # Verify ownership
-    if record["user_email"] != user_email:
+    if record.user_email != user_email:
         return jsonify({"error": "Unauthorized"}), 403
     
     # Update status to paid
     try:
         update_bnpl_status(record_id, "paid")
-        print(f"[Mark Paid] Record {record_id} marked as paid by {user_email}")
-    except Exception as e:
-        print(f"[Mark Paid] ERROR: {e}")
+        app_log.info("Record marked as paid", extra={"record_id": record_id})
+    except Exception:
+        app_log.exception("Mark paid failed", extra={"record_id": record_id})
         return jsonify({"error": "Failed to update record"}), 500
     
-    # Recalculate financial metrics
-    profile = get_user_profile(user_email)
-    salary = profile.get("salary", 30000)
-    rent = profile.get("monthly_rent", 0)
-    other_expenses = profile.get("other_expenses", 0)
+    analysis, affordability_data = recalculate_financials(user_email)
     
-    # Get updated BNPL records (only active)
-    records = get_bnpl_records(user_email, status_filter="active")
+    return jsonify({
+        "success": True,
+        "message": "Payment recorded successfully",
+        "analysis": analysis,
+        "affordability": affordability_data
+    })
+
+@bp.route("/api/bnpl/bulk-status", methods=["PUT"])
+def bulk_update_bnpl_status():
+    """
+    Update the status of several BNPL records at once and recalculate financial metrics once.
+    Body: {"updates": [{"id": 1, "status": "paid"}, ...]}
+       or {"ids": [1, 2, 3], "status": "paid"}
+    All ids must belong to the user; otherwise nothing is updated.
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    user_email = session["user_email"]
+    data = request.get_json(silent=True) or {}
     
-    # Recalculate analysis
-    analysis = calculate_analysis(salary, records)
+    if "updates" in data:
+        items = data["updates"]
+    else:
+        items = [{"id": record_id, "status": data.get("status", "paid")} for record_id in data.get("ids", [])]
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "No updates provided"}), 400
+    if len(items) > MAX_BULK_STATUS_UPDATES:
+        return jsonify({"error": f"At most {MAX_BULK_STATUS_UPDATES} records per request"}), 400
+    
+    updates = []
+    for item in items:
+        try:
+            record_id = int(item["id"])
+            status = item.get("status", "paid")
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return jsonify({"error": "Each update needs a numeric id"}), 400
+        if status not in BNPL_STATUSES:
+            return jsonify({"error": f"Invalid status: {status}"}), 400
+        updates.append((record_id, status))
+    
+    try:
+        success, error, record_ids = update_bnpl_statuses(user_email, updates)
+    except Exception:
+        app_log.exception("Bulk status update failed")
+        return jsonify({"error": "Failed to update records"}), 500
+    
+    if not success:
+        if error == "not_found":
+            return jsonify({"error": "Record not found", "record_ids": record_ids}), 404
+        return jsonify({"error": "Unauthorized", "record_ids": record_ids}), 403
     
-    # Recalculate affordability
-    monthly_bnpl_obligation = analysis["monthly_obligation"]
-    affordability_data = calculate_affordability(salary, monthly_bnpl_obligation, rent, other_expenses)
+    app_log.info("Bulk status update", extra={"updated_count": len(record_ids)})
+    
+    analysis, affordability_data = recalculate_financials(user_email)
     
     return jsonify({
         "success": True,
-        "message": "Payment recorded successfully",
+        "message": f"Updated {len(record_ids)} records",
+        "updated_count": len(record_ids),
         "analysis": analysis,
         "affordability": affordability_data
     })
 
-@app.route("/api/bnpl")
+def recalculate_financials(user_email):
+    """Analysis and affordability after a status change (the shared per-user snapshot)"""
+    snapshot = get_financial_snapshot(user_email)
+    return snapshot["analysis"], snapshot["affordability"]
+
+@bp.route("/api/cashflow/projection")
+@cached_per_user
+def cashflow_projection():
+    """
+    Month-by-month installments due, from the user's installment schedules.
+    Query params:
+    - months: number of months from the current one (default 12, max 60)
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    months = request.args.get("months", 12, type=int)
+    if not 1 <= months <= MAX_PROJECTION_MONTHS:
+        return jsonify({"error": f"months must be between 1 and {MAX_PROJECTION_MONTHS}"}), 400
+    
+    return jsonify(project_cash_flow(session["user_email"], months=months))
+
+@bp.route("/api/simulation/stress")
+def repayment_stress():
+    """
+    Monte Carlo estimate of breaching the 30% safe-EMI line.
+    Query params:
+    - months: horizon in months (default 6, max 36)
+    - scenarios: number of simulated scenarios (default 10000, max 100000)
+    - seed: non-negative integer seed to reproduce a previous run
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    user_email = session["user_email"]
+    
+    try:
+        months = int(request.args.get("months", 6))
+        scenarios = int(request.args.get("scenarios", 10000))
+        seed = int(request.args["seed"]) if request.args.get("seed") else None
+    except ValueError:
+        return jsonify({"error": "months, scenarios and seed must be integers"}), 400
+    
+    if (not 1 <= months <= MAX_SIMULATION_MONTHS or not 1 <= scenarios <= MAX_SIMULATION_SCENARIOS
+            or (seed is not None and seed < 0)):
+        return jsonify({"error": f"months must be 1-{MAX_SIMULATION_MONTHS}, scenarios 1-{MAX_SIMULATION_SCENARIOS}, "
+                                 "seed a non-negative integer"}), 400
+    
+    profile = get_user_profile(user_email) or {}
+    records = get_bnpl_records(user_email, status_filter="active")
+    
+    from backend.simulation import simulate_repayment_stress
+    result = simulate_repayment_stress(
+        profile, records,
+        months=months,
+        scenarios=scenarios,
+        seed=seed,
+        workers=Config.SIMULATION_WORKERS
+    )
+    
+    return jsonify(result)
+
+@bp.route("/api/bnpl")
 def get_bnpl():
-    """Legacy endpoint - kept for backward compatibility"""
-    return jsonify(get_bnpl_records())
+    """
+    Legacy endpoint - kept for backward compatibility: all of the signed-in
+    user's records (streamed, not loaded into memory)
+    """
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    user_email = session["user_email"]
+    
+    def generate():
+        yield "["
+        for count, record in enumerate(iter_bnpl_records(user_email)):
+            yield ("," if count else "") + json.dumps(record.as_dict())
+        yield "]"
+    
+    return Response(generate(), mimetype="application/json")
 
-@app.route("/api/analysis")
+@bp.route("/api/analysis")
 def analysis():
-    """Legacy endpoint - kept for backward compatibility"""
-    fake_profile = {"salary": 30000}
-    records = get_bnpl_records()
-
-    result = calculate_analysis(fake_profile.get("salary"), records)
+    """
+    Legacy endpoint - kept for backward compatibility.
+    Totals come from the precomputed user_scores (flask score-users); as_of
+    is the time the latest finished run scored as of. Until a run has
+    finished there is nothing to report, and the answer is a 503.
+    """
+    totals = get_score_totals()
+    if totals["as_of"] is None:
+        return jsonify({"error": "No scores computed yet (run flask score-users)", "as_of": None}), 503
+    
+    if not totals["transaction_count"]:
+        result = calculate_analysis(DEFAULT_SALARY, [])
+    else:
+        result = build_analysis(
+            DEFAULT_SALARY,
+            totals["total_outstanding"],
+            totals["monthly_obligation"],
+            totals["upcoming_dues"],
+            totals["transaction_count"]
+        )
+    result["as_of"] = totals["as_of"]
     return jsonify(result)
 
-@app.route("/auth/login")
+@bp.route("/auth/login")
 def login():
     flow = create_flow()
     auth_url, state = flow.authorization_url(prompt="consent")
@@ -379,7 +974,20 @@ def login():
     session["state"] = state
     return redirect(auth_url)
 
-@app.route("/auth/status")
+@bp.route("/auth/link")
+def link_gmail_account():
+    """Start OAuth for another Gmail account to sync into the signed-in user's records"""
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    flow = create_flow()
+    auth_url, state = flow.authorization_url(prompt="select_account consent")
+
+    session["state"] = state
+    session["linking"] = True
+    return redirect(auth_url)
+
+@bp.route("/auth/status")
 def auth_status():
     """Check if user is authenticated"""
     creds = get_credentials_from_session(session)
@@ -391,32 +999,37 @@ def auth_status():
         })
     return jsonify({"authenticated": False})
 
-@app.route("/auth/logout")
+@bp.route("/auth/logout")
 def logout():
     """Logout user"""
     session.clear()
     return jsonify({"message": "Logged out successfully"})
 
-@app.route("/auth/callback")
+@bp.route("/auth/callback")
 def callback():
     flow = create_flow()
     flow.fetch_token(authorization_response=request.url)
 
     credentials = flow.credentials
 
-    session["credentials"] = {
-        "token": credentials.token,
-        "refresh_token": credentials.refresh_token,
-        "token_uri": credentials.token_uri,
-        "client_id": credentials.client_id,
-        "client_secret": credentials.client_secret,
-        "scopes": credentials.scopes
-    }
+    # Linking another account (/auth/link) leaves the signed-in user as is
+    if session.pop("linking", False) and "user_email" in session:
+        account_email = get_user_email(credentials)
+        if not account_email:
+            return redirect(f"{FRONTEND_URL.rstrip('/')}/dashboard?link=failed")
+        link_account(session["user_email"], account_email,
+                     seal_credentials(credentials_to_dict(credentials), credentials_secret()))
+        return redirect(f"{FRONTEND_URL.rstrip('/')}/dashboard?link=success")
+
+    # Signing in: never keep an id that existed before login
+    session.regenerate()
+    session["credentials"] = credentials_to_dict(credentials)
     
     # Get and store user email
     user_email = get_user_email(credentials)
     if user_email:
         session["user_email"] = user_email
+        link_account(user_email, user_email, seal_credentials(session["credentials"], credentials_secret()))
         
         # Check if user has completed profile
         profile = get_user_profile(user_email)
@@ -431,7 +1044,38 @@ def callback():
     return redirect(f"{FRONTEND_URL.rstrip('/')}/dashboard?auth=success")
 
 
-@app.route("/api/fetch-emails")
+@bp.route("/api/accounts")
+def linked_accounts():
+    """Gmail accounts synced into the user's records, the login account first"""
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    user_email = session["user_email"]
+    return jsonify({
+        "accounts": [
+            {
+                "email": account["account_email"],
+                "primary": account["account_email"] == user_email,
+                "linked_at": account["linked_at"],
+                "last_synced_at": account["last_synced_at"]
+            }
+            for account in get_linked_accounts(user_email)
+        ]
+    })
+
+@bp.route("/api/accounts/<path:account_email>", methods=["DELETE"])
+def unlink_gmail_account(account_email):
+    """Stop syncing a linked account; records already synced from it stay"""
+    if "user_email" not in session:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    if account_email == session["user_email"]:
+        return jsonify({"error": "The account you signed in with can't be unlinked"}), 400
+    if not unlink_account(session["user_email"], account_email):
+        return jsonify({"error": "Account not linked"}), 404
+    return jsonify({"message": "Account unlinked", "email": account_email})
+
+@bp.route("/api/fetch-emails")
 def fetch_emails():
     """Legacy test endpoint"""
     creds = get_credentials_from_session(session)
@@ -467,7 +1111,7 @@ def fetch_emails():
 
     return jsonify({"emails": email_subjects})
 
-@app.route("/api/fetch-bnpl")
+@bp.route("/api/fetch-bnpl")
 def fetch_bnpl():
     """Legacy test endpoint"""
     creds = get_credentials_from_session(session)
@@ -511,10 +1155,73 @@ def fetch_bnpl():
     })
 
 
+@bp.cli.command("verify-aggregates")
+@click.option("--fix", is_flag=True, help="Rebuild user_aggregates from bnpl_records if drift is found")
+def verify_aggregates_command(fix):
+    """Recompute per-user aggregates from scratch and report drift."""
+    drift = verify_user_aggregates(fix=fix)
+
+    if not drift:
+        click.echo("[Aggregates] OK - no drift found")
+        return
+
+    for entry in drift:
+        click.echo(f"[Aggregates] DRIFT {entry['user_email']} {entry['field']}: stored={entry['actual']} expected={entry['expected']}")
+
+    click.echo(f"[Aggregates] {len(drift)} drifted field(s)" + (" - rebuilt from bnpl_records" if fix else ""))
+    if not fix:
+        raise SystemExit(1)
+
+@bp.cli.command("archive-paid")
+@click.option("--min-age-days", type=int, default=Config.ARCHIVE_MIN_AGE_DAYS, show_default=True,
+              help="Only archive records paid at least this many days ago")
+def archive_paid_command(min_age_days):
+    """Move old paid records from bnpl_records to the archive table."""
+    moved = run_compaction(min_age_days)
+    click.echo(f"[Archive] {moved} record(s) archived")
+
+@bp.cli.command("purge-sessions")
+def purge_sessions_command():
+    """Delete expired server-side sessions."""
+    deleted = purge_expired_sessions(time.time())
+    click.echo(f"[Sessions] {deleted} expired session(s) deleted")
+
+@bp.cli.command("ingest-mailbox")
+@click.argument("path", type=click.Path(exists=True))
+@click.option("--user", "user_email", required=True, help="Email of the user the records belong to")
+@click.option("--workers", type=int, default=Config.INGEST_WORKERS, show_default=True,
+              help="Processes parsing messages (1 = in-process)")
+def ingest_mailbox_command(path, user_email, workers):
+    """Import BNPL records from an mbox file, an .eml file or a directory of .eml files."""
+    result = ingest_messages(user_email, iter_archive_messages(path), workers=workers)
+    click.echo(f"[Ingest] {result['message_count']} message(s) in {result['duration_ms']} ms: "
+               f"{result['bnpl_count']} stored, {result['skipped_count']} already stored, "
+               f"{result['folded_count']} folded, {result['filtered_count']} filtered")
+
+@bp.cli.command("fold-reminders")
+@click.option("--user", "user_email", help="Only this user's records  [default: everyone]")
+@click.option("--dry-run", is_flag=True, help="Report what would be folded without changing anything")
+def fold_reminders_command(user_email, dry_run):
+    """Fold stored records that are repeat reminders of one obligation into a single record."""
+    folded = fold_duplicate_records(user_email=user_email, dry_run=dry_run)
+    for email, count in sorted(folded.items()):
+        click.echo(f"[Fold] {email}: {count} record(s)")
+    click.echo(f"[Fold] {sum(folded.values())} record(s) across {len(folded)} user(s) "
+               + ("would be folded" if dry_run else "folded"))
+
+@bp.cli.command("score-users")
+@click.option("--chunk-users", type=int, default=None,
+              help="Users scored (and checkpointed) per chunk  [default: scoring.DEFAULT_CHUNK_USERS]")
+@click.option("--restart", is_flag=True, help="Start a new run instead of resuming an unfinished one")
+def score_users_command(chunk_users, restart):
+    """Score every user into the user_scores table (resumable)."""
+    from backend.scoring import run_batch_scoring, DEFAULT_CHUNK_USERS
+    result = run_batch_scoring(chunk_users=chunk_users or DEFAULT_CHUNK_USERS, resume=not restart)
+    click.echo(f"[Scoring] Run {result['run_id']}: {result['users_scored']} user(s) scored as of {result['as_of']}"
+               + (" (resumed)" if result["resumed"] else ""))
+
 
 if __name__ == "__main__":
-    app.config.from_object(Config)
-    init_db()
-    app.run(debug=True)
+    create_app().run(debug=True)
 
 
@@ -0,0 +1,51 @@
+import atexit
+import threading
+
+from backend.models import archive_paid_records
+from backend.logging_setup import get_logger
+
+logger = get_logger("archive")
+
+# How long shutdown waits for a compaction pass in progress
+STOP_TIMEOUT_SECONDS = 10
+
+_stop_event = threading.Event()
+_compactor_thread = None
+
+def run_compaction(min_age_days):
+    """Run one compaction pass and report how many records moved to the archive"""
+    try:
+        moved = archive_paid_records(min_age_days=min_age_days)
+        if moved:
+            logger.info("Archived paid records", extra={"record_count": moved, "min_age_days": min_age_days})
+        return moved
+    except Exception:
+        logger.exception("Archive compaction failed", extra={"min_age_days": min_age_days})
+        return 0
+
+def start_archive_compactor(interval_seconds, min_age_days):
+    """
+    Start the background compaction thread (once per process).
+    Every interval_seconds it moves old paid records out of bnpl_records.
+    """
+    global _compactor_thread
+    
+    if _compactor_thread is not None and _compactor_thread.is_alive():
+        return _compactor_thread
+    
+    def loop():
+        while not _stop_event.is_set():
+            run_compaction(min_age_days)
+            _stop_event.wait(interval_seconds)
+    
+    _stop_event.clear()
+    _compactor_thread = threading.Thread(target=loop, name="archive-compactor", daemon=True)
+    _compactor_thread.start()
+    atexit.register(stop_archive_compactor)
+    return _compactor_thread
+
+def stop_archive_compactor():
+    """Ask the compaction thread to exit and wait for its current pass to finish"""
+    _stop_event.set()
+    if _compactor_thread is not None and _compactor_thread is not threading.current_thread():
+        _compactor_thread.join(STOP_TIMEOUT_SECONDS)
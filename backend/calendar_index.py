@@ -0,0 +1,118 @@
+"""
+Per-user due-date calendar: active installments sorted by due day, with
+prefix sums of their monthly amounts.
+
+"Total due between d1 and d2" is two bisections and a subtraction, and
+"next K dues" is a bisection plus a slice, so neither scans the records or
+parses dates. Entries are kept in step with record writes through
+UserVersionCache.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+from backend.models import get_bnpl_records
+from backend.user_cache import UserVersionCache
+
+# Default look-ahead for upcoming dues, in days
+DEFAULT_WINDOW_DAYS = 30
+
+
+def _entry_for(record):
+    """(due day ordinal, record id, monthly amount) or None if the record has no dated EMI"""
+    if record.status != "active" or not record.amount or not record.installments or record.installments <= 0:
+        return None
+    try:
+        due = datetime.strptime(record.due_date, "%d/%m/%Y").date()
+    except (TypeError, ValueError):
+        return None
+    return (due.toordinal(), record.id, record.amount / record.installments)
+
+
+def _rebuild_prefix(state, start=0):
+    """Recompute prefix sums from position `start` onward"""
+    amounts = state["amounts"]
+    prefix = state["prefix"]
+    del prefix[start + 1:]
+    total = prefix[start]
+    for amount in amounts[start:]:
+        total += amount
+        prefix.append(total)
+
+
+def _build_calendar(user_email):
+    entries = sorted(
+        entry for entry in map(_entry_for, get_bnpl_records(user_email, status_filter="active")) if entry
+    )
+    state = {
+        # keys: (day, record id) so equal days keep a stable order
+        "keys": [(day, record_id) for day, record_id, _ in entries],
+        "amounts": [amount for _, _, amount in entries],
+        "prefix": [0.0],
+        "by_record": {record_id: (day, record_id) for day, record_id, _ in entries},
+    }
+    _rebuild_prefix(state)
+    return state
+
+
+def _patch_calendar(state, changes):
+    """Move changed records in or out of the sorted arrays"""
+    keys = state["keys"]
+    amounts = state["amounts"]
+    first_dirty = len(keys)
+
+    for record_id, record in changes.items():
+        old_key = state["by_record"].pop(record_id, None)
+        if old_key is not None:
+            position = bisect_left(keys, old_key)
+            del keys[position]
+            del amounts[position]
+            first_dirty = min(first_dirty, position)
+
+        entry = _entry_for(record) if record else None
+        if entry:
+            key = (entry[0], entry[1])
+            position = bisect_left(keys, key)
+            keys.insert(position, key)
+            amounts.insert(position, entry[2])
+            state["by_record"][record_id] = key
+            first_dirty = min(first_dirty, position)
+
+    _rebuild_prefix(state, min(first_dirty, len(state["prefix"]) - 1))
+
+
+_calendars = UserVersionCache(_build_calendar, _patch_calendar)
+
+
+def total_due_between(user_email, start, end):
+    """Sum of monthly installments due on days start..end (inclusive dates)"""
+    def query(state):
+        lo = bisect_left(state["keys"], (start.toordinal(),))
+        hi = bisect_right(state["keys"], (end.toordinal(), float("inf")))
+        return state["prefix"][hi] - state["prefix"][lo] if hi > lo else 0
+    return _calendars.read(user_email, query)
+
+
+def upcoming_dues_total(user_email, window_days=DEFAULT_WINDOW_DAYS, today=None):
+    """
+    Amount due after today and on or before today + window_days (a due date
+    of today has already started, so it isn't counted).
+    """
+    today = today or date.today()
+    return total_due_between(user_email, today + timedelta(days=1), today + timedelta(days=window_days))
+
+
+def next_dues(user_email, count, start=None):
+    """The next `count` installments due on or after `start` (default today)"""
+    start = start or date.today()
+
+    def query(state):
+        lo = bisect_left(state["keys"], (start.toordinal(),))
+        return [
+            {
+                "record_id": record_id,
+                "due_date": date.fromordinal(day).strftime("%d/%m/%Y"),
+                "amount": round(amount, 2)
+            }
+            for (day, record_id), amount in zip(state["keys"][lo:lo + count], state["amounts"][lo:lo + count])
+        ]
+    return _calendars.read(user_email, query)
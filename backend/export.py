@@ -0,0 +1,70 @@
+"""
+Streaming export of BNPL records as NDJSON or CSV, optionally gzipped.
+
+Rows come straight off models.iter_bnpl_records and are encoded in batches
+of EXPORT_BATCH_ROWS, so memory stays flat however long the history is and
+the response isn't written one tiny chunk per row.
+"""
+import csv
+import io
+import json
+import zlib
+
+from backend.models import RECORD_FIELDS
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+# Rows encoded (and handed to the server) per chunk
+EXPORT_BATCH_ROWS = 500
+
+
+def _row_values(record):
+    """Values of RECORD_FIELDS from a BnplRecord (drops user_email, which follows id)"""
+    return (record[0],) + record[2:]
+
+
+def _ndjson_chunks(records):
+    batch = []
+    for record in records:
+        batch.append(json.dumps(dict(zip(RECORD_FIELDS, _row_values(record)))))
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+
+def _csv_chunks(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(RECORD_FIELDS)
+    pending = 0
+    for record in records:
+        writer.writerow(_row_values(record))
+        pending += 1
+        if pending >= EXPORT_BATCH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def export_chunks(records, fmt):
+    """Encoded text chunks for BnplRecord rows in format fmt ("ndjson" or "csv")"""
+    if fmt == "csv":
+        return _csv_chunks(records)
+    return _ndjson_chunks(records)
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of text chunks incrementally (one gzip member for the whole stream)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,9 +1,11 @@
 from datetime import datetime, timedelta
 
-def calculate_analysis(salary, bnpl_records):
+def calculate_analysis(salary, bnpl_records, now=None, window_days=30):
     """
-    Calculate comprehensive financial analysis.
+    Calculate comprehensive financial analysis over BnplRecord rows.
     Returns: total_outstanding, monthly_obligation, upcoming_dues, debt_ratio, risk_score
+    now: reference time for upcoming dues (default: datetime.now())
+    window_days: look-ahead for upcoming dues
     """
     if not bnpl_records:
         return {
@@ -16,22 +18,62 @@ def calculate_analysis(salary, bnpl_records):
             "transaction_count": 0
         }
     
-    # Calculate total outstanding (only active records)
-    total_outstanding = sum([r["amount"] for r in bnpl_records if r["amount"] and r.get("status") == "active"])
+    return build_analysis(salary, *summarize_records(bnpl_records, now=now, window_days=window_days))
+
+def summarize_records(bnpl_records, now=None, window_days=30):
+    """
+    Unrounded totals over the active records, in one pass:
+    (total_outstanding, monthly_obligation, upcoming_dues, active_count)
+    """
+    today = now or datetime.now()
+    window_end = today + timedelta(days=window_days)
     
-    # Calculate monthly obligation (amount / installments for each active record)
+    # One pass: every metric is accumulated per record, due dates parsed once
+    total_outstanding = 0
     monthly_obligation = 0
-    for record in bnpl_records:
-        if record.get("status") == "active" and record["amount"] and record["installments"] and record["installments"] > 0:
-            monthly_obligation += record["amount"] / record["installments"]
+    upcoming_dues = 0
+    active_count = 0
     
-    # Calculate upcoming dues (within next 30 days, only active)
-    upcoming_dues = calculate_upcoming_dues(bnpl_records)
-    
-    # Calculate debt-to-income ratio
-    debt_ratio = (monthly_obligation / salary) if salary > 0 else 0
+    for record in bnpl_records:
+        if record.status != "active":
+            continue
+        active_count += 1
+        
+        if not record.amount:
+            continue
+        total_outstanding += record.amount
+        
+        if not record.installments or record.installments <= 0:
+            continue
+        monthly_share = record.amount / record.installments
+        monthly_obligation += monthly_share
+        
+        due_date = parse_due_date(record.due_date)
+        if due_date and today <= due_date <= window_end:
+            upcoming_dues += monthly_share
     
-    # Calculate risk score (0-100)
+    return total_outstanding, monthly_obligation, upcoming_dues, active_count
+
+def calculate_analysis_from_aggregates(salary, aggregates, upcoming_dues):
+    """
+    Same result as calculate_analysis, but from the stored per-user aggregates
+    (see models.get_user_aggregates) instead of the full record list.
+    """
+    if not aggregates["active_count"]:
+        return calculate_analysis(salary, [])
+    
+    return build_analysis(
+        salary,
+        aggregates["total_outstanding"],
+        aggregates["monthly_obligation"],
+        upcoming_dues,
+        aggregates["active_count"]
+    )
+
+def calculate_risk(debt_ratio):
+    """
+    Map a debt-to-income ratio to a risk score (0-100) and level.
+    """
     if debt_ratio < 0.2:
         risk_score = int(debt_ratio * 100)  # 0-20
         risk_level = "Low"
@@ -42,6 +84,18 @@ def calculate_analysis(salary, bnpl_records):
         risk_score = min(50 + int((debt_ratio - 0.4) * 100), 100)  # 50-100
         risk_level = "High"
     
+    return risk_score, risk_level
+
+def build_analysis(salary, total_outstanding, monthly_obligation, upcoming_dues, active_count):
+    """
+    Build the analysis payload from already-summed totals.
+    """
+    # Calculate debt-to-income ratio
+    debt_ratio = (monthly_obligation / salary) if salary > 0 else 0
+    
+    # Calculate risk score (0-100)
+    risk_score, risk_level = calculate_risk(debt_ratio)
+    
     return {
         "total_outstanding": round(total_outstanding, 2),
         "monthly_obligation": round(monthly_obligation, 2),
@@ -49,38 +103,20 @@ def calculate_analysis(salary, bnpl_records):
         "debt_ratio": round(debt_ratio, 4),
         "risk_score": risk_score,
         "risk_level": risk_level,
-        "transaction_count": len([r for r in bnpl_records if r.get("status") == "active"]),
+        "transaction_count": active_count,
         "salary": salary
     }
 
-def calculate_upcoming_dues(bnpl_records):
+def parse_due_date(due_date_str):
     """
-    Calculate total amount due within next 30 days (only active records).
+    Parse a DD/MM/YYYY due date; None if missing or not a date.
     """
-    today = datetime.now()
-    thirty_days_later = today + timedelta(days=30)
-    
-    upcoming = 0
-    
-    for record in bnpl_records:
-        if record.get("status") != "active" or not record.get("due_date") or not record.get("amount"):
-            continue
-        
-        try:
-            # Parse due date (DD/MM/YYYY format)
-            due_date_str = record["due_date"]
-            due_date = datetime.strptime(due_date_str, '%d/%m/%Y')
-            
-            # Check if due date is within next 30 days
-            if today <= due_date <= thirty_days_later:
-                # Add monthly installment amount
-                installments = record.get("installments", 1)
-                if installments > 0:
-                    upcoming += record["amount"] / installments
-        except:
-            continue
-    
-    return upcoming
+    if not due_date_str:
+        return None
+    try:
+        return datetime.strptime(due_date_str, '%d/%m/%Y')
+    except (TypeError, ValueError):
+        return None
 
 def calculate_affordability(salary, monthly_bnpl_obligation, rent, other_expenses):
     """
@@ -121,3 +157,40 @@ def calculate_affordability(salary, monthly_bnpl_obligation, rent, other_expense
         "emi_percentage": round(emi_percentage, 2),
         "safe_emi_percentage": round(min(100, safe_emi_percentage), 2)
     }
+
+def purchase_emi(amount, installments):
+    """
+    Monthly EMI a purchase adds, counted the same way as monthly_obligation
+    (a purchase without a valid installment count adds nothing monthly).
+    """
+    if not amount or not installments or installments <= 0:
+        return 0
+    return amount / installments
+
+def calculate_what_if(salary, rent, other_expenses, aggregates, purchases):
+    """
+    Risk and affordability if the given hypothetical purchases were added.
+    aggregates: the user's current totals (models.get_user_aggregates)
+    purchases: list of {"amount", "installments"} dicts, applied together
+    Only the deltas are added to the stored totals; no records are read.
+    """
+    added_emi = sum(purchase_emi(p["amount"], p["installments"]) for p in purchases)
+    added_total = sum(p["amount"] for p in purchases if p["amount"])
+    
+    monthly_obligation = aggregates["monthly_obligation"] + added_emi
+    debt_ratio = (monthly_obligation / salary) if salary > 0 else 0
+    risk_score, risk_level = calculate_risk(debt_ratio)
+    affordability = calculate_affordability(salary, monthly_obligation, rent, other_expenses)
+    
+    return {
+        "added_emi": round(added_emi, 2),
+        "total_outstanding": round(aggregates["total_outstanding"] + added_total, 2),
+        "monthly_obligation": round(monthly_obligation, 2),
+        "debt_ratio": round(debt_ratio, 4),
+        "risk_score": risk_score,
+        "risk_level": risk_level,
+        "emi_percentage": affordability["emi_percentage"],
+        "available_emi_capacity": affordability["available_emi_capacity"],
+        "status": affordability["status"],
+        "affordable": monthly_obligation <= affordability["max_safe_emi"]
+    }
@@ -0,0 +1,83 @@
+"""
+Content fingerprints for folding repeat reminders into one BNPL record.
+
+Lenders send several emails about the same EMI (statement, reminder,
+overdue notice), each with its own message id. Records that share an
+obligation key (vendor, amount, due date) are the same obligation when
+their bodies are close, which a 64-bit SimHash of the normalized body
+decides: rewordings of one lender's template land well within
+MAX_SIMHASH_DISTANCE bits of each other, unrelated text around 32. A
+record without a fingerprint (empty body, or stored before bodies were
+fingerprinted) is never folded.
+"""
+import hashlib
+import re
+
+# Bodies at most this many bits apart (of 64) count as the same obligation
+MAX_SIMHASH_DISTANCE = 20
+
+# Only the start of a body is fingerprinted; that's where reminders say what they are about
+MAX_FINGERPRINT_WORDS = 200
+
+_TAG = re.compile(r"<[^>]+>")
+_URL = re.compile(r"https?://\S+|www\.\S+")
+# Amounts, dates and reference numbers differ between reminders; the key already covers them
+_NUMBER = re.compile(r"[\d][\d,./:-]*")
+_WORD = re.compile(r"[a-z]{2,}")
+
+_MASK = (1 << 64) - 1
+
+
+def normalize_body(body):
+    """Lowercased words of an email body, without markup, links and numbers"""
+    text = _TAG.sub(" ", body or "").lower()
+    text = _URL.sub(" ", text)
+    text = _NUMBER.sub(" ", text)
+    return _WORD.findall(text)
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def body_simhash(body):
+    """
+    SimHash of the normalized body over word unigrams and bigrams, as a
+    signed 64-bit integer (SQLite's INTEGER range). None for an empty body.
+    """
+    words = normalize_body(body)[:MAX_FINGERPRINT_WORDS]
+    if not words:
+        return None
+
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    # Per-bit counts of set bits over all feature hashes, kept bit-sliced:
+    # planes[i] holds bit i of all 64 counters, so adding a hash is a
+    # ripple-carry add of a few big-int ops rather than a 64-step loop
+    planes = []
+    for feature in features:
+        carry = _feature_hash(feature)
+        for i, plane in enumerate(planes):
+            if not carry:
+                break
+            planes[i], carry = plane ^ carry, plane & carry
+        if carry:
+            planes.append(carry)
+
+    # A bit is set where more than half of the features have it set; compare
+    # all 64 counters against that at once, from the top counter bit down
+    half = len(features) // 2
+    value, equal = 0, _MASK
+    for i in reversed(range(max(len(planes), half.bit_length()))):
+        plane = planes[i] if i < len(planes) else 0
+        if half >> i & 1:
+            equal &= plane
+        else:
+            value |= equal & plane
+            equal &= ~plane
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def simhash_distance(a, b):
+    """Number of differing bits between two fingerprints"""
+    return bin((a ^ b) & _MASK).count("1")
@@ -1,14 +1,29 @@
+"""
+Gmail OAuth and message fetching.
+
+The Google client libraries take a few hundred milliseconds to import, so
+they are imported inside the functions that use them: a worker only pays
+for them on its first Gmail request, not at startup.
+"""
 import os
 import base64
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+import hashlib
+import json
 from flask import session, redirect, request
-from google.oauth2.credentials import Credentials
+
+from backend.logging_setup import get_logger
+from backend.metrics import gmail_execute, BODY_DECODE_SECONDS
+
+logger = get_logger("gmail")
 
 CLIENT_SECRETS_FILE = "client_secret.json"
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
 
+# What a linked account's stored credentials keep: enough to get a new
+# access token, never the access token itself
+REFRESH_FIELDS = ("refresh_token", "token_uri", "client_id", "client_secret", "scopes")
+
 def create_flow():
     """
     Create an OAuth2 Flow.
@@ -30,6 +45,8 @@ def create_flow():
 
     redirect_uri = f"{backend_base}/auth/callback"
 
+    from google_auth_oauthlib.flow import Flow
+
     # If client id/secret are provided via env, use them (avoid committing secrets)
     client_id = os.getenv("GOOGLE_CLIENT_ID")
     client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -53,95 +70,129 @@ def create_flow():
     return Flow.from_client_secrets_file(CLIENT_SECRETS_FILE, scopes=SCOPES, redirect_uri=redirect_uri)
 
 
+def build(*args, **kwargs):
+    """
+    googleapiclient.discovery.build, imported on first use.
+    GMAIL_API_ROOT (e.g. the load-test fake server) replaces the API endpoint.
+    """
+    from googleapiclient.discovery import build as discovery_build
+    api_root = os.getenv("GMAIL_API_ROOT")
+    if api_root:
+        kwargs.setdefault("client_options", {"api_endpoint": api_root})
+    return discovery_build(*args, **kwargs)
+
 def get_gmail_service(credentials):
     return build("gmail", "v1", credentials=credentials)
 
+def credentials_to_dict(credentials):
+    """The fields of OAuth credentials kept in the session (linked accounts store less, see seal_credentials)"""
+    return {
+        "token": credentials.token,
+        "refresh_token": credentials.refresh_token,
+        "token_uri": credentials.token_uri,
+        "client_id": credentials.client_id,
+        "client_secret": credentials.client_secret,
+        "scopes": credentials.scopes
+    }
+
+def credentials_from_dict(data):
+    from google.oauth2.credentials import Credentials
+
+    return Credentials(
+        token=data["token"],
+        refresh_token=data["refresh_token"],
+        token_uri=data["token_uri"],
+        client_id=data["client_id"],
+        client_secret=data["client_secret"],
+        scopes=data["scopes"]
+    )
+
+def _fernet(secret):
+    from cryptography.fernet import Fernet
+
+    # Any secret string will do: the Fernet key is derived from it
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode("utf-8")).digest()))
+
+def seal_credentials(data, secret):
+    """The REFRESH_FIELDS of a credentials dict, encrypted with secret, for storing a linked account"""
+    refresh = {field: data[field] for field in REFRESH_FIELDS}
+    return _fernet(secret).encrypt(json.dumps(refresh).encode("utf-8")).decode("ascii")
+
+def open_credentials(sealed, secret):
+    """
+    Credentials dict from seal_credentials, without an access token (one is
+    fetched on first use). None if sealed can't be decrypted with secret.
+    """
+    from cryptography.fernet import InvalidToken
+
+    try:
+        refresh = json.loads(_fernet(secret).decrypt(sealed.encode("ascii")))
+    except (InvalidToken, ValueError):
+        return None
+    return dict(refresh, token=None)
+
 def get_credentials_from_session(session):
     if "credentials" not in session:
         return None
 
-    creds = Credentials(
-        token=session["credentials"]["token"],
-        refresh_token=session["credentials"]["refresh_token"],
-        token_uri=session["credentials"]["token_uri"],
-        client_id=session["credentials"]["client_id"],
-        client_secret=session["credentials"]["client_secret"],
-        scopes=session["credentials"]["scopes"]
-    )
+    return credentials_from_dict(session["credentials"])
 
-    return creds
+# Gmail search for messages that might contain BNPL information
+BNPL_QUERY = '(EMI OR installment OR "pay later" OR BNPL OR "due date" OR "monthly payment" OR statement OR repayment) -spam'
 
-def fetch_gmail_messages(creds, max_results=50):
+def list_bnpl_message_ids(service, max_results=50, after=None):
     """
-    Fetch Gmail messages that might contain BNPL information.
-    Returns tuple: (success, messages, error_message)
+    Ids of the newest messages matching BNPL_QUERY (raises on API errors).
+    after: only messages received after this Unix time (a sync cursor)
     """
-    try:
-        service = build("gmail", "v1", credentials=creds)
+    query = BNPL_QUERY if after is None else f"{BNPL_QUERY} after:{int(after)}"
+    logger.debug("Listing messages", extra={"query": query, "max_results": max_results})
 
-        # Query for BNPL-related emails
-        query = '(EMI OR installment OR "pay later" OR BNPL OR "due date" OR "monthly payment" OR statement OR repayment) -spam'
-
-        print(f"[Gmail API] Fetching messages with query: {query}")
-        
-        results = service.users().messages().list(
-            userId="me",
-            q=query,
-            maxResults=max_results
-        ).execute()
-
-        messages = results.get("messages", [])
-        print(f"[Gmail API] Found {len(messages)} messages")
-        
-        if not messages:
-            return (True, [], None)
-        
-        parsed_messages = []
-        
-        for idx, msg in enumerate(messages):
-            try:
-                print(f"[Gmail API] Fetching message {idx + 1}/{len(messages)}")
-                msg_data = service.users().messages().get(
-                    userId="me",
-                    id=msg["id"],
-                    format="full"
-                ).execute()
-                
-                # Extract headers
-                headers = msg_data.get("payload", {}).get("headers", [])
-                
-                # Extract sender (From header)
-                sender = next(
-                    (h["value"] for h in headers if h["name"].lower() == "from"),
-                    "Unknown"
-                )
-                
-                # Extract subject
-                subject = next(
-                    (h["value"] for h in headers if h["name"].lower() == "subject"),
-                    "No Subject"
-                )
-                
-                # Extract body
-                body = extract_email_body(msg_data.get("payload", {}))
-                
-                parsed_messages.append({
-                    "id": msg["id"],
-                    "sender": sender,
-                    "subject": subject,
-                    "body": body
-                })
-            except Exception as msg_error:
-                print(f"[Gmail API] Error parsing message {msg['id']}: {msg_error}")
-                continue
-        
-        print(f"[Gmail API] Successfully parsed {len(parsed_messages)} messages")
-        return (True, parsed_messages, None)
-    
-    except Exception as e:
-        error_msg = str(e)
-        print(f"[Gmail API] ERROR: {error_msg}")
-        return (False, [], error_msg)
+    results = gmail_execute("list", service.users().messages().list(
+        userId="me",
+        q=query,
+        maxResults=max_results
+    ))
+
+    ids = [msg["id"] for msg in results.get("messages", [])]
+    logger.info("Listed messages", extra={"message_count": len(ids)})
+    return ids
+
+def fetch_gmail_message(service, message_id):
+    """
+    Fetch one message as {"id", "sender", "subject", "body"} (raises on API errors).
+    """
+    msg_data = gmail_execute("get", service.users().messages().get(
+        userId="me",
+        id=message_id,
+        format="full"
+    ))
+
+    # Extract headers
+    headers = msg_data.get("payload", {}).get("headers", [])
+
+    # Extract sender (From header)
+    sender = next(
+        (h["value"] for h in headers if h["name"].lower() == "from"),
+        "Unknown"
+    )
+
+    # Extract subject
+    subject = next(
+        (h["value"] for h in headers if h["name"].lower() == "subject"),
+        "No Subject"
+    )
+
+    # Extract body
+    with BODY_DECODE_SECONDS.time():
+        body = extract_email_body(msg_data.get("payload", {}))
+
+    return {
+        "id": message_id,
+        "sender": sender,
+        "subject": subject,
+        "body": body
+    }
 
 def extract_email_body(payload):
     """
@@ -170,7 +221,7 @@ def extract_email_body(payload):
             if "data" in payload_body:
                 body = base64.urlsafe_b64decode(payload_body["data"]).decode("utf-8", errors="ignore")
     except Exception as e:
-        print(f"[Gmail API] Error extracting body: {e}")
+        logger.debug("Failed to extract body", extra={"error": str(e)})
         body = ""
     
     return body[:5000]  # Limit body size
@@ -181,8 +232,8 @@ def get_user_email(creds):
     """
     try:
         service = build("gmail", "v1", credentials=creds)
-        profile = service.users().getProfile(userId="me").execute()
+        profile = gmail_execute("profile", service.users().getProfile(userId="me"))
         return profile.get("emailAddress")
     except Exception as e:
-        print(f"Error getting user email: {e}")
+        logger.error("Failed to get user email", extra={"error": str(e)})
         return None
@@ -0,0 +1,216 @@
+"""
+Offline ingestion of mailbox archives: mbox files and directories of .eml files.
+
+Messages are split off the archive one at a time (memory is bounded by the
+batch size, not the archive size), parsed with the same is_bnpl_email /
+parse_bnpl_email logic as a Gmail sync, optionally across a process pool,
+and stored with models.bulk_insert_bnpl_records one batch per transaction.
+A message's Message-ID takes the place of the Gmail message id, so
+ingesting the same archive again stores nothing new, and repeat reminders
+for one obligation are folded into a single record (backend.fingerprint).
+"""
+import hashlib
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from email import message_from_bytes
+from email.header import decode_header, make_header
+
+from backend.parser import parse_bnpl_email, is_bnpl_email
+from backend.fingerprint import body_simhash
+from backend.models import bulk_insert_bnpl_records
+from backend.logging_setup import get_logger
+
+logger = get_logger("ingest")
+
+# Messages larger than this are skipped (attachments, not reminders)
+MAX_MESSAGE_BYTES = 10 * 1024 * 1024
+
+# Messages parsed and inserted per batch (one transaction each)
+INGEST_BATCH_MESSAGES = 2000
+
+# Messages handed to a pool worker at a time
+POOL_CHUNK_MESSAGES = 100
+
+# Same cap as the Gmail sync (gmail_service.extract_email_body)
+MAX_BODY_CHARS = 5000
+
+
+def iter_mbox_messages(fileobj):
+    """
+    Raw bytes of each message in an mbox stream, read line by line.
+    A message starts at a "From " line at the top of the file or after a blank line.
+    """
+    lines = []
+    size = 0
+    oversized = False
+    previous_blank = True
+
+    for line in fileobj:
+        if line.startswith(b"From ") and previous_blank:
+            if lines and not oversized:
+                yield b"".join(lines)
+            elif oversized:
+                logger.warning("Skipped oversized message", extra={"bytes": size})
+            lines, size, oversized = [], 0, False
+            previous_blank = False
+            continue
+
+        previous_blank = line in (b"\n", b"\r\n")
+        size += len(line)
+        if size > MAX_MESSAGE_BYTES:
+            oversized = True
+            lines = []
+        elif not oversized:
+            lines.append(line)
+
+    if lines and not oversized:
+        yield b"".join(lines)
+    elif oversized:
+        logger.warning("Skipped oversized message", extra={"bytes": size})
+
+
+def _read_eml(path):
+    if os.path.getsize(path) > MAX_MESSAGE_BYTES:
+        logger.warning("Skipped oversized message", extra={"path": path})
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def iter_eml_messages(directory):
+    """Raw bytes of every .eml file under directory, in path order"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(".eml"):
+                raw = _read_eml(os.path.join(root, name))
+                if raw is not None:
+                    yield raw
+
+
+def iter_archive_messages(path):
+    """Messages of an mbox file, a single .eml file or a directory of .eml files"""
+    if os.path.isdir(path):
+        yield from iter_eml_messages(path)
+    elif path.lower().endswith(".eml"):
+        raw = _read_eml(path)
+        if raw is not None:
+            yield raw
+    else:
+        with open(path, "rb") as f:
+            yield from iter_mbox_messages(f)
+
+
+def _header(message, name, default):
+    value = message.get(name)
+    if value is None:
+        return default
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return str(value)
+
+
+def _body_text(message):
+    """First text/plain part, else the first text/html part (as the Gmail sync does)"""
+    html = None
+    for part in message.walk():
+        content_type = part.get_content_type()
+        if content_type not in ("text/plain", "text/html") or part.get_filename():
+            continue
+        payload = part.get_payload(decode=True)
+        if payload is None:
+            continue
+        text = payload.decode(part.get_content_charset() or "utf-8", errors="ignore")
+        if content_type == "text/plain":
+            return text
+        if html is None:
+            html = text
+    return html or ""
+
+
+def parse_raw_message(raw):
+    """
+    (outcome, record) for one raw message; outcome is "bnpl", "filtered" or
+    "no_amount", and record is set only for "bnpl". Runs in pool workers.
+    """
+    message = message_from_bytes(raw)
+    message_id = (message.get("Message-ID") or "").strip()
+    if not message_id:
+        message_id = "sha1:" + hashlib.sha1(raw).hexdigest()
+
+    sender = _header(message, "From", "Unknown")
+    subject = _header(message, "Subject", "No Subject")
+    body = _body_text(message)[:MAX_BODY_CHARS]
+
+    if not is_bnpl_email(sender, subject, body):
+        return "filtered", None
+
+    parsed = parse_bnpl_email(sender, subject, body)
+    if not parsed["amount"]:
+        return "no_amount", None
+
+    return "bnpl", {
+        "gmail_message_id": message_id,
+        "vendor": parsed["vendor"],
+        "amount": parsed["amount"],
+        "installments": parsed["installments"] or 1,
+        "due_date": parsed["due_date"],
+        "email_subject": subject,
+        "simhash": body_simhash(body)
+    }
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest_messages(user_email, raw_messages, workers=None):
+    """
+    Parse and store raw messages for user_email.
+    workers: process pool size for parsing (None/1 = in-process); with a
+    pool, the next batch is parsed while the previous one is inserted.
+    Returns counts: message_count, bnpl_count (stored), skipped_count (already
+    stored), folded_count (repeat reminders of a stored obligation),
+    filtered_count, duration_ms.
+    """
+    started = time.perf_counter()
+    counts = {"message_count": 0, "bnpl_count": 0, "skipped_count": 0, "folded_count": 0, "filtered_count": 0}
+
+    def store(results):
+        records = []
+        for outcome, record in results:
+            counts["message_count"] += 1
+            if record is None:
+                counts["filtered_count"] += 1
+            else:
+                records.append(record)
+        stored = bulk_insert_bnpl_records(user_email, records)
+        counts["bnpl_count"] += stored["stored"]
+        counts["folded_count"] += stored["folded"]
+        counts["skipped_count"] += stored["duplicate"]
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = None
+            for batch in _batches(raw_messages, INGEST_BATCH_MESSAGES):
+                results = pool.map(parse_raw_message, batch, chunksize=POOL_CHUNK_MESSAGES)
+                if pending is not None:
+                    store(pending)
+                pending = results
+            if pending is not None:
+                store(pending)
+    else:
+        for batch in _batches(raw_messages, INGEST_BATCH_MESSAGES):
+            store(map(parse_raw_message, batch))
+
+    counts["duration_ms"] = round((time.perf_counter() - started) * 1000)
+    logger.info("Mailbox ingested", extra=counts)
+    return counts
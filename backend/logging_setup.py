@@ -0,0 +1,167 @@
+"""
+Structured logging for the app and backend modules.
+
+- Loggers live under "bnpl" (get_logger("sync") -> "bnpl.sync").
+- Records are handed to a QueueHandler; formatting and stdout I/O happen on
+  a QueueListener thread, so request code never blocks on the log pipeline.
+- Every record carries the current request id and a hash of the user email
+  (bind_context / contextvars), as JSON or as a one-line text format.
+- DEBUG records are rate limited per message template: at most
+  LOG_DEBUG_RATE per second each, with the number dropped reported on the
+  next one let through.
+"""
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+ROOT_LOGGER = "bnpl"
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_user = contextvars.ContextVar("user", default=None)
+
+_listener = None
+_setup_lock = threading.Lock()
+
+# Attributes every LogRecord has; anything else came in through extra=
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def user_hash(user_email):
+    """Short stable pseudonym for a user email, safe to put in logs"""
+    if not user_email:
+        return None
+    return hashlib.sha256(user_email.lower().encode("utf-8")).hexdigest()[:12]
+
+
+def bind_context(request_id=None, user_email=None):
+    """Set the correlation fields for log records from this context (request, thread)"""
+    _request_id.set(request_id)
+    _user.set(user_hash(user_email))
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class ContextFilter(logging.Filter):
+    """Stamps request_id and user onto records when they are created"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        record.user = _user.get()
+        return True
+
+
+class DebugRateLimitFilter(logging.Filter):
+    """
+    Lets through at most `per_second` DEBUG records per message template per
+    second; higher levels always pass. Dropped counts are attached to the next
+    record allowed for that template as `suppressed`.
+    """
+
+    def __init__(self, per_second):
+        super().__init__()
+        self.per_second = per_second
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+
+        key = (record.name, record.msg)
+        second = int(time.monotonic())
+        with self._lock:
+            window, count, dropped = self._windows.get(key, (second, 0, 0))
+            if window != second:
+                window, count = second, 0
+            if count >= self.per_second:
+                self._windows[key] = (window, count, dropped + 1)
+                return False
+            self._windows[key] = (window, count + 1, 0)
+
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "user": getattr(record, "user", None),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in payload:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = {"req": getattr(record, "request_id", None), "user": getattr(record, "user", None)}
+        fields.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in _STANDARD_ATTRS and key not in ("request_id", "user")
+        )
+        extras = " ".join(f"{key}={value}" for key, value in fields.items() if value is not None)
+        line = f"{self.formatTime(record)} {record.levelname} [{record.name}] {record.getMessage()}"
+        return f"{line} {extras}" if extras else line
+
+
+def setup_logging(level="INFO", fmt="json", debug_rate=10, stream=None):
+    """
+    Route the "bnpl" loggers through a background queue listener (once per process).
+    level: minimum level name; fmt: "json" or "text";
+    debug_rate: DEBUG records allowed per message template per second
+    """
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        # Context must be captured on the calling thread, before the record is queued
+        queue_handler.addFilter(ContextFilter())
+        queue_handler.addFilter(DebugRateLimitFilter(debug_rate))
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level.upper())
+        root.handlers[:] = [queue_handler]
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, handler)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
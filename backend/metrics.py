@@ -0,0 +1,126 @@
+"""
+Prometheus metrics for the sync pipeline, queries and routes.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (before the app is imported)
+to a directory shared by the workers; each worker then writes its samples
+there and /api/metrics aggregates all of them (see gunicorn.conf.py for the
+cleanup hooks). Without it, metrics are per-process.
+"""
+import functools
+import inspect
+import os
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+
+# Sub-millisecond resolution for SQLite queries and parsing; the defaults suit HTTP and Gmail calls
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+GMAIL_CALL_SECONDS = Histogram(
+    "bnpl_gmail_call_seconds", "Gmail API call latency", ["call"]
+)
+GMAIL_CALL_ERRORS = Counter(
+    "bnpl_gmail_call_errors_total", "Gmail API calls that raised", ["call"]
+)
+BODY_DECODE_SECONDS = Histogram(
+    "bnpl_gmail_body_decode_seconds", "Time to extract and decode a message body", buckets=FAST_BUCKETS
+)
+PARSER_SECONDS = Histogram(
+    "bnpl_parser_seconds", "Email filter/parse latency", ["stage"], buckets=FAST_BUCKETS
+)
+PARSER_RESULTS = Counter(
+    "bnpl_parser_results_total", "Filter/parse outcomes", ["stage", "result"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "bnpl_db_query_seconds", "Latency of each models.py query function", ["query"], buckets=FAST_BUCKETS
+)
+DB_QUERY_ERRORS = Counter(
+    "bnpl_db_query_errors_total", "models.py query functions that raised", ["query"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "bnpl_http_request_seconds", "Flask route latency (until the response is returned)", ["endpoint", "method"]
+)
+HTTP_REQUESTS = Counter(
+    "bnpl_http_requests_total", "Flask responses by route and status", ["endpoint", "method", "status"]
+)
+
+
+def db_timed(func):
+    """
+    Time a models.py query function under its own name. Generator functions
+    are timed over the whole iteration, since that is when they query.
+    """
+    histogram = DB_QUERY_SECONDS.labels(func.__name__)
+    errors = DB_QUERY_ERRORS.labels(func.__name__)
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                yield from func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def gmail_execute(call, request):
+    """request.execute(), timed and counted as Gmail call `call`"""
+    started = time.perf_counter()
+    try:
+        return request.execute()
+    except Exception:
+        GMAIL_CALL_ERRORS.labels(call).inc()
+        raise
+    finally:
+        GMAIL_CALL_SECONDS.labels(call).observe(time.perf_counter() - started)
+
+
+def parser_timed(stage, is_match=bool):
+    """Time a parser function and count its outcome ("match" when is_match(result))"""
+    histogram = PARSER_SECONDS.labels(stage)
+    matched = PARSER_RESULTS.labels(stage, "match")
+    missed = PARSER_RESULTS.labels(stage, "miss")
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            histogram.observe(time.perf_counter() - started)
+            (matched if is_match(result) else missed).inc()
+            return result
+        return wrapper
+    return decorator
+
+
+def observe_request(endpoint, method, status, seconds):
+    endpoint = endpoint or "unmatched"
+    HTTP_REQUEST_SECONDS.labels(endpoint, method).observe(seconds)
+    HTTP_REQUESTS.labels(endpoint, method, str(status)).inc()
+
+
+def render_metrics():
+    """(body, content type) in the Prometheus text format, across workers if multiprocess"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
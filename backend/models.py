@@ -1,26 +1,179 @@
 import sqlite3
+from collections import namedtuple
+from datetime import datetime
+from itertools import repeat
+
+from backend.fingerprint import simhash_distance, MAX_SIMHASH_DISTANCE
+from backend.logging_setup import get_logger
+from backend.metrics import db_timed
+
+logger = get_logger("db")
 
 DB_PATH = "database/bnpl.db"
 
+# Columns returned by get_bnpl_records (and allowed in its `fields` projection)
+RECORD_FIELDS = (
+    "id", "gmail_message_id", "vendor", "amount", "installments",
+    "due_date", "email_subject", "status", "created_at"
+)
+
+# Column order of a full bnpl_records row as loaded into BnplRecord
+BNPL_RECORD_COLUMNS = ("id", "user_email") + RECORD_FIELDS[1:]
+
+
+class BnplRecord(namedtuple("BnplRecord", BNPL_RECORD_COLUMNS)):
+    """
+    One bnpl_records row as a plain tuple (no per-row dict).
+    Fields are read as attributes (record.amount); record["amount"] and
+    record.get("amount") still work for code written against the old dicts.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            # Only fields: tuple methods such as count and index aren't keys
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def as_dict(self):
+        """JSON-ready dict with the public RECORD_FIELDS (user_email is left out)"""
+        return {
+            "id": self.id,
+            "gmail_message_id": self.gmail_message_id,
+            "vendor": self.vendor,
+            "amount": self.amount,
+            "installments": self.installments,
+            "due_date": self.due_date,
+            "email_subject": self.email_subject,
+            "status": self.status,
+            "created_at": self.created_at
+        }
+
+
+def bnpl_record_factory(cursor, row):
+    """sqlite3 row_factory producing BnplRecord for SELECT BNPL_RECORD_COLUMNS"""
+    return tuple.__new__(BnplRecord, row)
+
+def _as_bnpl_records(rows):
+    """
+    Wrap raw row tuples as BnplRecord lazily.
+    Same result as bnpl_record_factory, but the per-row call stays in C,
+    which is measurably cheaper than a Python row_factory on large scans.
+    """
+    return map(tuple.__new__, repeat(BnplRecord), rows)
+
+# due_date is stored as DD/MM/YYYY; this expression turns it into a sortable
+# YYYY-MM-DD string (NULL for placeholders such as "Due date mentioned")
+DUE_ON_SQL = """
+    CASE WHEN due_date GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]'
+    THEN substr(due_date, 7, 4) || '-' || substr(due_date, 4, 2) || '-' || substr(due_date, 1, 2)
+    END
+"""
+
+# DUE_ON_SQL, but NULL for strings that look like dates and aren't (31/02/2026);
+# the '+0 days' modifier makes SQLite normalise such dates so they stop comparing equal
+VALID_DUE_ON_SQL = f"""
+    CASE WHEN date({DUE_ON_SQL}, '+0 days') = {DUE_ON_SQL} THEN {DUE_ON_SQL} END
+"""
+
+# Amounts within this tolerance are treated as equal when checking aggregate drift
+AGGREGATE_TOLERANCE = 0.01
+
+# Cold storage for paid records moved out of bnpl_records by archive_paid_records
+ARCHIVE_TABLE = "bnpl_records_archive"
+
+# Callbacks told about committed record changes (see add_record_listener)
+_record_listeners = []
+
+# Salary assumed for a user without a profile, or whose profile has no salary
+DEFAULT_SALARY = 30000
+
+# Bump whenever init_db's schema changes; a database at this PRAGMA user_version is left alone
+SCHEMA_VERSION = 7
+
+# Gmail message ids are only unique within one mailbox, so stored messages
+# are keyed by the account they came from. account_email '' marks messages
+# not tied to one mailbox (archive imports, and everything stored before
+# accounts were tracked); those ids count as seen from every account.
+# The tables keyed this way, created (or rebuilt) by init_db:
+RECORDS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS bnpl_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_email TEXT,
+        account_email TEXT NOT NULL DEFAULT '',
+        gmail_message_id TEXT,
+        vendor TEXT,
+        amount REAL,
+        installments INTEGER,
+        due_date TEXT,
+        email_subject TEXT,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        paid_at TIMESTAMP,
+        UNIQUE(user_email, account_email, gmail_message_id)
+    )
+"""
+
+# Same shape as bnpl_records; ids are kept so they stay unique across both tables
+ARCHIVE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} (
+        id INTEGER PRIMARY KEY,
+        user_email TEXT,
+        account_email TEXT NOT NULL DEFAULT '',
+        gmail_message_id TEXT,
+        vendor TEXT,
+        amount REAL,
+        installments INTEGER,
+        due_date TEXT,
+        email_subject TEXT,
+        status TEXT DEFAULT 'paid',
+        created_at TIMESTAMP,
+        paid_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_email, account_email, gmail_message_id)
+    )
+"""
+
+# Messages folded into an existing record instead of being stored
+FOLDED_MESSAGES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS bnpl_folded_messages (
+        user_email TEXT NOT NULL,
+        account_email TEXT NOT NULL DEFAULT '',
+        gmail_message_id TEXT NOT NULL,
+        record_id INTEGER NOT NULL,
+        folded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_email, account_email, gmail_message_id)
+    ) WITHOUT ROWID
+"""
+
+@db_timed
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    """
+    Create or migrate the schema. Cheap once the database is at
+    SCHEMA_VERSION, so every worker can call it at startup; concurrent
+    callers queue on the write lock and only the first one migrates.
+    Returns True if this call migrated.
+    """
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        conn.close()
+        return False
+
+    conn.execute("BEGIN IMMEDIATE")
+    # Another worker may have migrated while we waited for the lock
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        conn.rollback()
+        conn.close()
+        return False
+
     cursor = conn.cursor()
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS bnpl_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_email TEXT,
-            gmail_message_id TEXT,
-            vendor TEXT,
-            amount REAL,
-            installments INTEGER,
-            due_date TEXT,
-            email_subject TEXT,
-            status TEXT DEFAULT 'active',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_email, gmail_message_id)
-        )
-    """)
+    cursor.execute(RECORDS_TABLE_SQL)
     
     # Add columns if they don't exist (for existing databases)
     cursor.execute("PRAGMA table_info(bnpl_records)")
@@ -34,6 +187,17 @@ def init_db():
         # Create unique constraint after adding column
         cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_user_gmail_msg ON bnpl_records(user_email, gmail_message_id)")
     
+    if 'paid_at' not in columns:
+        cursor.execute("ALTER TABLE bnpl_records ADD COLUMN paid_at TIMESTAMP")
+    
+    # The unique key changes too, so tables from before account_email are rebuilt
+    if 'account_email' not in columns:
+        _rebuild_keyed_by_account(cursor, "bnpl_records", RECORDS_TABLE_SQL)
+    
+    cursor.execute(ARCHIVE_TABLE_SQL)
+    _rebuild_keyed_by_account(cursor, ARCHIVE_TABLE, ARCHIVE_TABLE_SQL)
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_archive_user_created ON {ARCHIVE_TABLE}(user_email, created_at, id)")
+    
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -48,106 +212,910 @@ def init_db():
         )
     """)
 
-    conn.commit()   
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bnpl_user_status ON bnpl_records(user_email, status)")
+    # Serves the keyset-paginated listing (ORDER BY created_at DESC, id DESC)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bnpl_user_created ON bnpl_records(user_email, created_at, id)")
+
+    # Per-user running totals over active records, kept in step by every write below
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'user_aggregates'")
+    aggregates_exist = cursor.fetchone() is not None
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_aggregates (
+            user_email TEXT PRIMARY KEY,
+            total_outstanding REAL DEFAULT 0,
+            monthly_obligation REAL DEFAULT 0,
+            active_count INTEGER DEFAULT 0,
+            next_due_date TEXT,
+            version INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("PRAGMA table_info(user_aggregates)")
+    if 'version' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE user_aggregates ADD COLUMN version INTEGER DEFAULT 0")
+
+    if not aggregates_exist:
+        # Backfill for databases created before the aggregates table existed
+        _rebuild_user_aggregates(cursor)
+
+    # Output of the offline batch scoring job (backend/scoring.py), one row per user
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_scores (
+            user_email TEXT PRIMARY KEY,
+            total_outstanding REAL,
+            monthly_obligation REAL,
+            upcoming_dues REAL,
+            debt_ratio REAL,
+            risk_score INTEGER,
+            risk_level TEXT,
+            transaction_count INTEGER,
+            salary REAL,
+            run_id INTEGER,
+            scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # One row per scoring run; last_user_email is the checkpoint a run resumes from
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scoring_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            as_of TEXT,
+            last_user_email TEXT,
+            users_scored INTEGER DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+
+    # Server-side Flask sessions (backend/session_store.py); data is the serialized session dict
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+    # Moves on every session delete (logout, login's regenerate); a worker that
+    # sees it move drops its cached sessions before serving one again
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS session_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            generation INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO session_generation (id, generation) VALUES (0, 0)")
+
+    # Users whose requests are always profiled (backend/profiling.py), by
+    # logging_setup.user_hash; switched on and off through the admin API
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS profiled_users (
+            user_hash TEXT PRIMARY KEY,
+            enabled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Repeat reminders folded into one record: the per-user obligation index
+    # (one row per record, simhash NULL for records stored before bodies were
+    # fingerprinted, which therefore never fold) and the messages that were
+    # folded instead of stored
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'bnpl_fingerprints'")
+    fingerprints_exist = cursor.fetchone() is not None
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bnpl_fingerprints (
+            user_email TEXT NOT NULL,
+            obligation_key TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            simhash INTEGER,
+            PRIMARY KEY (user_email, obligation_key, record_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(FOLDED_MESSAGES_TABLE_SQL)
+    _rebuild_keyed_by_account(cursor, "bnpl_folded_messages", FOLDED_MESSAGES_TABLE_SQL)
+
+    if not fingerprints_exist:
+        cursor.execute(f"""
+            SELECT user_email, id, vendor, amount, due_date FROM bnpl_records
+            UNION ALL
+            SELECT user_email, id, vendor, amount, due_date FROM {ARCHIVE_TABLE}
+        """)
+        cursor.executemany(
+            "INSERT OR IGNORE INTO bnpl_fingerprints (user_email, obligation_key, record_id) VALUES (?, ?, ?)",
+            [(user_email, key, record_id)
+             for user_email, record_id, vendor, amount, due_date in cursor.fetchall()
+             for key in [_obligation_key(vendor, amount, due_date)] if key]
+        )
+
+    # Gmail accounts whose mail is synced into a user's records (the login
+    # account included). credentials is the encrypted refresh credentials
+    # (gmail_service.seal_credentials); sync_cursor is the Unix time the last
+    # complete sync of the account started
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS linked_accounts (
+            user_email TEXT NOT NULL,
+            account_email TEXT NOT NULL,
+            credentials TEXT NOT NULL,
+            sync_cursor REAL,
+            linked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_synced_at TIMESTAMP,
+            PRIMARY KEY (user_email, account_email)
+        )
+    """)
+    # Credentials stored as plain JSON before they were encrypted are dropped:
+    # the login account is linked again from its session, others by the user
+    cursor.execute("UPDATE linked_accounts SET credentials = '' WHERE credentials LIKE '{%'")
+
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
+    # WAL (persistent, can't be set inside a transaction): readers such as a
+    # streamed response's open cursor no longer block writers, e.g. the
+    # session save that runs before that response is sent
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+    logger.info("Database schema migrated", extra={"schema_version": SCHEMA_VERSION})
+    return True
+
+def _rebuild_keyed_by_account(cursor, table, create_sql):
+    """
+    Recreate a table that predates account_email from create_sql, inside
+    init_db's transaction. Rows keep their values (account_email ''), and
+    an AUTOINCREMENT table keeps its id sequence. No-op for a current table.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    columns = [column[1] for column in cursor.fetchall()]
+    if "account_email" in columns:
+        return
+
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+    sequence = cursor.fetchone()
+
+    # Renaming moves the old indexes along; they go with the old table and
+    # init_db recreates them afterwards
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unkeyed")
+    cursor.execute(create_sql)
+    column_list = ", ".join(columns)
+    cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {table}_unkeyed")
+    cursor.execute(f"DROP TABLE {table}_unkeyed")
+
+    if sequence:
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, sequence[0]))
+
+def salary_or_default(salary):
+    """The salary every finance path uses for a stored one (None or 0 -> DEFAULT_SALARY)"""
+    return salary or DEFAULT_SALARY
+
+def _monthly_share(amount, installments):
+    """Monthly EMI contributed by one record (0 when it has no valid split)"""
+    if amount and installments and installments > 0:
+        return amount / installments
+    return 0
+
+def _iso_due_date(due_date):
+    """Convert a DD/MM/YYYY due date to YYYY-MM-DD, or None if it isn't a real date"""
+    if not due_date or len(due_date) != 10 or due_date[2] != "/" or due_date[5] != "/":
+        return None
+    return f"{due_date[6:]}-{due_date[3:5]}-{due_date[:2]}"
+
+def _obligation_key(vendor, amount, due_date):
+    """(vendor, amount, due date) as one string, or None if the record lacks any of them"""
+    iso = _iso_due_date(due_date)
+    if not vendor or not amount or not iso:
+        return None
+    return f"{vendor.strip().lower()}|{amount:.2f}|{iso}"
+
+def _compute_user_aggregates(cursor, user_email=None):
+    """Recompute aggregates from bnpl_records, keyed by user email"""
+    query = f"""
+        SELECT user_email,
+               COALESCE(SUM(CASE WHEN amount THEN amount ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN amount AND installments > 0 THEN amount * 1.0 / installments ELSE 0 END), 0),
+               COUNT(*),
+               MIN({DUE_ON_SQL})
+        FROM bnpl_records
+        WHERE status = 'active'
+    """
+    if user_email:
+        cursor.execute(query + " AND user_email = ? GROUP BY user_email", (user_email,))
+    else:
+        cursor.execute(query + " GROUP BY user_email")
+
+    return {
+        row[0]: {
+            "total_outstanding": row[1],
+            "monthly_obligation": row[2],
+            "active_count": row[3],
+            "next_due_date": row[4]
+        }
+        for row in cursor.fetchall()
+    }
+
+def _rebuild_user_aggregates(cursor, user_email=None):
+    """
+    Replace stored aggregates with values recomputed from scratch.
+    Rows are reset rather than deleted so data versions keep counting up.
+    """
+    fresh = _compute_user_aggregates(cursor, user_email)
+
+    reset = """
+        UPDATE user_aggregates SET
+            total_outstanding = 0, monthly_obligation = 0, active_count = 0,
+            next_due_date = NULL, version = version + 1, updated_at = CURRENT_TIMESTAMP
+    """
+    if user_email:
+        cursor.execute(reset + " WHERE user_email = ?", (user_email,))
+    else:
+        cursor.execute(reset)
+
+    cursor.executemany("""
+        INSERT INTO user_aggregates (user_email, total_outstanding, monthly_obligation, active_count, next_due_date, version)
+        VALUES (?, ?, ?, ?, ?, 1)
+        ON CONFLICT(user_email) DO UPDATE SET
+            total_outstanding = excluded.total_outstanding,
+            monthly_obligation = excluded.monthly_obligation,
+            active_count = excluded.active_count,
+            next_due_date = excluded.next_due_date
+    """, [
+        (email, agg["total_outstanding"], agg["monthly_obligation"], agg["active_count"], agg["next_due_date"])
+        for email, agg in fresh.items()
+    ])
+
+def _add_to_aggregates(cursor, user_email, amount, installments, due_date):
+    """Fold a newly active record into the user's aggregates (same transaction as the write)"""
+    _add_many_to_aggregates(cursor, user_email, [(amount, installments, due_date)])
+
+def _add_many_to_aggregates(cursor, user_email, records):
+    """Fold newly active (amount, installments, due_date) records into the user's aggregates in one statement"""
+    total = sum(amount or 0 for amount, _, _ in records)
+    monthly = sum(_monthly_share(amount, installments) for amount, installments, _ in records)
+    due_dates = [iso for iso in (_iso_due_date(due_date) for _, _, due_date in records) if iso]
+    cursor.execute("""
+        INSERT INTO user_aggregates (user_email, total_outstanding, monthly_obligation, active_count, next_due_date)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_email) DO UPDATE SET
+            total_outstanding = total_outstanding + excluded.total_outstanding,
+            monthly_obligation = monthly_obligation + excluded.monthly_obligation,
+            active_count = active_count + excluded.active_count,
+            next_due_date = CASE
+                WHEN next_due_date IS NULL THEN excluded.next_due_date
+                WHEN excluded.next_due_date IS NULL THEN next_due_date
+                ELSE MIN(next_due_date, excluded.next_due_date)
+            END,
+            updated_at = CURRENT_TIMESTAMP
+    """, (user_email, total, monthly, len(records), min(due_dates) if due_dates else None))
+
+def _remove_from_aggregates(cursor, user_email, amount, installments, due_date):
+    """
+    Take a record that stopped being active out of the user's aggregates.
+    Must run after the record's status has been changed.
+    """
+    cursor.execute("""
+        UPDATE user_aggregates SET
+            total_outstanding = CASE WHEN active_count <= 1 THEN 0 ELSE total_outstanding - ? END,
+            monthly_obligation = CASE WHEN active_count <= 1 THEN 0 ELSE monthly_obligation - ? END,
+            active_count = MAX(active_count - 1, 0),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE user_email = ?
+    """, (amount or 0, _monthly_share(amount, installments), user_email))
+
+    # Only the earliest due date needs a rescan, and only if we just removed it
+    cursor.execute("SELECT next_due_date FROM user_aggregates WHERE user_email = ?", (user_email,))
+    row = cursor.fetchone()
+    if row and row[0] is not None and row[0] == _iso_due_date(due_date):
+        cursor.execute(f"""
+            UPDATE user_aggregates SET next_due_date = (
+                SELECT MIN({DUE_ON_SQL}) FROM bnpl_records
+                WHERE user_email = ? AND status = 'active'
+            )
+            WHERE user_email = ?
+        """, (user_email, user_email))
+
+def _bump_data_version(cursor, user_email):
+    """
+    Advance the user's data version; call once per write transaction that
+    changes their records or profile. Returns the new version.
+    """
+    cursor.execute("""
+        INSERT INTO user_aggregates (user_email, version) VALUES (?, 1)
+        ON CONFLICT(user_email) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    """, (user_email,))
+    cursor.execute("SELECT version FROM user_aggregates WHERE user_email = ?", (user_email,))
+    return cursor.fetchone()[0]
+
+@db_timed
+def get_user_data_version(user_email):
+    """Current data version for a user (0 if they have never had records)"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT version FROM user_aggregates WHERE user_email = ?", (user_email,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row and row[0] else 0
+
+def add_record_listener(callback):
+    """
+    Register callback(user_email, record_ids, version), called after a write
+    that changed those records commits. version is the user's data version
+    the write produced (the previous one was version - 1), or None when the
+    change can't be described record by record (e.g. clear_bnpl_records).
+    """
+    _record_listeners.append(callback)
+
+def _notify_record_change(user_email, record_ids, version):
+    for callback in _record_listeners:
+        try:
+            callback(user_email, record_ids, version)
+        except Exception as e:
+            logger.exception("Record listener failed", extra={"error": str(e)})
+
+@db_timed
+def get_user_aggregates(user_email):
+    """
+    Get the stored aggregates over a user's active records.
+    next_due_date is YYYY-MM-DD (earliest due date among active records).
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT total_outstanding, monthly_obligation, active_count, next_due_date
+        FROM user_aggregates WHERE user_email = ?
+    """, (user_email,))
+    row = cursor.fetchone()
+    conn.close()
+
+    if row:
+        return {
+            "total_outstanding": row[0] or 0,
+            "monthly_obligation": row[1] or 0,
+            "active_count": row[2] or 0,
+            "next_due_date": row[3]
+        }
+    return {
+        "total_outstanding": 0,
+        "monthly_obligation": 0,
+        "active_count": 0,
+        "next_due_date": None
+    }
+
+@db_timed
+def iter_active_record_columns(after_user=None, through_user=None):
+    """
+    Stream (user_email, amount, installments, due_on) for every active record,
+    grouped by user and newest first within a user (the order calculate_analysis
+    sees them in). due_on is YYYY-MM-DD or None. Used by batch scoring.
+    after_user / through_user: only users with after_user < email <= through_user
+    """
+    conditions = ["status = 'active'"]
+    params = []
+    if after_user is not None:
+        conditions.append("user_email > ?")
+        params.append(after_user)
+    if through_user is not None:
+        conditions.append("user_email <= ?")
+        params.append(through_user)
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        yield from conn.execute(f"""
+            SELECT user_email, amount, installments, {VALID_DUE_ON_SQL}
+            FROM bnpl_records
+            WHERE {' AND '.join(conditions)}
+            ORDER BY user_email, created_at DESC, id DESC
+        """, params)
+    finally:
+        conn.close()
+
+@db_timed
+def get_scoring_salaries(after_user=None, limit=None):
+    """
+    Salary for every user who has BNPL records (active, paid or archived),
+    defaulted by salary_or_default like the per-user profile.
+    Ordered by email; after_user / limit page through them.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT r.user_email, u.salary
+        FROM (
+            SELECT DISTINCT user_email FROM bnpl_records WHERE user_email > ?1
+            UNION
+            SELECT DISTINCT user_email FROM {ARCHIVE_TABLE} WHERE user_email > ?1
+        ) r
+        LEFT JOIN users u ON u.email = r.user_email
+        ORDER BY r.user_email
+        LIMIT ?2
+    """, (after_user if after_user is not None else "", limit if limit is not None else -1))
+    salaries = {user_email: salary_or_default(salary) for user_email, salary in cursor.fetchall()}
+    conn.close()
+    return salaries
+
+@db_timed
+def get_scoring_checkpoint():
+    """The most recent unfinished scoring run as a dict, or None"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, as_of, last_user_email, users_scored
+        FROM scoring_runs
+        WHERE finished_at IS NULL
+        ORDER BY id DESC LIMIT 1
+    """)
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return {"run_id": row[0], "as_of": row[1], "last_user_email": row[2], "users_scored": row[3]}
+    return None
+
+@db_timed
+def start_scoring_run(as_of):
+    """Record a new scoring run (it becomes the checkpoint to resume); returns its id"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO scoring_runs (as_of) VALUES (?)", (as_of,))
+    run_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return run_id
+
+@db_timed
+def save_user_scores(run_id, scores, last_user_email):
+    """
+    Upsert a chunk of per-user scores and move the run's checkpoint past it,
+    in one transaction, so a crash never loses or double-counts a chunk.
+    scores: (user_email, total_outstanding, monthly_obligation, upcoming_dues,
+             debt_ratio, risk_score, risk_level, transaction_count, salary) tuples
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT OR REPLACE INTO user_scores (
+            user_email, total_outstanding, monthly_obligation, upcoming_dues,
+            debt_ratio, risk_score, risk_level, transaction_count, salary, run_id, scored_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """, [score + (run_id,) for score in scores])
+    cursor.execute("""
+        UPDATE scoring_runs SET last_user_email = ?, users_scored = users_scored + ?
+        WHERE id = ?
+    """, (last_user_email, len(scores), run_id))
+    conn.commit()
+    conn.close()
+
+@db_timed
+def finish_scoring_run(run_id):
+    """Mark a run complete and drop scores of users it no longer found"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM user_scores WHERE run_id != ?", (run_id,))
+    cursor.execute("UPDATE scoring_runs SET finished_at = CURRENT_TIMESTAMP WHERE id = ?", (run_id,))
+    conn.commit()
+    conn.close()
+
+@db_timed
+def get_score_totals():
+    """
+    Sums over every user's precomputed score (see backend/scoring.py):
+    total_outstanding, monthly_obligation, upcoming_dues, transaction_count,
+    plus users and the time the latest finished run was scored as of.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COALESCE(SUM(total_outstanding), 0), COALESCE(SUM(monthly_obligation), 0),
+               COALESCE(SUM(upcoming_dues), 0), COALESCE(SUM(transaction_count), 0), COUNT(*)
+        FROM user_scores
+    """)
+    row = cursor.fetchone()
+    cursor.execute("SELECT as_of FROM scoring_runs WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT 1")
+    run = cursor.fetchone()
     conn.close()
     
-def get_bnpl_records(user_email=None, status_filter=None):
+    return {
+        "total_outstanding": row[0],
+        "monthly_obligation": row[1],
+        "upcoming_dues": row[2],
+        "transaction_count": row[3],
+        "users": row[4],
+        "as_of": run[0] if run else None
+    }
+
+@db_timed
+def verify_user_aggregates(fix=False):
     """
-    Get BNPL records. 
-    status_filter: None (all), 'active', 'paid'
+    Recompute every user's aggregates from scratch and compare with the stored rows.
+    Returns a list of drift entries; with fix=True the stored rows are rebuilt.
     """
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+
+    fresh = _compute_user_aggregates(cursor)
+
+    cursor.execute("""
+        SELECT user_email, total_outstanding, monthly_obligation, active_count, next_due_date
+        FROM user_aggregates
+    """)
+    stored = {
+        row[0]: {
+            "total_outstanding": row[1] or 0,
+            "monthly_obligation": row[2] or 0,
+            "active_count": row[3] or 0,
+            "next_due_date": row[4]
+        }
+        for row in cursor.fetchall()
+    }
+
+    empty = {"total_outstanding": 0, "monthly_obligation": 0, "active_count": 0, "next_due_date": None}
+    drift = []
+
+    for user_email in sorted(set(fresh) | set(stored)):
+        expected = fresh.get(user_email, empty)
+        actual = stored.get(user_email, empty)
+
+        for field in ("total_outstanding", "monthly_obligation"):
+            if abs(expected[field] - actual[field]) > AGGREGATE_TOLERANCE:
+                drift.append({"user_email": user_email, "field": field, "expected": expected[field], "actual": actual[field]})
+        for field in ("active_count", "next_due_date"):
+            if expected[field] != actual[field]:
+                drift.append({"user_email": user_email, "field": field, "expected": expected[field], "actual": actual[field]})
+
+    if fix and drift:
+        _rebuild_user_aggregates(cursor)
+        conn.commit()
+
+    conn.close()
+    return drift
+    
+def _bnpl_records_query(user_email=None, status_filter=None, vendor=None, due_from=None, due_to=None,
+                        after=None, limit=None, fields=None, created_from=None, created_to=None):
+    """
+    Build the SELECT behind get_bnpl_records; every filter is pushed down to SQL.
+    Without a projection the full BNPL_RECORD_COLUMNS row is selected.
+    """
+    if fields:
+        unknown = [field for field in fields if field not in RECORD_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown record field(s): {', '.join(unknown)}")
+    columns = list(fields) if fields else list(BNPL_RECORD_COLUMNS)
+    
+    clauses = []
+    params = []
     
     if user_email:
-        if status_filter:
-            cursor.execute("""
-                SELECT id, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at 
-                FROM bnpl_records 
-                WHERE user_email = ? AND status = ?
-                ORDER BY created_at DESC
-            """, (user_email, status_filter))
-        else:
-            cursor.execute("""
-                SELECT id, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at 
-                FROM bnpl_records 
-                WHERE user_email = ?
-                ORDER BY created_at DESC
-            """, (user_email,))
+        clauses.append("user_email = ?")
+        params.append(user_email)
+    if status_filter:
+        clauses.append("status = ?")
+        params.append(status_filter)
+    if vendor:
+        clauses.append("vendor = ? COLLATE NOCASE")
+        params.append(vendor)
+    if due_from:
+        clauses.append(f"{DUE_ON_SQL} >= ?")
+        params.append(normalize_date_param(due_from))
+    if due_to:
+        clauses.append(f"{DUE_ON_SQL} <= ?")
+        params.append(normalize_date_param(due_to))
+    if created_from:
+        clauses.append("created_at >= ?")
+        params.append(normalize_date_param(created_from))
+    if created_to:
+        # created_at carries a time of day; include the whole end date
+        clauses.append("created_at < date(?, '+1 day')")
+        params.append(normalize_date_param(created_to))
+    if after:
+        # Keyset pagination: rows strictly after (created_at, id) in DESC order
+        created_at, record_id = after
+        clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+        params.extend([created_at, created_at, record_id])
+    
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    
+    if status_filter in (None, "paid"):
+        # Paid history may live in the archive table: read both transparently
+        row_columns = ", ".join(BNPL_RECORD_COLUMNS)
+        query = f"""
+            SELECT {', '.join(columns)} FROM (
+                SELECT {row_columns} FROM bnpl_records{where}
+                UNION ALL
+                SELECT {row_columns} FROM {ARCHIVE_TABLE}{where}
+            )
+        """
+        params = params + params
     else:
+        query = f"SELECT {', '.join(columns)} FROM bnpl_records{where}"
+    
+    query += " ORDER BY created_at DESC, id DESC"
+    if limit:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    
+    return columns, query, params
+
+def normalize_date_param(value):
+    """
+    Accept a date as DD/MM/YYYY (the stored format) or YYYY-MM-DD
+    and return it as YYYY-MM-DD for comparisons against DUE_ON_SQL.
+    """
+    value = value.strip()
+    iso = _iso_due_date(value)
+    if iso:
+        datetime.strptime(iso, "%Y-%m-%d")
+        return iso
+    datetime.strptime(value, "%Y-%m-%d")
+    return value
+
+@db_timed
+def iter_bnpl_records(user_email=None, status_filter=None, vendor=None, due_from=None, due_to=None,
+                      after=None, limit=None, fields=None, created_from=None, created_to=None):
+    """
+    Iterate BNPL records straight off the SQLite cursor, newest first.
+    Same arguments as get_bnpl_records; the connection closes when iteration ends.
+    """
+    columns, query, params = _bnpl_records_query(
+        user_email, status_filter, vendor, due_from, due_to, after, limit, fields, created_from, created_to
+    )
+    
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if fields:
+            for row in conn.execute(query, params):
+                yield dict(zip(columns, row))
+        else:
+            yield from _as_bnpl_records(conn.execute(query, params))
+    finally:
+        conn.close()
+
+@db_timed
+def get_bnpl_records(user_email=None, status_filter=None, vendor=None, due_from=None, due_to=None,
+                     after=None, limit=None, fields=None, created_from=None, created_to=None):
+    """
+    Get BNPL records, newest first (created_at, then id).
+    status_filter: None (all), 'active', 'paid'
+    vendor: exact vendor name (case-insensitive)
+    due_from / due_to: inclusive due-date range, DD/MM/YYYY or YYYY-MM-DD
+    after: (created_at, id) of the last row of the previous page
+    limit: page size
+    fields: subset of RECORD_FIELDS to return as dicts (default: full BnplRecord rows)
+    created_from / created_to: inclusive range of the date the record was created
+    """
+    return list(iter_bnpl_records(
+        user_email, status_filter, vendor, due_from, due_to, after, limit, fields, created_from, created_to
+    ))
+
+def _is_message_seen(cursor, user_email, account_email, gmail_message_id):
+    """Whether a message was already stored, archived or folded for this account (or for no account)"""
+    cursor.execute(f"""
+        SELECT 1 FROM bnpl_records WHERE user_email = ? AND account_email IN (?, '') AND gmail_message_id = ?
+        UNION ALL
+        SELECT 1 FROM {ARCHIVE_TABLE} WHERE user_email = ? AND account_email IN (?, '') AND gmail_message_id = ?
+        UNION ALL
+        SELECT 1 FROM bnpl_folded_messages WHERE user_email = ? AND account_email IN (?, '') AND gmail_message_id = ?
+        LIMIT 1
+    """, (user_email, account_email, gmail_message_id) * 3)
+    return cursor.fetchone() is not None
+
+def _same_obligation(known, simhash):
+    """
+    Whether two records with the same obligation key are one obligation.
+    Both bodies must be fingerprinted: the key alone can't tell two real
+    same-vendor, same-amount, same-day purchases apart.
+    """
+    return known is not None and simhash is not None and simhash_distance(known, simhash) <= MAX_SIMHASH_DISTANCE
+
+def _store_record(cursor, user_email, record, simhash=None):
+    """
+    Insert one parsed message inside the caller's transaction, or fold it
+    into the record for the same obligation. Returns (outcome, record_id)
+    with outcome "stored", "folded" (record_id is the record it was folded
+    into) or "duplicate" (message already seen; record_id None).
+    record["account_email"] is the mailbox the message came from ('' if none).
+    """
+    gmail_message_id = record["gmail_message_id"]
+    account_email = record.get("account_email", "")
+    if _is_message_seen(cursor, user_email, account_email, gmail_message_id):
+        return "duplicate", None
+
+    key = _obligation_key(record["vendor"], record["amount"], record["due_date"])
+    if key:
+        # Index lookup on (user_email, obligation_key): nearly always zero or one row
         cursor.execute("""
-            SELECT id, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at 
-            FROM bnpl_records 
-            ORDER BY created_at DESC
-        """)
+            SELECT record_id, simhash FROM bnpl_fingerprints WHERE user_email = ? AND obligation_key = ?
+        """, (user_email, key))
+        for record_id, known in cursor.fetchall():
+            if _same_obligation(known, simhash):
+                cursor.execute("""
+                    INSERT INTO bnpl_folded_messages (user_email, account_email, gmail_message_id, record_id)
+                    VALUES (?, ?, ?, ?)
+                """, (user_email, account_email, gmail_message_id, record_id))
+                return "folded", record_id
+
+    cursor.execute("""
+        INSERT INTO bnpl_records (user_email, account_email, gmail_message_id, vendor, amount, installments, due_date, email_subject)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (user_email, account_email, gmail_message_id, record["vendor"], record["amount"],
+          record["installments"], record["due_date"], record["email_subject"]))
+    record_id = cursor.lastrowid
+    if key:
+        cursor.execute("""
+            INSERT INTO bnpl_fingerprints (user_email, obligation_key, record_id, simhash) VALUES (?, ?, ?, ?)
+        """, (user_email, key, record_id, simhash))
+    return "stored", record_id
+
+@db_timed
+def insert_bnpl_record(user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject,
+                       simhash=None, account_email=""):
+    """
+    Insert BNPL record with Gmail message ID for idempotent sync.
+    account_email: the Gmail account the message came from; message ids
+    are only unique per mailbox.
+    simhash: fingerprint of the email body (fingerprint.body_simhash); a
+    reminder for an obligation that already has a record with a matching
+    fingerprint is folded into it. Without one the record is always stored.
+    Returns "stored", "folded" or "duplicate".
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
     
-    rows = cursor.fetchall()
-    conn.close()
+    try:
+        outcome, record_id = _store_record(cursor, user_email, {
+            "gmail_message_id": gmail_message_id, "account_email": account_email, "vendor": vendor,
+            "amount": amount, "installments": installments, "due_date": due_date, "email_subject": email_subject
+        }, simhash)
+        if outcome != "stored":
+            # A folded message is committed too, so later syncs skip it
+            conn.commit()
+            return outcome
+        
+        _add_to_aggregates(cursor, user_email, amount, installments, due_date)
+        version = _bump_data_version(cursor, user_email)
+        
+        conn.commit()
+        _notify_record_change(user_email, [record_id], version)
+        return "stored"
+    except sqlite3.IntegrityError:
+        # Duplicate gmail_message_id for this user and account (stored concurrently) - skip
+        logger.debug("Skipping duplicate Gmail message", extra={"gmail_message_id": gmail_message_id})
+        return "duplicate"
+    finally:
+        conn.close()
 
-    return [
-        {
-            "id": row[0],
-            "gmail_message_id": row[1],
-            "vendor": row[2],
-            "amount": row[3],
-            "installments": row[4],
-            "due_date": row[5],
-            "email_subject": row[6],
-            "status": row[7],
-            "created_at": row[8]
-        }
-        for row in rows
-    ]
+@db_timed
+def bulk_insert_bnpl_records(user_email, records):
+    """
+    Insert many records for one user in a single transaction. Records are
+    dicts with insert_bnpl_record's fields (simhash and account_email optional); repeat
+    reminders are folded as in insert_bnpl_record, including into records
+    earlier in the same batch. Aggregates, the data version and record
+    listeners are updated once for the batch.
+    Returns counts: {"stored": n, "folded": n, "duplicate": n}.
+    """
+    counts = {"stored": 0, "folded": 0, "duplicate": 0}
+    if not records:
+        return counts
+    
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    try:
+        inserted_ids = []
+        added = []
+        for record in records:
+            outcome, record_id = _store_record(cursor, user_email, record, record.get("simhash"))
+            counts[outcome] += 1
+            if outcome == "stored":
+                inserted_ids.append(record_id)
+                added.append((record["amount"], record["installments"], record["due_date"]))
+        
+        if not added:
+            conn.commit()
+            return counts
+        
+        _add_many_to_aggregates(cursor, user_email, added)
+        version = _bump_data_version(cursor, user_email)
+        conn.commit()
+        _notify_record_change(user_email, inserted_ids, version)
+        return counts
+    finally:
+        conn.close()
 
-def insert_bnpl_record(user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject):
-    """Insert BNPL record with Gmail message ID for idempotent sync"""
+@db_timed
+def fold_duplicate_records(user_email=None, dry_run=False):
+    """
+    Fold records already stored for the same obligation (same obligation key
+    and compatible fingerprints, as at insert time) into one record per
+    obligation: a paid one if any, else the oldest. Folded records are
+    deleted and their message ids kept in bnpl_folded_messages; aggregates
+    are rebuilt for every user that changed.
+    Returns {user_email: number of records folded}.
+    """
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     try:
-        cursor.execute("""
-            INSERT INTO bnpl_records (user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject))
+        query = """
+            SELECT r.user_email, r.id, r.account_email, r.gmail_message_id, r.status, f.obligation_key, f.simhash
+            FROM bnpl_records r
+            JOIN bnpl_fingerprints f ON f.user_email = r.user_email AND f.record_id = r.id
+        """
+        params = ()
+        if user_email:
+            query += " WHERE r.user_email = ?"
+            params = (user_email,)
+        cursor.execute(query + " ORDER BY r.user_email, f.obligation_key, r.status = 'paid' DESC, r.id", params)
         
+        # Within each (user, key) group, each record folds into the first kept one it matches
+        folds = {}
+        kept = {}
+        for email, record_id, account_email, gmail_message_id, status, key, simhash in cursor.fetchall():
+            survivors = kept.setdefault((email, key), [])
+            target = next((
+                survivor_id for survivor_id, known in survivors if _same_obligation(known, simhash)
+            ), None)
+            if target is None:
+                survivors.append((record_id, simhash))
+            else:
+                folds.setdefault(email, []).append((record_id, account_email, gmail_message_id, target))
+        
+        summary = {email: len(user_folds) for email, user_folds in folds.items()}
+        if dry_run or not folds:
+            return summary
+        
+        for email, user_folds in folds.items():
+            cursor.executemany("""
+                INSERT OR IGNORE INTO bnpl_folded_messages (user_email, account_email, gmail_message_id, record_id)
+                VALUES (?, ?, ?, ?)
+            """, [(email, account_email, gmail_message_id, target)
+                  for _, account_email, gmail_message_id, target in user_folds])
+            cursor.executemany("DELETE FROM bnpl_fingerprints WHERE user_email = ? AND record_id = ?",
+                               [(email, record_id) for record_id, _, _, _ in user_folds])
+            cursor.executemany("DELETE FROM bnpl_records WHERE id = ?", [(record_id,) for record_id, _, _, _ in user_folds])
+            # Also advances the user's data version
+            _rebuild_user_aggregates(cursor, email)
         conn.commit()
-        return True
-    except sqlite3.IntegrityError as e:
-        # Duplicate gmail_message_id for this user - skip
-        print(f"[DB] Skipping duplicate Gmail message {gmail_message_id} for user {user_email}")
-        return False
+        
+        for email in folds:
+            _notify_record_change(email, [], None)
+        logger.info("Duplicate records folded", extra={"user_count": len(folds), "record_count": sum(summary.values())})
+        return summary
     finally:
         conn.close()
 
+@db_timed
 def clear_bnpl_records(user_email):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     cursor.execute("DELETE FROM bnpl_records WHERE user_email = ?", (user_email,))
+    cursor.execute(f"DELETE FROM {ARCHIVE_TABLE} WHERE user_email = ?", (user_email,))
+    cursor.execute("DELETE FROM bnpl_fingerprints WHERE user_email = ?", (user_email,))
+    cursor.execute("DELETE FROM bnpl_folded_messages WHERE user_email = ?", (user_email,))
+    _rebuild_user_aggregates(cursor, user_email)
     conn.commit()
     conn.close()
+    _notify_record_change(user_email, [], None)
 
+@db_timed
 def get_user_salary(user_email):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     cursor.execute("SELECT salary FROM users WHERE email = ?", (user_email,))
     row = cursor.fetchone()
     conn.close()
-    return row[0] if row else 30000  # Default salary
+    return salary_or_default(row[0] if row else None)
 
-def get_user_profile(user_email):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT email, salary, full_name, monthly_rent, other_expenses, city, existing_loans 
-        FROM users WHERE email = ?
-    """, (user_email,))
-    row = cursor.fetchone()
-    conn.close()
-    
+PROFILE_QUERY = """
+    SELECT email, salary, full_name, monthly_rent, other_expenses, city, existing_loans 
+    FROM users WHERE email = ?
+"""
+
+def _profile_from_row(row):
     if row:
         return {
             "email": row[0],
-            "salary": row[1] or 30000,
+            "salary": salary_or_default(row[1]),
             "full_name": row[2],
             "monthly_rent": row[3] or 0,
             "other_expenses": row[4] or 0,
@@ -156,6 +1124,51 @@ def get_user_profile(user_email):
         }
     return None
 
+@db_timed
+def get_user_profile(user_email):
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(PROFILE_QUERY, (user_email,))
+    row = cursor.fetchone()
+    conn.close()
+    
+    return _profile_from_row(row)
+
+@db_timed
+def get_dashboard_data(user_email):
+    """
+    Everything the dashboard needs, read on one connection in one read
+    transaction so the parts are consistent with each other:
+    profile (None if not saved), active records (BnplRecord, newest first)
+    and the data version they were read at.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("BEGIN")
+        cursor.execute(PROFILE_QUERY, (user_email,))
+        profile = _profile_from_row(cursor.fetchone())
+        
+        cursor.execute(f"""
+            SELECT {', '.join(BNPL_RECORD_COLUMNS)}
+            FROM bnpl_records
+            WHERE user_email = ? AND status = 'active'
+            ORDER BY created_at DESC, id DESC
+        """, (user_email,))
+        records = list(_as_bnpl_records(cursor.fetchall()))
+        
+        cursor.execute("SELECT version FROM user_aggregates WHERE user_email = ?", (user_email,))
+        row = cursor.fetchone()
+        version = row[0] if row and row[0] else 0
+        
+        conn.rollback()
+    finally:
+        conn.close()
+    
+    return {"profile": profile, "records": records, "version": version}
+
+@db_timed
 def update_user_salary(user_email, salary):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
@@ -164,10 +1177,15 @@ def update_user_salary(user_email, salary):
         INSERT INTO users (email, salary) VALUES (?, ?)
         ON CONFLICT(email) DO UPDATE SET salary = ?
     """, (user_email, salary, salary))
+    _bump_data_version(cursor, user_email)
     
     conn.commit()
     conn.close()
+    
+    # Not a per-record change: cached per-user state is dropped rather than patched
+    _notify_record_change(user_email, [], None)
 
+@db_timed
 def update_user_profile(user_email, profile_data):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
@@ -199,64 +1217,335 @@ def update_user_profile(user_email, profile_data):
         profile_data.get("city"),
         profile_data.get("existing_loans", 0)
     ))
+    _bump_data_version(cursor, user_email)
     
     conn.commit()
     conn.close()
+    
+    _notify_record_change(user_email, [], None)
 
+@db_timed
 def update_bnpl_status(record_id, status):
     """Update BNPL record status (active/paid)"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    cursor.execute("""
-        UPDATE bnpl_records 
-        SET status = ? 
-        WHERE id = ?
-    """, (status, record_id))
+    user_email = _apply_status_change(cursor, record_id, status)
+    version = _bump_data_version(cursor, user_email) if user_email else None
     
     conn.commit()
     conn.close()
+    
+    if user_email:
+        _notify_record_change(user_email, [record_id], version)
 
-def get_bnpl_record_by_id(record_id):
-    """Get a specific BNPL record by ID"""
+@db_timed
+def update_bnpl_statuses(user_email, updates):
+    """
+    Apply several status changes for one user in a single transaction.
+    updates: list of (record_id, status); a repeated id keeps its last status.
+    Ownership of every id is checked with one query before anything is written.
+    Returns tuple: (success, error, record_ids) where error is 'not_found' or
+    'forbidden' and record_ids are the offending ids.
+    """
+    changes = dict(updates)
+    if not changes:
+        return (True, None, [])
+    
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    try:
+        placeholders = ", ".join("?" * len(changes))
+        ids = list(changes)
+        cursor.execute(f"""
+            SELECT id, user_email, amount, installments, due_date, status, 0 FROM bnpl_records
+            WHERE id IN ({placeholders})
+            UNION ALL
+            SELECT id, user_email, amount, installments, due_date, status, 1 FROM {ARCHIVE_TABLE}
+            WHERE id IN ({placeholders})
+        """, ids + ids)
+        found = {row[0]: row for row in cursor.fetchall()}
+        
+        missing = [record_id for record_id in ids if record_id not in found]
+        if missing:
+            return (False, "not_found", missing)
+        
+        foreign = [record_id for record_id in ids if found[record_id][1] != user_email]
+        if foreign:
+            return (False, "forbidden", foreign)
+        
+        for record_id, status in changes.items():
+            row = found[record_id]
+            archived = row[6]
+            # Archived rows go through the restore path inside _apply_status_change
+            _apply_status_change(cursor, record_id, status, None if archived else row[1:6])
+        version = _bump_data_version(cursor, user_email)
+        
+        conn.commit()
+    finally:
+        conn.close()
+    
+    _notify_record_change(user_email, ids, version)
+    return (True, None, ids)
+
+def _apply_status_change(cursor, record_id, status, row=None):
+    """
+    Change one record's status and keep user_aggregates in step, inside the
+    caller's transaction. row is (user_email, amount, installments, due_date, status)
+    if the caller already loaded it from bnpl_records.
+    Returns the record's user_email, or None if the record doesn't exist.
+    """
+    if row is None:
+        cursor.execute("""
+            SELECT user_email, amount, installments, due_date, status
+            FROM bnpl_records WHERE id = ?
+        """, (record_id,))
+        row = cursor.fetchone()
+        
+        if not row and status != "paid":
+            # Reopening an archived record brings it back into the hot table
+            row = _restore_from_archive(cursor, record_id)
+    
+    if not row:
+        return None
+    
+    user_email, amount, installments, due_date, old_status = row
+    
+    if old_status != status:
+        cursor.execute("""
+            UPDATE bnpl_records 
+            SET status = ?, paid_at = CASE WHEN ? = 'paid' THEN CURRENT_TIMESTAMP END
+            WHERE id = ?
+        """, (status, status, record_id))
+    
+    if old_status != "active" and status == "active":
+        _add_to_aggregates(cursor, user_email, amount, installments, due_date)
+    elif old_status == "active" and status != "active":
+        _remove_from_aggregates(cursor, user_email, amount, installments, due_date)
+    
+    return user_email
+
+def _restore_from_archive(cursor, record_id):
+    """
+    Move an archived record back into bnpl_records (status unchanged).
+    Returns (user_email, amount, installments, due_date, status) or None.
+    """
+    cursor.execute(f"""
+        INSERT INTO bnpl_records (id, user_email, account_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at, paid_at)
+        SELECT id, user_email, account_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at, paid_at
+        FROM {ARCHIVE_TABLE} WHERE id = ?
+    """, (record_id,))
+    if cursor.rowcount == 0:
+        return None
+    
+    cursor.execute(f"DELETE FROM {ARCHIVE_TABLE} WHERE id = ?", (record_id,))
     cursor.execute("""
-        SELECT id, user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at 
-        FROM bnpl_records 
-        WHERE id = ?
+        SELECT user_email, amount, installments, due_date, status
+        FROM bnpl_records WHERE id = ?
     """, (record_id,))
+    return cursor.fetchone()
+
+@db_timed
+def archive_paid_records(min_age_days=90, batch_size=500):
+    """
+    Move paid records older than min_age_days (since they were paid, or since
+    creation for records paid before paid_at existed) into the archive table.
+    Works in batches, each its own short transaction. Returns the number moved.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    moved = 0
     
-    row = cursor.fetchone()
-    conn.close()
+    try:
+        while True:
+            cursor.execute("""
+                SELECT id, user_email FROM bnpl_records
+                WHERE status = 'paid' AND COALESCE(paid_at, created_at) < datetime('now', ?)
+                LIMIT ?
+            """, (f"-{int(min_age_days)} days", batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            
+            ids = [row[0] for row in rows]
+            ids_by_user = {}
+            for record_id, user_email in rows:
+                ids_by_user.setdefault(user_email, []).append(record_id)
+            
+            placeholders = ", ".join("?" * len(ids))
+            cursor.execute(f"""
+                INSERT INTO {ARCHIVE_TABLE} (id, user_email, account_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at, paid_at)
+                SELECT id, user_email, account_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at, paid_at
+                FROM bnpl_records WHERE id IN ({placeholders})
+            """, ids)
+            cursor.execute(f"DELETE FROM bnpl_records WHERE id IN ({placeholders})", ids)
+            # Every write moves the version, even one that reads can't see
+            versions = {user_email: _bump_data_version(cursor, user_email) for user_email in ids_by_user}
+            conn.commit()
+            moved += len(ids)
+            
+            for user_email, record_ids in ids_by_user.items():
+                _notify_record_change(user_email, record_ids, versions[user_email])
+    finally:
+        conn.close()
     
-    if row:
-        return {
-            "id": row[0],
-            "user_email": row[1],
-            "gmail_message_id": row[2],
-            "vendor": row[3],
-            "amount": row[4],
-            "installments": row[5],
-            "due_date": row[6],
-            "email_subject": row[7],
-            "status": row[8],
-            "created_at": row[9]
-        }
-    return None
+    return moved
 
-def is_gmail_message_processed(user_email, gmail_message_id):
-    """Check if a Gmail message has already been processed for this user"""
+@db_timed
+def get_bnpl_record_by_id(record_id):
+    """Get a specific BNPL record by ID (BnplRecord or None), archived ones included"""
     conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = bnpl_record_factory
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT id FROM bnpl_records 
-        WHERE user_email = ? AND gmail_message_id = ?
-    """, (user_email, gmail_message_id))
+    cursor.execute(f"""
+        SELECT {', '.join(BNPL_RECORD_COLUMNS)}
+        FROM bnpl_records 
+        WHERE id = ?
+    """, (record_id,))
     
-    row = cursor.fetchone()
+    record = cursor.fetchone()
+    if record is None:
+        cursor.execute(f"""
+            SELECT {', '.join(BNPL_RECORD_COLUMNS)}
+            FROM {ARCHIVE_TABLE}
+            WHERE id = ?
+        """, (record_id,))
+        record = cursor.fetchone()
     conn.close()
     
-    return row is not None
\ No newline at end of file
+    return record
+
+@db_timed
+def is_gmail_message_processed(user_email, gmail_message_id, account_email=""):
+    """Check if a Gmail message from account_email has already been processed for this user"""
+    conn = sqlite3.connect(DB_PATH)
+    seen = _is_message_seen(conn.cursor(), user_email, account_email, gmail_message_id)
+    conn.close()
+    return seen
+
+@db_timed
+def get_session(session_id, now):
+    """(data, expires_at) of an unexpired session, or None"""
+    conn = sqlite3.connect(DB_PATH)
+    row = conn.execute(
+        "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?", (session_id, now)
+    ).fetchone()
+    conn.close()
+    return row
+
+@db_timed
+def save_session(session_id, data, expires_at):
+    """Create or replace a session"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("""
+        INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+    """, (session_id, data, expires_at))
+    conn.commit()
+    conn.close()
+
+@db_timed
+def delete_session(session_id):
+    """Delete a session and move the session generation, in one transaction"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+    conn.execute("UPDATE session_generation SET generation = generation + 1 WHERE id = 0")
+    conn.commit()
+    conn.close()
+
+@db_timed
+def get_session_generation():
+    """Number of session deletes so far (see delete_session)"""
+    conn = sqlite3.connect(DB_PATH)
+    row = conn.execute("SELECT generation FROM session_generation WHERE id = 0").fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+@db_timed
+def purge_expired_sessions(now):
+    """Delete sessions that expired before now; returns how many"""
+    conn = sqlite3.connect(DB_PATH)
+    deleted = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+@db_timed
+def get_profiled_user_hashes():
+    """User hashes switched on for profiling"""
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute("SELECT user_hash FROM profiled_users ORDER BY user_hash").fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+@db_timed
+def set_user_profiling(user_hash, enabled):
+    """Switch profiling of a user's requests on or off; returns True if that changed anything"""
+    conn = sqlite3.connect(DB_PATH)
+    if enabled:
+        changed = conn.execute("INSERT OR IGNORE INTO profiled_users (user_hash) VALUES (?)", (user_hash,)).rowcount
+    else:
+        changed = conn.execute("DELETE FROM profiled_users WHERE user_hash = ?", (user_hash,)).rowcount
+    conn.commit()
+    conn.close()
+    return changed > 0
+
+@db_timed
+def link_account(user_email, account_email, credentials):
+    """
+    Link a Gmail account to a user, or replace the credentials of an already
+    linked one. credentials: the sealed string from gmail_service.seal_credentials
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("""
+        INSERT INTO linked_accounts (user_email, account_email, credentials) VALUES (?, ?, ?)
+        ON CONFLICT(user_email, account_email) DO UPDATE SET credentials = excluded.credentials
+    """, (user_email, account_email, credentials))
+    conn.commit()
+    conn.close()
+
+@db_timed
+def get_linked_accounts(user_email):
+    """A user's linked accounts (login account first, then in link order), sealed credentials included"""
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute("""
+        SELECT account_email, credentials, sync_cursor, linked_at, last_synced_at
+        FROM linked_accounts
+        WHERE user_email = ?
+        ORDER BY account_email != user_email, linked_at, account_email
+    """, (user_email,)).fetchall()
+    conn.close()
+    return [
+        {
+            "account_email": account_email,
+            "credentials": credentials,
+            "sync_cursor": sync_cursor,
+            "linked_at": linked_at,
+            "last_synced_at": last_synced_at
+        }
+        for account_email, credentials, sync_cursor, linked_at, last_synced_at in rows
+    ]
+
+@db_timed
+def unlink_account(user_email, account_email):
+    """Remove a linked account (its records stay); returns True if it was linked"""
+    conn = sqlite3.connect(DB_PATH)
+    deleted = conn.execute(
+        "DELETE FROM linked_accounts WHERE user_email = ? AND account_email = ?", (user_email, account_email)
+    ).rowcount
+    conn.commit()
+    conn.close()
+    return deleted > 0
+
+@db_timed
+def save_sync_cursor(user_email, account_email, sync_cursor):
+    """Record a complete sync of a linked account; the next one lists only mail after sync_cursor"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("""
+        UPDATE linked_accounts SET sync_cursor = ?, last_synced_at = CURRENT_TIMESTAMP
+        WHERE user_email = ? AND account_email = ?
+    """, (sync_cursor, user_email, account_email))
+    conn.commit()
+    conn.close()
@@ -1,6 +1,8 @@
 import re
 from datetime import datetime
 
+from backend.metrics import parser_timed
+
 # Allowed sender domains/keywords for financial emails
 ALLOWED_SENDERS = [
     'cred', 'paylater', 'pay-later', 'emi', 'simpl', 'lazypay',
@@ -55,6 +57,7 @@ def is_valid_financial_email(sender, subject, body):
     
     return False
 
+@parser_timed("parse", is_match=lambda parsed: parsed["amount"])
 def parse_bnpl_email(sender, subject, body):
     """
     Extract BNPL data with strict structured parsing.
@@ -247,6 +250,7 @@ def extract_due_date(text):
     
     return None
 
+@parser_timed("filter")
 def is_bnpl_email(sender, subject, body):
     """
     Check if email is a valid BNPL/financial email.
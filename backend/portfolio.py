@@ -0,0 +1,109 @@
+"""
+Vectorized batch version of finance.calculate_analysis.
+
+Scores every user in one go from columnar arrays instead of looping over
+per-user record lists. Results are identical to calculate_analysis (same
+float operations in the same order, same rounding), so the two can be
+used interchangeably; benchmarks/check_portfolio.py checks that they do.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+UPCOMING_WINDOW = timedelta(days=30)
+
+
+def build_columns(rows, users):
+    """
+    Turn (user_email, amount, installments, due_on) rows into columnar arrays.
+    rows must be grouped by user (see models.iter_active_record_columns);
+    users is the ordered list of emails that defines each user's index.
+    """
+    position = {email: idx for idx, email in enumerate(users)}
+    emails, amounts, installments, due_on = zip(*rows) if rows else ((), (), (), ())
+
+    return {
+        "user_index": np.fromiter((position[email] for email in emails), dtype=np.int64, count=len(emails)),
+        # None -> 0 so it drops out of every sum, exactly like the falsy checks in finance.py
+        "amount": np.array([a or 0.0 for a in amounts], dtype=np.float64),
+        "installments": np.array([n or 0 for n in installments], dtype=np.int64),
+        # None -> NaT, which never falls inside the upcoming window
+        "due": np.array(due_on, dtype="datetime64[D]"),
+    }
+
+
+def score_columns(columns, salaries, now=None):
+    """
+    Compute the calculate_analysis metrics for every user at once.
+    columns: output of build_columns (active records only)
+    salaries: salary per user index (sequence or array)
+    Returns a dict of per-user arrays.
+    """
+    now = now or datetime.now()
+    user_index = columns["user_index"]
+    amount = columns["amount"]
+    installments = columns["installments"]
+    n_users = len(salaries)
+
+    has_amount = amount != 0
+    has_split = has_amount & (installments > 0)
+    share = np.divide(amount, installments, out=np.zeros_like(amount), where=has_split)
+
+    # bincount accumulates in input order, matching the scalar loop bit for bit
+    total_outstanding = np.bincount(user_index, weights=np.where(has_amount, amount, 0.0), minlength=n_users)
+    monthly_obligation = np.bincount(user_index, weights=share, minlength=n_users)
+    active_count = np.bincount(user_index, minlength=n_users)
+
+    # Due dates are midnights; compare at microsecond precision like datetime does
+    due = columns["due"].astype("datetime64[us]")
+    start = np.datetime64(now, "us")
+    end = np.datetime64(now + UPCOMING_WINDOW, "us")
+    in_window = has_split & (due >= start) & (due <= end)
+    upcoming_dues = np.bincount(user_index, weights=np.where(in_window, share, 0.0), minlength=n_users)
+
+    salary = np.asarray(salaries, dtype=np.float64)
+    debt_ratio = np.divide(monthly_obligation, salary, out=np.zeros(n_users), where=salary > 0)
+    risk_score, risk_level = score_risk(debt_ratio)
+
+    return {
+        "total_outstanding": total_outstanding,
+        "monthly_obligation": monthly_obligation,
+        "upcoming_dues": upcoming_dues,
+        "debt_ratio": debt_ratio,
+        "risk_score": risk_score,
+        "risk_level": risk_level,
+        "transaction_count": active_count,
+    }
+
+
+def score_risk(debt_ratio):
+    """Vectorized finance.calculate_risk -> (scores, level codes)"""
+    low = np.trunc(debt_ratio * 100)
+    medium = 20 + np.trunc((debt_ratio - 0.2) * 150)
+    # Clip before truncating so absurd ratios can't overflow; anything >= 50 maps to 100
+    high_raw = np.minimum((debt_ratio - 0.4) * 100, 50)
+    high = np.minimum(50 + np.trunc(high_raw), 100)
+
+    risk_score = np.select([debt_ratio < 0.2, debt_ratio < 0.4], [low, medium], high).astype(np.int64)
+    risk_level = np.select([debt_ratio < 0.2, debt_ratio < 0.4], [0, 1], 2)
+    return risk_score, risk_level
+
+
+RISK_LEVELS = ("Low", "Medium", "High")
+
+
+def to_analysis_dicts(users, salaries, scores):
+    """Per-user dicts shaped exactly like calculate_analysis output"""
+    return {
+        email: {
+            "total_outstanding": round(float(scores["total_outstanding"][idx]), 2),
+            "monthly_obligation": round(float(scores["monthly_obligation"][idx]), 2),
+            "upcoming_dues": round(float(scores["upcoming_dues"][idx]), 2),
+            "debt_ratio": round(float(scores["debt_ratio"][idx]), 4),
+            "risk_score": int(scores["risk_score"][idx]),
+            "risk_level": RISK_LEVELS[scores["risk_level"][idx]],
+            "transaction_count": int(scores["transaction_count"][idx]),
+            "salary": salaries[idx]
+        }
+        for idx, email in enumerate(users)
+    }
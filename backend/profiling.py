@@ -0,0 +1,202 @@
+"""
+Opt-in cProfile capture for individual requests.
+
+A request is profiled when it carries `X-Profile: <PROFILING_TOKEN>`, or when
+the session user's hash (logging_setup.user_hash) is in PROFILE_USER_HASHES
+or switched on at runtime through the admin API (models.profiled_users,
+re-read by each worker every PROFILED_USERS_REFRESH_SECONDS).
+Each profile is saved to PROFILE_DIR as <id>.prof (pstats format) with a
+<id>.json sidecar (route, user hash, timings, status); only the newest
+PROFILE_MAX_FILES are kept.
+
+install_profiling() registers the request hooks only when profiling is
+configured (a token, which the admin API needs, or static user hashes), so
+a deployment without it runs no extra code per request.
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, request, session
+
+from backend.logging_setup import get_logger, user_hash, current_request_id
+from backend.models import get_profiled_user_hashes
+
+logger = get_logger("profiling")
+
+# Profile ids are generated here; anything else is rejected before touching the filesystem
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$")
+
+# User hashes as logged: 12 hex digits
+USER_HASH_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+
+# How long a worker uses its copy of the runtime-switched users
+PROFILED_USERS_REFRESH_SECONDS = 5
+
+_settings = {"dir": "profiles", "max_files": 50, "token": None, "user_hashes": frozenset()}
+
+# (user hashes, refresh after) of the users switched on at runtime
+_profiled_users = (frozenset(), 0.0)
+_profiled_users_lock = threading.Lock()
+
+
+def install_profiling(app, profile_dir, max_files, token=None, user_hashes=()):
+    """Register the profiling hooks on app if a token or user hashes are configured"""
+    _settings.update(dir=profile_dir, max_files=max_files, token=token, user_hashes=frozenset(user_hashes))
+    if not token and not _settings["user_hashes"]:
+        return False
+
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    return True
+
+
+def _token_matches(presented, expected):
+    return hmac.compare_digest(presented.encode("utf-8"), expected.encode("utf-8"))
+
+
+def is_admin_request():
+    """True if the request presents the profiling token (admin endpoints use the same one)"""
+    token = _settings["token"]
+    return bool(token) and _token_matches(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+def runtime_profiled_users():
+    """User hashes switched on through the admin API, re-read now and then"""
+    global _profiled_users
+    hashes, refresh_after = _profiled_users
+    now = time.monotonic()
+    if now >= refresh_after:
+        with _profiled_users_lock:
+            hashes, refresh_after = _profiled_users
+            if now >= refresh_after:
+                hashes = frozenset(get_profiled_user_hashes())
+                _profiled_users = (hashes, now + PROFILED_USERS_REFRESH_SECONDS)
+    return hashes
+
+
+def forget_profiled_users():
+    """Make this worker re-read the runtime-switched users on the next request"""
+    global _profiled_users
+    _profiled_users = (frozenset(), 0.0)
+
+
+def _wants_profile():
+    token = _settings["token"]
+    if token and _token_matches(request.headers.get("X-Profile", ""), token):
+        return True
+    hashed = user_hash(session.get("user_email"))
+    if hashed is None:
+        return False
+    return hashed in _settings["user_hashes"] or hashed in runtime_profiled_users()
+
+
+def _start_profile():
+    if not _wants_profile():
+        return
+    g.profiler = cProfile.Profile()
+    g.profile_started = (time.perf_counter(), time.process_time())
+    g.profiler.enable()
+
+
+def _finish_profile(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+    profiler.disable()
+
+    wall_started, cpu_started = g.pop("profile_started")
+    try:
+        profile_id = save_profile(profiler, {
+            "endpoint": request.endpoint,
+            "path": request.path,
+            "method": request.method,
+            "status": response.status_code,
+            "user": user_hash(session.get("user_email")),
+            "request_id": current_request_id(),
+            "wall_ms": round((time.perf_counter() - wall_started) * 1000, 2),
+            "cpu_ms": round((time.process_time() - cpu_started) * 1000, 2),
+            # Streamed bodies are produced after this point and aren't in the profile
+            "streamed": response.is_streamed,
+        })
+        response.headers["X-Profile-Id"] = profile_id
+    except OSError as e:
+        logger.error("Failed to save profile", extra={"error": str(e)})
+    return response
+
+
+def save_profile(profiler, meta):
+    """Write the profile and its metadata, enforce retention, return the profile id"""
+    os.makedirs(_settings["dir"], exist_ok=True)
+    now = datetime.now(timezone.utc)
+    profile_id = f"{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+    base = os.path.join(_settings["dir"], profile_id)
+
+    profiler.dump_stats(base + ".prof")
+    with open(base + ".json", "w") as f:
+        json.dump(dict(meta, id=profile_id, created_at=now.isoformat()), f)
+
+    logger.info("Saved request profile", extra={"profile_id": profile_id, "endpoint": meta["endpoint"], "wall_ms": meta["wall_ms"]})
+    _enforce_retention()
+    return profile_id
+
+
+def _enforce_retention():
+    for profile_id in list_profile_ids()[_settings["max_files"]:]:
+        for suffix in (".prof", ".json"):
+            try:
+                os.remove(os.path.join(_settings["dir"], profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profile_ids():
+    """Stored profile ids, newest first"""
+    try:
+        names = os.listdir(_settings["dir"])
+    except FileNotFoundError:
+        return []
+    ids = {name[:-5] for name in names if name.endswith(".json")}
+    return sorted((i for i in ids if PROFILE_ID_PATTERN.match(i)), reverse=True)
+
+
+def list_profiles(limit=None):
+    """Metadata of stored profiles, newest first"""
+    profiles = []
+    for profile_id in list_profile_ids()[:limit]:
+        try:
+            with open(os.path.join(_settings["dir"], profile_id + ".json")) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(profile_id):
+    """Path of a stored .prof file, or None if the id is unknown"""
+    if not PROFILE_ID_PATTERN.match(profile_id or ""):
+        return None
+    path = os.path.join(_settings["dir"], profile_id + ".prof")
+    return path if os.path.exists(path) else None
+
+
+# Orderings accepted by profile_summary
+SUMMARY_SORTS = ("cumulative", "tottime", "calls")
+
+
+def profile_summary(profile_id, sort="cumulative", limit=40):
+    """pstats text report of a stored profile (top `limit` functions by `sort`)"""
+    path = profile_path(profile_id)
+    if path is None:
+        return None
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
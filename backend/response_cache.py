@@ -0,0 +1,89 @@
+"""
+Per-user response cache for read endpoints, with ETags.
+
+A response is identified by (user, endpoint, query params, day) and the
+user's data version (models.get_user_data_version), which every write to
+their records or profile moves on. The ETag is derived from those alone,
+so a matching If-None-Match gets a 304 before the view runs. Bodies of
+non-streamed 200 responses are also kept in memory and replayed until the
+version changes.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from flask import g, request, session, make_response, Response
+
+from backend.models import get_user_data_version
+
+# Upper bound on cached response bodies across all users (least recently used go first)
+MAX_CACHED_RESPONSES = 10000
+
+_responses = OrderedDict()
+_lock = threading.Lock()
+
+
+def _response_key(user_email, view_args):
+    params = tuple(sorted(request.args.items(multi=True)))
+    # Upcoming-dues windows move with the calendar day even when nothing is written
+    return (user_email, request.endpoint, tuple(sorted(view_args.items())), params, date.today().isoformat())
+
+
+def _etag_for(key, version):
+    return hashlib.sha1(repr((key, version)).encode()).hexdigest()
+
+
+def cached_per_user(view):
+    """
+    Decorator for GET views that depend only on the session user's data and
+    the query string. Other methods and anonymous requests pass straight through.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET" or "user_email" not in session:
+            return view(*args, **kwargs)
+
+        key = _response_key(session["user_email"], kwargs)
+        version = get_user_data_version(session["user_email"])
+        etag = _etag_for(key, version)
+
+        # A profiled request (backend.profiling) should measure the real work
+        profiling = "profiler" in g
+
+        if etag in request.if_none_match and not profiling:
+            response = Response(status=304)
+        else:
+            with _lock:
+                entry = None if profiling else _responses.get(key)
+                if entry is not None and entry[0] == version:
+                    _responses.move_to_end(key)
+            if entry is not None and entry[0] == version:
+                response = Response(entry[1], status=200, mimetype=entry[2])
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if not response.is_streamed:
+                    _store(key, version, response)
+
+        response.set_etag(etag)
+        # Browsers may keep the body but must revalidate it every time
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    return wrapper
+
+
+def _store(key, version, response):
+    with _lock:
+        _responses[key] = (version, response.get_data(), response.mimetype)
+        _responses.move_to_end(key)
+        while len(_responses) > MAX_CACHED_RESPONSES:
+            _responses.popitem(last=False)
+
+
+def clear_response_cache():
+    with _lock:
+        _responses.clear()
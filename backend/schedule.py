@@ -0,0 +1,114 @@
+"""
+Installment schedules and the month-by-month cash-flow timeline built from them.
+
+Each active record is expanded into dated installments (amount / installments
+per month, starting at its due date). A user's timeline is the sum of their
+schedules bucketed by month. Timelines are cached per user and patched one
+record at a time when a record changes, instead of being rebuilt.
+"""
+import calendar
+from datetime import date, datetime
+
+from backend.models import get_bnpl_records
+from backend.user_cache import UserVersionCache
+
+# Upper bound on users whose timelines are kept in memory (least recently used go first)
+MAX_CACHED_USERS = 5000
+
+# Bucket for records whose due date is missing or unparseable
+UNDATED = "undated"
+
+
+def add_months(day, months):
+    """Same day `months` later, clamped to the end of shorter months (31 Jan -> 28 Feb)"""
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def expand_record(record):
+    """
+    Dated installments for one record: list of (date or None, amount).
+    All installments are assumed outstanding, first one on the due date,
+    matching how finance.py treats the record. A record without a valid
+    installment count is a single payment of the full amount.
+    """
+    if record.status != "active" or not record.amount:
+        return []
+
+    count = record.installments if record.installments and record.installments > 0 else 1
+    share = record.amount / count
+
+    try:
+        first = datetime.strptime(record.due_date, "%d/%m/%Y").date()
+    except (TypeError, ValueError):
+        return [(None, record.amount)]
+
+    return [(add_months(first, k), share) for k in range(count)]
+
+
+def record_contribution(record):
+    """What one record adds to each month bucket: {"YYYY-MM" or UNDATED: amount}"""
+    buckets = {}
+    for day, amount in expand_record(record):
+        key = day.strftime("%Y-%m") if day else UNDATED
+        buckets[key] = buckets.get(key, 0) + amount
+    return buckets
+
+
+def _apply(timeline, contribution, sign):
+    for key, amount in contribution.items():
+        total = timeline.get(key, 0) + sign * amount
+        if abs(total) < 1e-6:
+            timeline.pop(key, None)
+        else:
+            timeline[key] = total
+
+
+def _build_timeline(user_email):
+    records = get_bnpl_records(user_email, status_filter="active")
+    contributions = {record.id: record_contribution(record) for record in records}
+    timeline = {}
+    for contribution in contributions.values():
+        _apply(timeline, contribution, 1)
+    return {"timeline": timeline, "contributions": contributions}
+
+
+def _patch_timeline(state, changes):
+    """Swap the changed records' old contributions for their current ones"""
+    for record_id, record in changes.items():
+        _apply(state["timeline"], state["contributions"].pop(record_id, {}), -1)
+        contribution = record_contribution(record) if record else {}
+        if contribution:
+            state["contributions"][record_id] = contribution
+            _apply(state["timeline"], contribution, 1)
+
+
+_timelines = UserVersionCache(_build_timeline, _patch_timeline, max_users=MAX_CACHED_USERS)
+
+
+def get_timeline(user_email):
+    """The user's cash-flow timeline {"YYYY-MM" or UNDATED: amount}, kept current by _timelines"""
+    return _timelines.read(user_email, lambda state: dict(state["timeline"]))
+
+
+def project_cash_flow(user_email, months=12, today=None):
+    """
+    Month-by-month amounts due from the current month onward.
+    Installments dated before the current month are reported as overdue.
+    """
+    today = today or date.today()
+    timeline = get_timeline(user_email)
+    current = today.strftime("%Y-%m")
+    month_keys = [add_months(today.replace(day=1), k).strftime("%Y-%m") for k in range(months)]
+
+    overdue = sum(amount for key, amount in timeline.items() if key != UNDATED and key < current)
+    beyond = sum(amount for key, amount in timeline.items() if key != UNDATED and key > month_keys[-1])
+
+    return {
+        "months": [{"month": key, "amount": round(timeline.get(key, 0), 2)} for key in month_keys],
+        "overdue": round(overdue, 2),
+        "undated": round(timeline.get(UNDATED, 0), 2),
+        "after_horizon": round(beyond, 2)
+    }
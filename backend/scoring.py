@@ -0,0 +1,90 @@
+"""
+Offline batch scoring job: per-user analysis for every user, written to
+the user_scores table.
+
+Users are processed in email order, a chunk at a time. Each chunk's active
+records are streamed off the cursor and scored with the vectorized engine
+(backend.portfolio, identical to calculate_analysis), so memory is bounded
+by the chunk size. Every chunk is saved together with the run's checkpoint;
+an interrupted run resumes after the last saved user, scoring as of the
+same reference time.
+"""
+from datetime import datetime
+
+from backend.models import (
+    iter_active_record_columns, get_scoring_salaries, get_scoring_checkpoint,
+    start_scoring_run, save_user_scores, finish_scoring_run
+)
+from backend.portfolio import build_columns, score_columns, RISK_LEVELS
+from backend.logging_setup import get_logger
+
+logger = get_logger("scoring")
+
+# Users scored per chunk (and per checkpoint)
+DEFAULT_CHUNK_USERS = 1000
+
+
+def score_chunk(salary_by_user, after_user, now):
+    """Score the users in salary_by_user (the next ones after after_user, in order)"""
+    users = list(salary_by_user)
+    salaries = [salary_by_user[email] for email in users]
+    rows = list(iter_active_record_columns(after_user=after_user, through_user=users[-1]))
+    scores = score_columns(build_columns(rows, users), salaries, now=now)
+
+    return [
+        (
+            email,
+            float(scores["total_outstanding"][idx]),
+            float(scores["monthly_obligation"][idx]),
+            float(scores["upcoming_dues"][idx]),
+            float(scores["debt_ratio"][idx]),
+            int(scores["risk_score"][idx]),
+            RISK_LEVELS[scores["risk_level"][idx]],
+            int(scores["transaction_count"][idx]),
+            salaries[idx]
+        )
+        for idx, email in enumerate(users)
+    ]
+
+
+def run_batch_scoring(chunk_users=DEFAULT_CHUNK_USERS, resume=True, now=None):
+    """
+    Score every user into user_scores.
+    resume: continue the latest unfinished run from its checkpoint, if any
+    now: reference time for a new run (default: datetime.now())
+    Returns {"run_id", "users_scored", "resumed", "as_of"}.
+    """
+    checkpoint = get_scoring_checkpoint() if resume else None
+
+    if checkpoint:
+        run_id = checkpoint["run_id"]
+        now = datetime.fromisoformat(checkpoint["as_of"])
+        after_user = checkpoint["last_user_email"]
+        users_scored = checkpoint["users_scored"]
+        logger.info("Scoring run resumed", extra={"run_id": run_id, "users_scored": users_scored})
+    else:
+        now = now or datetime.now()
+        run_id = start_scoring_run(now.isoformat())
+        after_user = None
+        users_scored = 0
+        logger.info("Scoring run started", extra={"run_id": run_id, "as_of": now.isoformat()})
+
+    while True:
+        salary_by_user = get_scoring_salaries(after_user=after_user, limit=chunk_users)
+        if not salary_by_user:
+            break
+
+        scores = score_chunk(salary_by_user, after_user, now)
+        after_user = scores[-1][0]
+        save_user_scores(run_id, scores, after_user)
+        users_scored += len(scores)
+
+    finish_scoring_run(run_id)
+    logger.info("Scoring run finished", extra={"run_id": run_id, "users_scored": users_scored})
+
+    return {
+        "run_id": run_id,
+        "users_scored": users_scored,
+        "resumed": checkpoint is not None,
+        "as_of": now.isoformat()
+    }
@@ -0,0 +1,168 @@
+"""
+Server-side Flask sessions in the SQLite `sessions` table.
+
+The cookie carries only a random session id; the session dict (OAuth
+credentials included) stays on the server, where every gunicorn worker can
+read it. Each worker keeps a read-through cache of recently used sessions
+for SESSION_CACHE_SECONDS, so most requests only read the one-row session
+generation instead of the session. Deleting a session (logout, or the old
+id after a login) moves the generation, and every worker empties its cache
+when it sees that, so a deleted session is never served again. Other
+changes can take up to SESSION_CACHE_SECONDS to reach a worker that had
+the session cached; the session's own expiry is always honoured.
+
+Sessions expire PERMANENT_SESSION_LIFETIME after they were last written.
+Unchanged sessions aren't written back, except to push the expiry out once
+half of the lifetime has passed. Expired rows are purged now and then as
+new sessions are created (and by `flask purge-sessions`). A login calls
+session.regenerate(), which moves the data to a new id and deletes the old
+one (session fixation).
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+from backend.models import get_session, save_session, delete_session, purge_expired_sessions, get_session_generation
+
+# Most sessions kept in each worker's cache (least recently used go first)
+MAX_CACHED_SESSIONS = 10000
+
+# Purge expired rows once every this many new sessions (per worker)
+PURGE_EVERY_NEW_SESSIONS = 500
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, raw=None, expires_at=None):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        # Serialized form as loaded, to skip writing back an unchanged session
+        self.raw = raw
+        self.expires_at = expires_at
+        self.modified = False
+        # Id given up by regenerate(), deleted when the session is saved
+        self.previous_sid = None
+
+    def regenerate(self):
+        """
+        Move the data to a fresh session id when privileges change (login),
+        so an id planted before login can't be used to ride the session
+        """
+        if self.sid is not None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.raw = None
+        self.modified = True
+
+
+class SqliteSessionInterface(SessionInterface):
+    def __init__(self, cache_seconds=30):
+        self.cache_seconds = cache_seconds
+        self._cache = OrderedDict()  # sid -> (raw, expires_at, cached_until)
+        self._lock = threading.Lock()
+        self._new_sessions = 0
+        # Session generation the cache was filled under
+        self._generation = None
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            loaded = self._load(sid)
+            if loaded is not None:
+                raw, expires_at = loaded
+                return ServerSideSession(session_json_serializer.loads(raw), sid, raw, expires_at)
+        return ServerSideSession()
+
+    def _load(self, sid):
+        now = time.time()
+        generation = get_session_generation()
+        with self._lock:
+            if generation != self._generation:
+                # A session was deleted somewhere: it may be one of ours
+                self._cache.clear()
+                self._generation = generation
+            entry = self._cache.get(sid)
+            if entry is not None and now < entry[2] and now < entry[1]:
+                self._cache.move_to_end(sid)
+                return entry[0], entry[1]
+
+        row = get_session(sid, now)
+        if row is None:
+            self._evict(sid)
+            return None
+        self._remember(sid, row[0], row[1], now)
+        return row
+
+    def _remember(self, sid, raw, expires_at, now):
+        with self._lock:
+            self._cache[sid] = (raw, expires_at, now + self.cache_seconds)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > MAX_CACHED_SESSIONS:
+                self._cache.popitem(last=False)
+
+    def _evict(self, sid):
+        with self._lock:
+            self._cache.pop(sid, None)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        previous_sid = session.previous_sid
+        if previous_sid:
+            delete_session(previous_sid)
+            self._evict(previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            # Emptied (logout) or never used: drop the row and the cookie
+            if session.sid or previous_sid:
+                if session.sid:
+                    delete_session(session.sid)
+                    self._evict(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        raw = session_json_serializer.dumps(dict(session))
+        is_new = session.sid is None
+        renew = not is_new and session.expires_at - now < lifetime / 2
+
+        if is_new or renew or raw != session.raw:
+            if is_new:
+                session.sid = secrets.token_urlsafe(32)
+                self._count_new_session(now)
+            session.expires_at = now + lifetime
+            save_session(session.sid, raw, session.expires_at)
+            self._remember(session.sid, raw, session.expires_at, now)
+        elif not self.should_set_cookie(app, session):
+            return
+
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add("Cookie")
+
+    def _count_new_session(self, now):
+        with self._lock:
+            self._new_sessions += 1
+            purge = self._new_sessions % PURGE_EVERY_NEW_SESSIONS == 0
+        if purge:
+            purge_expired_sessions(now)
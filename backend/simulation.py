@@ -0,0 +1,160 @@
+"""
+Monte Carlo repayment stress simulator.
+
+Projects a user's EMI load over the next N months under random income
+shocks, drifting living expenses and new BNPL uptake, and reports how
+likely they are to cross the safe-EMI line that calculate_affordability
+uses (30% of income).
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Same limit as calculate_affordability: EMIs above 30% of income are unsafe
+SAFE_EMI_RATIO = 0.3
+
+# Scenarios are simulated in fixed-size chunks, each with its own child seed,
+# so results for a given seed don't depend on how many workers ran them
+CHUNK_SIZE = 2500
+
+# Most new BNPL plans we draw per scenario per month
+MAX_NEW_PLANS_PER_MONTH = 3
+
+# EMI/income ratios are capped here so zero-income months stay finite
+MAX_EMI_RATIO = 10.0
+
+DEFAULT_ASSUMPTIONS = {
+    # Month-to-month income noise (std dev as a fraction of salary)
+    "income_volatility": 0.05,
+    # Chance per month of an income shock (job loss, pay cut, unpaid leave)
+    "shock_probability": 0.02,
+    # Income lost during a shock, drawn uniformly from this range
+    "shock_severity": (0.3, 1.0),
+    # Chance per month that a shocked income recovers
+    "recovery_probability": 0.35,
+    # Monthly drift of rent + other expenses (mean, std dev)
+    "expense_drift": (0.004, 0.01),
+    # Expected new BNPL plans per month, doubled while disposable income is negative
+    "new_plan_rate": 0.15,
+    # New plan size as a fraction of salary (lognormal median, sigma)
+    "new_plan_size": (0.25, 0.6),
+    "new_plan_installments": (3, 6, 9, 12),
+}
+
+
+def baseline_emi_schedule(records, months):
+    """
+    EMI owed in each of the next `months` months from existing active records.
+    Each record pays amount / installments for `installments` months.
+    """
+    schedule = np.zeros(months)
+    for record in records:
+        if record.status != "active" or not record.amount or not record.installments or record.installments <= 0:
+            continue
+        schedule[:min(record.installments, months)] += record.amount / record.installments
+    return schedule
+
+
+def _simulate_chunk(args):
+    """Run one chunk of scenarios; returns per-month breach counts and EMI ratios"""
+    seed_seq, n, baseline, salary, fixed_expenses, assumptions = args
+    rng = np.random.default_rng(seed_seq)
+    months = len(baseline)
+
+    low, high = assumptions["shock_severity"]
+    drift_mu, drift_sigma = assumptions["expense_drift"]
+    size_median, size_sigma = assumptions["new_plan_size"]
+    plan_lengths = np.asarray(assumptions["new_plan_installments"])
+
+    shocked = np.zeros(n, dtype=bool)
+    severity = np.zeros(n)
+    expenses = np.full(n, float(fixed_expenses))
+    # Difference array of EMI added by simulated new plans: +share at start, -share at payoff
+    new_emi_delta = np.zeros((n, months + 1))
+    new_emi = np.zeros(n)
+
+    breached = np.zeros((n, months), dtype=bool)
+    emi_ratio = np.zeros((n, months))
+    rows = np.arange(n)
+
+    for month in range(months):
+        # Income: shocks persist until a recovery draw, plus ordinary noise
+        recovered = rng.random(n) < assumptions["recovery_probability"]
+        new_shock = ~shocked & (rng.random(n) < assumptions["shock_probability"])
+        shocked = (shocked & ~recovered) | new_shock
+        severity = np.where(new_shock, rng.uniform(low, high, n), severity)
+        noise = rng.normal(0.0, assumptions["income_volatility"], n)
+        income = np.maximum(salary * (1 + noise) * (1 - severity * shocked), 0.0)
+
+        expenses *= 1 + rng.normal(drift_mu, drift_sigma, n)
+
+        new_emi += new_emi_delta[:, month]
+        emi = baseline[month] + new_emi
+
+        breached[:, month] = emi > SAFE_EMI_RATIO * income
+        emi_ratio[:, month] = np.minimum(
+            np.divide(emi, income, out=np.full(n, MAX_EMI_RATIO), where=income > 0), MAX_EMI_RATIO
+        )
+
+        # New BNPL plans start paying next month; squeezed budgets borrow more
+        squeezed = income - expenses - emi < 0
+        rate = assumptions["new_plan_rate"] * np.where(squeezed, 2.0, 1.0)
+        count = np.minimum(rng.poisson(rate), MAX_NEW_PLANS_PER_MONTH)
+        if month + 1 < months:
+            for plan in range(MAX_NEW_PLANS_PER_MONTH):
+                takes = count > plan
+                if not takes.any():
+                    break
+                amount = salary * rng.lognormal(np.log(size_median), size_sigma, n)
+                length = rng.choice(plan_lengths, n)
+                share = np.where(takes, amount / length, 0.0)
+                new_emi_delta[:, month + 1] += share
+                np.add.at(new_emi_delta, (rows, np.minimum(month + 1 + length, months)), -share)
+
+    return breached.sum(axis=0), breached.any(axis=1).sum(), emi_ratio
+
+
+def simulate_repayment_stress(profile, records, months=6, scenarios=10000, seed=None, workers=None, assumptions=None):
+    """
+    Probability of breaching the safe-EMI line over the next `months` months.
+    profile: dict with salary, monthly_rent, other_expenses (as get_user_profile returns)
+    records: the user's active BnplRecord rows
+    seed: int for reproducible results; None draws fresh entropy (returned as "seed",
+          a decimal string since it can exceed JavaScript's integer range)
+    workers: spread chunks over a process pool of this size (None/1 = in-process)
+    """
+    params = dict(DEFAULT_ASSUMPTIONS, **(assumptions or {}))
+    salary = float(profile.get("salary") or 30000)
+    fixed_expenses = float(profile.get("monthly_rent") or 0) + float(profile.get("other_expenses") or 0)
+    baseline = baseline_emi_schedule(records, months)
+
+    root = np.random.SeedSequence(seed)
+    sizes = [CHUNK_SIZE] * (scenarios // CHUNK_SIZE)
+    if scenarios % CHUNK_SIZE:
+        sizes.append(scenarios % CHUNK_SIZE)
+    chunks = [
+        (child, size, baseline, salary, fixed_expenses, params)
+        for child, size in zip(root.spawn(len(sizes)), sizes)
+    ]
+
+    if workers and workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_chunk, chunks))
+    else:
+        results = [_simulate_chunk(chunk) for chunk in chunks]
+
+    monthly_breaches = sum(result[0] for result in results)
+    any_breach = sum(result[1] for result in results)
+    emi_ratio = np.concatenate([result[2] for result in results])
+
+    return {
+        "scenarios": scenarios,
+        "months": months,
+        "seed": str(root.entropy),
+        "safe_emi_ratio": SAFE_EMI_RATIO,
+        "current_emi": round(float(baseline[0]) if months else 0.0, 2),
+        "breach_probability": round(any_breach / scenarios, 4),
+        "monthly_breach_probability": [round(count / scenarios, 4) for count in monthly_breaches.tolist()],
+        "emi_ratio_p50": [round(float(v), 4) for v in np.percentile(emi_ratio, 50, axis=0)],
+        "emi_ratio_p95": [round(float(v), 4) for v in np.percentile(emi_ratio, 95, axis=0)],
+    }
@@ -0,0 +1,74 @@
+"""
+Per-user financial snapshot shared by the finance endpoints.
+
+One object holds the analysis and affordability for a user, computed once
+from the maintained aggregates, the due-date calendar and the profile, and
+reused by /api/risk-score, /api/affordability, mark-paid and bulk status
+until the user's next write (records or profile) moves their data version.
+"""
+from datetime import date
+
+from backend.models import get_user_aggregates, get_user_profile, get_user_data_version, salary_or_default
+from backend.finance import calculate_analysis_from_aggregates, calculate_affordability
+from backend.calendar_index import upcoming_dues_total, DEFAULT_WINDOW_DAYS
+from backend.user_cache import UserVersionCache
+
+
+def _build_snapshot_state(user_email):
+    # Computed snapshots by (day, window_days); filled lazily by get_financial_snapshot
+    return {}
+
+
+def _invalidate_snapshots(state, changes):
+    state.clear()
+
+
+def _store(state, key, snapshot):
+    """Keep the first snapshot stored for key, dropping ones from earlier days"""
+    for stale in [k for k in state if k[0] != key[0]]:
+        del state[stale]
+    return state.setdefault(key, snapshot)
+
+
+_snapshots = UserVersionCache(_build_snapshot_state, _invalidate_snapshots)
+
+
+def compute_financial_snapshot(user_email, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    Analysis and affordability for the user's current data.
+    Returns {"profile", "aggregates", "analysis", "affordability"}; profile
+    is None if the user hasn't saved one (defaults are used for the numbers).
+    """
+    profile = get_user_profile(user_email)
+    salary = salary_or_default((profile or {}).get("salary"))
+    rent = (profile or {}).get("monthly_rent", 0)
+    other_expenses = (profile or {}).get("other_expenses", 0)
+
+    aggregates = get_user_aggregates(user_email)
+    upcoming_dues = upcoming_dues_total(user_email, window_days)
+
+    analysis = calculate_analysis_from_aggregates(salary, aggregates, upcoming_dues)
+    affordability = calculate_affordability(salary, aggregates["monthly_obligation"], rent, other_expenses)
+
+    return {
+        "profile": profile,
+        "aggregates": aggregates,
+        "analysis": analysis,
+        "affordability": affordability
+    }
+
+
+def get_financial_snapshot(user_email, window_days=DEFAULT_WINDOW_DAYS):
+    """
+    Cached compute_financial_snapshot. Entries last until the user's next
+    write; the upcoming-dues window also moves with the calendar day.
+    Callers must not modify the returned dicts.
+    """
+    key = (date.today(), window_days)
+    # Pin the version so a write landing mid-computation can't get the old numbers cached under it
+    version = get_user_data_version(user_email)
+    snapshot = _snapshots.read(user_email, lambda state: state.get(key), version)
+    if snapshot is None:
+        snapshot = compute_financial_snapshot(user_email, window_days)
+        snapshot = _snapshots.read(user_email, lambda state: _store(state, key, snapshot), version)
+    return snapshot
@@ -0,0 +1,245 @@
+"""
+The Gmail -> parser -> database sync pipeline, as a generator of progress events.
+
+sync_accounts() syncs every Gmail account linked to a user at once and
+yields one dict per step, each tagged with its "account":
+    {"stage": "listed", "total": n}                  (or "account_error" if listing failed)
+    {"stage": "fetched", "done": k, "total": n, "gmail_message_id": ...}   (or "fetch_failed")
+    then, for that message, one of
+        {"stage": "skipped", "reason": "already_processed" | "duplicate", ...}
+        {"stage": "filtered", "reason": "not_financial" | "no_amount", ...}
+        {"stage": "parsed", ...} followed by {"stage": "stored", "record": {...}}
+            or, for a repeat reminder of an obligation already stored,
+            {"stage": "folded", "gmail_message_id": ...}
+and finally {"stage": "complete", <counts>, "accounts": {account: <counts>}}
+or {"stage": "error", "message": ...}. Events of one account come in this
+order; different accounts' events are interleaved.
+
+Each account is listed and fetched on its own thread, at most
+calls_per_second Gmail calls per account, so a sync takes about as long as
+its slowest account rather than the sum of them. Parsing and storing run on
+the consuming thread one message at a time: every account's records go
+through the same store, which skips messages already seen from that
+account and folds repeat reminders (the same reminder in two inboxes
+included).
+
+Each record is committed before its "stored" event is yielded, so it is
+already visible to the read endpoints. If the consumer stops iterating
+(e.g. the SSE client went away and the generator is closed), the fetch
+threads stop after their current Gmail call and nothing more is written.
+
+An account that synced completely (everything since its cursor listed,
+nothing failed) gets its cursor moved to the time the sync started, and
+its next sync only lists mail received after that, less an overlap.
+"""
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.gmail_service import get_gmail_service, list_bnpl_message_ids, fetch_gmail_message
+from backend.parser import parse_bnpl_email, is_bnpl_email
+from backend.fingerprint import body_simhash
+from backend.models import insert_bnpl_record, is_gmail_message_processed, save_sync_cursor
+from backend.logging_setup import get_logger, user_hash
+
+logger = get_logger("sync")
+
+# Listing after a cursor starts this much earlier: Gmail's after: is coarse and mail can arrive late
+CURSOR_OVERLAP_SECONDS = 24 * 60 * 60
+
+COUNT_KEYS = ("synced_count", "bnpl_count", "filtered_count", "skipped_count", "folded_count", "failed_count")
+
+
+class RateLimiter:
+    """Spaces calls at least 1 / calls_per_second apart; one per account, used only by its fetch thread"""
+
+    def __init__(self, calls_per_second=None):
+        self.interval = 1.0 / calls_per_second if calls_per_second else 0
+        self._next = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def sync_accounts(user_email, accounts, max_results=50, calls_per_second=None):
+    """
+    Sync Gmail accounts into user_email's records, yielding progress events
+    (see module docstring). accounts: dicts with account_email, credentials
+    (google Credentials) and optionally sync_cursor (Unix time).
+    """
+    started = time.perf_counter()
+    sync_started_at = time.time()
+    per_account = {account["account_email"]: dict.fromkeys(COUNT_KEYS, 0) for account in accounts}
+
+    if not accounts:
+        yield {"stage": "error", "message": "No Gmail account linked"}
+        return
+
+    events = queue.Queue()
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix="gmail-sync")
+    for account in accounts:
+        # Each thread logs with the caller's request id and user
+        pool.submit(contextvars.copy_context().run, _fetch_account,
+                    user_email, account, max_results, RateLimiter(calls_per_second), events, stop)
+
+    try:
+        pending = len(accounts)
+        while pending:
+            event = events.get()
+            account_email = event["account"]
+            counts = per_account[account_email]
+            stage = event["stage"]
+
+            if stage == "_done":
+                pending -= 1
+                if event["complete"] and not counts["failed_count"] and "error" not in counts:
+                    save_sync_cursor(user_email, account_email, sync_started_at)
+                continue
+
+            if stage == "_message":
+                for outcome in _process_message(user_email, account_email, event["message"], counts):
+                    yield dict(outcome, account=account_email)
+                continue
+
+            if stage == "fetched":
+                counts["synced_count"] += 1
+            elif stage == "skipped":
+                counts["skipped_count"] += 1
+            elif stage == "fetch_failed":
+                counts["failed_count"] += 1
+            elif stage == "account_error":
+                counts["error"] = event["message"]
+            yield event
+
+        totals = {key: sum(counts[key] for counts in per_account.values()) for key in COUNT_KEYS}
+        logger.info("Sync complete", extra={
+            "account_count": len(accounts),
+            "message_count": totals["synced_count"],
+            "stored_count": totals["bnpl_count"],
+            "skipped_count": totals["skipped_count"],
+            "folded_count": totals["folded_count"],
+            "filtered_count": totals["filtered_count"],
+            "failed_count": totals["failed_count"],
+            "duration_ms": round((time.perf_counter() - started) * 1000)
+        })
+
+        errors = [counts["error"] for counts in per_account.values() if "error" in counts]
+        if len(errors) == len(accounts):
+            yield {"stage": "error", "message": errors[0]}
+            return
+        yield dict(totals, stage="complete", accounts=per_account)
+    except GeneratorExit:
+        # The consumer closed the generator early (client disconnected)
+        logger.info("Sync abandoned by client", extra={
+            "account_count": len(accounts),
+            "duration_ms": round((time.perf_counter() - started) * 1000)
+        })
+        raise
+    finally:
+        stop.set()
+        pool.shutdown(wait=False)
+
+
+def _fetch_account(user_email, account, max_results, limiter, events, stop):
+    """
+    Pool thread for one account: list its messages since the cursor and
+    fetch the ones not processed yet, putting events (and "_message" items
+    for sync_accounts to parse and store) on the events queue, then "_done".
+    """
+    account_email = account["account_email"]
+    complete = False
+    try:
+        service = get_gmail_service(account["credentials"])
+        cursor = account.get("sync_cursor")
+        limiter.wait()
+        message_ids = list_bnpl_message_ids(
+            service, max_results, after=cursor - CURSOR_OVERLAP_SECONDS if cursor else None
+        )
+        total = len(message_ids)
+        events.put({"stage": "listed", "account": account_email, "total": total})
+
+        for done, gmail_message_id in enumerate(message_ids, start=1):
+            if stop.is_set():
+                return
+            progress = {"stage": "fetched", "account": account_email, "done": done, "total": total,
+                        "gmail_message_id": gmail_message_id}
+
+            # IDEMPOTENT CHECK: skip before paying for the message fetch
+            if is_gmail_message_processed(user_email, gmail_message_id, account_email):
+                events.put(progress)
+                events.put({"stage": "skipped", "account": account_email, "reason": "already_processed",
+                            "gmail_message_id": gmail_message_id})
+                continue
+
+            try:
+                limiter.wait()
+                msg = fetch_gmail_message(service, gmail_message_id)
+            except Exception as e:
+                logger.debug("Failed to fetch message", extra={"gmail_message_id": gmail_message_id, "error": str(e)})
+                events.put(dict(progress, stage="fetch_failed"))
+                continue
+
+            events.put(progress)
+            events.put({"stage": "_message", "account": account_email, "message": msg})
+
+        # A full page may have left older messages unlisted; keep the cursor where it was
+        complete = total < max_results
+    except Exception as e:
+        logger.error("Sync failed: Gmail API error", extra={"account": user_hash(account_email), "error": str(e)})
+        events.put({"stage": "account_error", "account": account_email, "message": f"Failed to fetch emails: {e}"})
+    finally:
+        events.put({"stage": "_done", "account": account_email, "complete": complete})
+
+
+def _process_message(user_email, account_email, msg, counts):
+    """Filter, parse and store one fetched message, yielding its outcome events"""
+    gmail_message_id = msg["id"]
+    sender, subject, body = msg["sender"], msg["subject"], msg["body"]
+
+    # STRICT VALIDATION: Check if email is from valid financial sender
+    if not is_bnpl_email(sender, subject, body):
+        counts["filtered_count"] += 1
+        logger.debug("Filtered message: not from financial sender", extra={"gmail_message_id": gmail_message_id})
+        yield {"stage": "filtered", "reason": "not_financial", "gmail_message_id": gmail_message_id}
+        return
+
+    parsed = parse_bnpl_email(sender, subject, body)
+
+    # Only store if we found amount (critical field)
+    if not parsed["amount"]:
+        counts["filtered_count"] += 1
+        logger.debug("Filtered message: no valid amount", extra={"gmail_message_id": gmail_message_id})
+        yield {"stage": "filtered", "reason": "no_amount", "gmail_message_id": gmail_message_id}
+        return
+
+    record = {
+        "gmail_message_id": gmail_message_id,
+        "vendor": parsed["vendor"],
+        "amount": parsed["amount"],
+        "installments": parsed["installments"] or 1,
+        "due_date": parsed["due_date"],
+        "email_subject": subject
+    }
+    yield dict(record, stage="parsed")
+
+    # Insert with Gmail message ID for idempotent sync; repeat reminders fold into the existing record
+    outcome = insert_bnpl_record(user_email=user_email, simhash=body_simhash(body), account_email=account_email, **record)
+    if outcome == "stored":
+        counts["bnpl_count"] += 1
+        logger.debug("Stored record", extra={"gmail_message_id": gmail_message_id, "vendor": parsed["vendor"]})
+        yield {"stage": "stored", "record": record}
+    elif outcome == "folded":
+        counts["folded_count"] += 1
+        logger.debug("Folded repeat reminder", extra={"gmail_message_id": gmail_message_id, "vendor": parsed["vendor"]})
+        yield {"stage": "folded", "gmail_message_id": gmail_message_id}
+    else:
+        counts["skipped_count"] += 1
+        logger.debug("Skipped message: duplicate", extra={"gmail_message_id": gmail_message_id})
+        yield {"stage": "skipped", "reason": "duplicate", "gmail_message_id": gmail_message_id}
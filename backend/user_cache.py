@@ -0,0 +1,83 @@
+"""
+In-process per-user cache kept in step with record writes.
+
+Entries are tagged with the user's data version (models.get_user_data_version).
+A read whose version doesn't match rebuilds the entry; a committed write that
+moves the version on by exactly one is applied in place, record by record.
+"""
+import threading
+from collections import OrderedDict
+
+from backend.models import add_record_listener, get_bnpl_record_by_id, get_user_data_version
+
+# Writes touching more records than this (bulk imports) drop the entry instead:
+# one rebuild is cheaper than fetching every changed record by id
+MAX_PATCH_RECORDS = 100
+
+
+class UserVersionCache:
+    """
+    build(user_email) -> state builds a user's entry from the database.
+    patch(state, changes) updates it in place, where changes maps each changed
+    record id to its current BnplRecord (or None if it no longer exists).
+    """
+
+    def __init__(self, build, patch, max_users=5000):
+        self._build = build
+        self._patch = patch
+        self._max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        add_record_listener(self.on_record_change)
+
+    def read(self, user_email, reader, version=None):
+        """
+        Run reader(state) on the user's up-to-date entry and return its result.
+        version: the data version to read at, if the caller already looked it up
+        """
+        if version is None:
+            version = get_user_data_version(user_email)
+
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(user_email)
+                return reader(entry[1])
+
+        state = self._build(user_email)
+
+        with self._lock:
+            self._entries[user_email] = (version, state)
+            self._entries.move_to_end(user_email)
+            while len(self._entries) > self._max_users:
+                self._entries.popitem(last=False)
+            return reader(state)
+
+    def on_record_change(self, user_email, record_ids, version):
+        """
+        Record listener. Patches the entry if it is exactly one version behind;
+        otherwise (another worker wrote, or the change isn't per-record) drops it.
+        Patching replaces each record's contribution, so applying a change the
+        entry already reflects is harmless.
+        """
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is None:
+                return
+            if version is None or entry[0] != version - 1 or len(record_ids) > MAX_PATCH_RECORDS:
+                del self._entries[user_email]
+                return
+
+        changes = {record_id: get_bnpl_record_by_id(record_id) for record_id in record_ids}
+
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is None or entry[0] != version - 1:
+                self._entries.pop(user_email, None)
+                return
+            self._patch(entry[1], changes)
+            self._entries[user_email] = (version, entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,104 @@
+"""
+Mailbox ingestion benchmark: messages per second importing a synthetic
+mbox archive with backend.ingest, for several parser process counts.
+
+Each worker count imports the same archive into a fresh database; the
+stored counts must match across runs, and importing the archive a second
+time must store nothing.
+
+Usage:
+    python benchmarks/bench_ingest.py --messages 20000 --workers 1 2 4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import models
+from backend.ingest import ingest_messages, iter_archive_messages
+
+USER = "bench@example.com"
+
+VENDORS = [
+    ("noreply@simpl.in", "Simpl"),
+    ("alerts@lazypay.in", "LazyPay"),
+    ("no-reply@zestmoney.in", "ZestMoney"),
+]
+
+PROMOTIONS = [
+    ("offers@shop.example", "Deal of the day: 60% off", "Limited time sale on bestsellers. Unsubscribe here."),
+    ("newsletter@news.example", "Your weekly digest", "Trending stories picked for you."),
+]
+
+
+def write_mbox(path, messages, bnpl_ratio, seed):
+    """Synthetic mbox of `messages` emails, about bnpl_ratio of them BNPL reminders"""
+    rng = random.Random(seed)
+    today = date.today()
+    with open(path, "wb") as f:
+        for _ in range(messages):
+            message = EmailMessage()
+            if rng.random() < bnpl_ratio:
+                sender, vendor = rng.choice(VENDORS)
+                installments = rng.choice([1, 3, 6, 9, 12])
+                due = (today + timedelta(days=rng.randint(-10, 60))).strftime("%d/%m/%Y")
+                message["Subject"] = f"{vendor} payment reminder: EMI due on {due}"
+                message.set_content(f"Dear customer, amount due: ₹{rng.randrange(500, 60000):,}.00 on your "
+                                    f"{installments} EMIs plan. Payment due on {due}. Please pay before the due date.")
+            else:
+                sender, subject, body = rng.choice(PROMOTIONS)
+                message["Subject"] = subject
+                message.set_content(body)
+            message["From"] = sender
+            message["To"] = USER
+            message["Date"] = format_datetime(email_date(rng))
+            message["Message-ID"] = make_msgid(domain="bench.example")
+            f.write(b"From " + sender.encode() + b" Mon Jan  1 00:00:00 2024\n")
+            f.write(message.as_bytes().replace(b"\nFrom ", b"\n>From "))
+            f.write(b"\n")
+
+
+def email_date(rng):
+    return datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randrange(500000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--bnpl-ratio", type=float, default=0.6)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        mbox = os.path.join(work_dir, "archive.mbox")
+        write_mbox(mbox, args.messages, args.bnpl_ratio, args.seed)
+        print(f"{args.messages} messages, {os.path.getsize(mbox) / 1e6:.1f} MB mbox")
+
+        stored = None
+        for workers in args.workers:
+            models.DB_PATH = os.path.join(work_dir, f"bench-{workers}.db")
+            models.init_db()
+
+            result = ingest_messages(USER, iter_archive_messages(mbox), workers=workers)
+            again = ingest_messages(USER, iter_archive_messages(mbox), workers=workers)
+
+            assert result["message_count"] == args.messages, result
+            assert again["bnpl_count"] == 0, again
+            assert stored is None or result["bnpl_count"] == stored, (result, stored)
+            stored = result["bnpl_count"]
+
+            rate = result["message_count"] / (result["duration_ms"] / 1000)
+            print(f"  workers={workers:<3} {result['duration_ms']:>7} ms  {rate:>9.0f} msg/s  "
+                  f"stored={result['bnpl_count']} folded={result['folded_count']} filtered={result['filtered_count']}  "
+                  f"re-import: {again['duration_ms']} ms, {again['skipped_count']} skipped")
+
+
+if __name__ == "__main__":
+    main()
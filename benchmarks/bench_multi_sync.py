@@ -0,0 +1,102 @@
+"""
+Multi-account sync benchmark: wall time of syncing several linked Gmail
+accounts concurrently (backend.sync.sync_accounts) against syncing them one
+after another, using the load-test fake Gmail server with added latency.
+
+Each mode syncs the same mailboxes into a fresh database and must store the
+same records; a concurrent sync should take about as long as the slowest
+single account, not the sum.
+
+Usage:
+    python benchmarks/bench_multi_sync.py --accounts 3 --messages 50 --latency-ms 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import models
+from backend.gmail_service import SCOPES, credentials_from_dict
+from backend.sync import sync_accounts
+from loadtest import fake_gmail
+
+USER = "bench@example.com"
+
+
+def account(account_email):
+    """A linked account whose token the fake server maps to that account's mailbox"""
+    return {
+        "account_email": account_email,
+        "credentials": credentials_from_dict({
+            "token": account_email,
+            "refresh_token": "bench",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "client_id": "bench",
+            "client_secret": "bench",
+            "scopes": SCOPES,
+        }),
+    }
+
+
+def timed_sync(accounts, max_results, calls_per_second):
+    started = time.perf_counter()
+    result = None
+    for event in sync_accounts(USER, accounts, max_results=max_results, calls_per_second=calls_per_second):
+        if event["stage"] in ("complete", "error"):
+            result = event
+    assert result["stage"] == "complete", result
+    return time.perf_counter() - started, result
+
+
+def fresh_db(work_dir, name):
+    models.DB_PATH = os.path.join(work_dir, f"{name}.db")
+    models.init_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=50, help="Messages per mailbox (and per sync)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Fake Gmail latency per call")
+    parser.add_argument("--calls-per-second", type=float, default=0, help="Per-account rate limit (0 = none)")
+    args = parser.parse_args()
+
+    server = fake_gmail.start_server(fake_gmail.FakeGmail(messages=args.messages, latency_ms=args.latency_ms, seed=7))
+    os.environ["GMAIL_API_ROOT"] = f"http://127.0.0.1:{server.server_address[1]}/"
+    accounts = [account(f"inbox{i}@example.com") for i in range(args.accounts)]
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            # Warm up the client libraries so the first mode doesn't pay for their import
+            fresh_db(work_dir, "warmup")
+            timed_sync(accounts[:1], 1, 0)
+
+            singles = []
+            serial_stored = 0
+            fresh_db(work_dir, "serial")
+            for one in accounts:
+                elapsed, result = timed_sync([one], args.messages, args.calls_per_second)
+                singles.append(elapsed)
+                serial_stored += result["bnpl_count"]
+
+            fresh_db(work_dir, "concurrent")
+            concurrent, result = timed_sync(accounts, args.messages, args.calls_per_second)
+            resync, again = timed_sync(accounts, args.messages, args.calls_per_second)
+    finally:
+        server.shutdown()
+
+    assert result["bnpl_count"] == serial_stored, (result["bnpl_count"], serial_stored)
+    assert again["bnpl_count"] == 0, again
+
+    print(f"{args.accounts} accounts x {args.messages} messages, {args.latency_ms:g} ms per Gmail call")
+    print(f"  one after another: {sum(singles) * 1000:>8.0f} ms  (slowest account {max(singles) * 1000:.0f} ms)")
+    print(f"  concurrent:        {concurrent * 1000:>8.0f} ms  stored={result['bnpl_count']} "
+          f"folded={result['folded_count']}")
+    print(f"  re-sync:           {resync * 1000:>8.0f} ms  skipped={again['skipped_count']}")
+
+
+if __name__ == "__main__":
+    main()
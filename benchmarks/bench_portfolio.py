@@ -0,0 +1,148 @@
+"""
+Batch risk scoring benchmark: backend.portfolio (NumPy) vs looping
+finance.calculate_analysis over every user.
+
+Seeds a throwaway database with a corpus that includes the awkward cases
+(missing installments, zero amounts, placeholder/invalid due dates, dues
+on the window edges, paid records, users without a profile), checks that
+both paths agree exactly for every user, then reports timings.
+
+Usage:
+    python benchmarks/bench_portfolio.py --records 1000000 --users 100000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import models
+from backend import portfolio
+from backend.finance import calculate_analysis
+
+
+def due_date_for(rng, now):
+    """A due date string, biased towards the edges of the 30-day window"""
+    roll = rng.random()
+    if roll < 0.05:
+        return None
+    if roll < 0.08:
+        return "Due date mentioned"
+    if roll < 0.09:
+        return "31/02/2026"
+    offset = rng.choice([-1, 0, 1, 29, 30, 31]) if roll < 0.3 else rng.randint(-60, 120)
+    return (now + timedelta(days=offset)).strftime("%d/%m/%Y")
+
+
+def seed(n_records, n_users, now, seed_value=7):
+    rng = random.Random(seed_value)
+    conn = sqlite3.connect(models.DB_PATH)
+
+    conn.executemany("""
+        INSERT INTO bnpl_records (user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (
+            f"user{rng.randrange(n_users)}@example.com",
+            f"msg{i}",
+            "Simpl",
+            rng.choice([None, 0, round(rng.uniform(100, 90000), 2)]) if rng.random() < 0.05 else round(rng.uniform(100, 90000), 2),
+            rng.choice([None, 0, -1]) if rng.random() < 0.05 else rng.choice([1, 3, 6, 9, 12, 24]),
+            due_date_for(rng, now),
+            "EMI reminder",
+            "active" if rng.random() < 0.75 else "paid",
+            f"2026-{rng.randint(1, 9):02d}-{rng.randint(1, 28):02d} 10:00:00"
+        )
+        for i in range(n_records)
+    ))
+
+    # Most users have a profile; some don't (default salary), a few have salary 0
+    conn.executemany(
+        "INSERT INTO users (email, salary) VALUES (?, ?)",
+        (
+            (f"user{u}@example.com", 0 if rng.random() < 0.01 else rng.choice([15000, 30000, 52000.5, 120000]))
+            for u in range(n_users) if rng.random() < 0.9
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def scalar_scores(now):
+    """The reference: calculate_analysis per user over its record list"""
+    salaries = models.get_scoring_salaries()
+    by_user = defaultdict(list)
+    for record in models.get_bnpl_records():
+        by_user[record.user_email].append(record)
+    return {email: calculate_analysis(salaries[email], by_user[email], now=now) for email in salaries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    now = datetime.now()
+    models.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    models.init_db()
+    seed(args.records, args.users, now)
+
+    start = time.perf_counter()
+    salary_by_user = models.get_scoring_salaries()
+    users = list(salary_by_user)
+    salaries = [salary_by_user[email] for email in users]
+    rows = list(models.iter_active_record_columns())
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = portfolio.build_columns(rows, users)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = portfolio.score_columns(columns, salaries, now=now)
+    score_seconds = time.perf_counter() - start
+
+    vectorized = portfolio.to_analysis_dicts(users, salaries, scores)
+
+    start = time.perf_counter()
+    reference = scalar_scores(now)
+    scalar_seconds = time.perf_counter() - start
+
+    mismatches = [email for email in reference if reference[email] != vectorized.get(email)]
+
+    results = {
+        "records": args.records,
+        "users": len(users),
+        "active_records": len(rows),
+        "load_seconds": round(load_seconds, 3),
+        "build_columns_seconds": round(build_seconds, 3),
+        "vectorized_score_seconds": round(score_seconds, 4),
+        "scalar_seconds": round(scalar_seconds, 3),
+        "mismatched_users": len(mismatches),
+    }
+
+    for key, value in results.items():
+        print(f"{key:<26} {value}")
+    if score_seconds:
+        print(f"{'speedup (score only)':<26} {scalar_seconds / score_seconds:.0f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if mismatches:
+        print("First mismatch:", mismatches[0], reference[mismatches[0]], vectorized.get(mismatches[0]))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
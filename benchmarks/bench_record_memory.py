@@ -0,0 +1,153 @@
+"""
+Memory/CPU benchmark: per-row dicts (the old get_bnpl_records output)
+vs the BnplRecord tuples get_bnpl_records returns now.
+
+Usage:
+    python benchmarks/bench_record_memory.py --records 200000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import models
+from backend.finance import calculate_analysis
+
+
+def seed(n_records, n_users):
+    """Fill a throwaway database with synthetic records"""
+    rng = random.Random(42)
+    conn = sqlite3.connect(models.DB_PATH)
+    conn.executemany("""
+        INSERT INTO bnpl_records (user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (
+            f"user{i % n_users}@example.com",
+            f"msg{i}",
+            rng.choice(["Amazon Pay Later", "Simpl", "LazyPay", "Flipkart Pay Later"]),
+            round(rng.uniform(200, 50000), 2),
+            rng.choice([1, 3, 6, 9, 12]),
+            f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2026",
+            "Your EMI payment is due soon",
+            "active" if rng.random() < 0.7 else "paid"
+        )
+        for i in range(n_records)
+    ))
+    conn.commit()
+    conn.close()
+
+
+def load_as_dicts():
+    """The pre-BnplRecord loader: nine-key dict per row"""
+    conn = sqlite3.connect(models.DB_PATH)
+    rows = conn.execute("""
+        SELECT id, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at
+        FROM bnpl_records ORDER BY created_at DESC, id DESC
+    """).fetchall()
+    conn.close()
+    return [
+        {
+            "id": row[0],
+            "gmail_message_id": row[1],
+            "vendor": row[2],
+            "amount": row[3],
+            "installments": row[4],
+            "due_date": row[5],
+            "email_subject": row[6],
+            "status": row[7],
+            "created_at": row[8]
+        }
+        for row in rows
+    ]
+
+
+def load_as_records():
+    return models.get_bnpl_records()
+
+
+def measure(loader, repeats=3):
+    """Return (records, best seconds, retained bytes, peak bytes) for a loader"""
+    # Timing runs without tracemalloc, which would skew allocation-heavy code
+    elapsed = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        records = loader()
+        elapsed = min(elapsed, time.perf_counter() - start)
+        del records
+
+    tracemalloc.start()
+    records = loader()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, elapsed, retained, peak
+
+
+def container_bytes(records):
+    """Memory held by the per-row containers alone (excluding the field values)"""
+    return sum(sys.getsizeof(record) for record in records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    models.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    models.init_db()
+    seed(args.records, args.users)
+
+    results = {"records": args.records}
+
+    dicts, dict_time, dict_retained, dict_peak = measure(load_as_dicts)
+    dict_containers = container_bytes(dicts)
+    del dicts
+    records, rec_time, rec_retained, rec_peak = measure(load_as_records)
+    rec_containers = container_bytes(records)
+
+    start = time.perf_counter()
+    calculate_analysis(30000, records)
+    results["analysis_seconds"] = round(time.perf_counter() - start, 4)
+
+    start = time.perf_counter()
+    json.dumps([record.as_dict() for record in records])
+    results["serialize_seconds"] = round(time.perf_counter() - start, 4)
+
+    results["dict"] = {
+        "load_seconds": round(dict_time, 4),
+        "retained_mb": round(dict_retained / 1e6, 1),
+        "peak_mb": round(dict_peak / 1e6, 1),
+        "container_mb": round(dict_containers / 1e6, 1)
+    }
+    results["bnpl_record"] = {
+        "load_seconds": round(rec_time, 4),
+        "retained_mb": round(rec_retained / 1e6, 1),
+        "peak_mb": round(rec_peak / 1e6, 1),
+        "container_mb": round(rec_containers / 1e6, 1)
+    }
+    results["memory_ratio"] = round(dict_retained / rec_retained, 2) if rec_retained else None
+    results["container_ratio"] = round(dict_containers / rec_containers, 2) if rec_containers else None
+
+    print(f"{'loader':<12} {'load s':>8} {'retained MB':>12} {'peak MB':>9} {'container MB':>13}")
+    for name in ("dict", "bnpl_record"):
+        r = results[name]
+        print(f"{name:<12} {r['load_seconds']:>8} {r['retained_mb']:>12} {r['peak_mb']:>9} {r['container_mb']:>13}")
+    print(f"dict / BnplRecord: {results['memory_ratio']}x total, {results['container_ratio']}x per-row container")
+    print(f"calculate_analysis over {args.records} records: {results['analysis_seconds']}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
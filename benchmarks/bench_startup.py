@@ -0,0 +1,159 @@
+"""
+Cold start benchmark: how long a fresh process takes to import the app,
+build it with create_app() and answer its first request.
+
+Each run is a new interpreter against a throwaway database (migrated on
+the first run, already current after that, as in a redeployed worker).
+Also reports what the lazily imported modules cost when a worker first
+needs them, and optionally the time until a real gunicorn worker answers
+/api/health.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --gunicorn --json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child: phase timings as JSON on stdout
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from backend import models
+models.DB_PATH = sys.argv[1]
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get("/api/health")
+answered = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_response_ms": (answered - created) * 1000,
+    "total_ms": (answered - started) * 1000,
+}))
+"""
+
+# Modules the app defers until a route or command needs them
+DEFERRED_MODULES = {
+    "google_client": "import googleapiclient.discovery, google_auth_oauthlib.flow, google.oauth2.credentials",
+    "simulation": "import backend.simulation",
+    "scoring": "import backend.scoring",
+}
+
+
+def run_child(db_path):
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, db_path],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    timings = json.loads(out.stdout.strip().splitlines()[-1])
+    timings["process_ms"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def deferred_cost(statement):
+    """Milliseconds a process spends on `statement` after the app is already imported"""
+    code = f"import app, time; t = time.perf_counter(); {statement}; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_first_response(work_dir, timeout=30):
+    """Milliseconds from spawning gunicorn until /api/health returns 200"""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", "1",
+         "--pythonpath", REPO_ROOT, "--chdir", work_dir, "app:create_app()"],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("gunicorn did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summarize(samples):
+    return {
+        "median": round(statistics.median(samples), 1),
+        "min": round(min(samples), 1),
+        "max": round(max(samples), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--gunicorn", action="store_true", help="Also time a real gunicorn worker's first response")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, "database"))
+        db_path = os.path.join(work_dir, "database", "bnpl.db")
+
+        migrate = run_child(db_path)
+        runs = [run_child(db_path) for _ in range(args.runs)]
+
+        report = {
+            "runs": args.runs,
+            "first_run_with_migration_ms": round(migrate["total_ms"], 1),
+        }
+        for phase in ("import_ms", "create_app_ms", "first_response_ms", "total_ms", "process_ms"):
+            report[phase] = summarize([r[phase] for r in runs])
+        report["deferred_import_ms"] = {
+            name: round(statistics.median(deferred_cost(stmt) for _ in range(3)), 1)
+            for name, stmt in DEFERRED_MODULES.items()
+        }
+        if args.gunicorn:
+            report["gunicorn_first_response_ms"] = summarize(
+                [gunicorn_first_response(work_dir) for _ in range(max(1, args.runs // 2))]
+            )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Cold start over {args.runs} fresh processes (median, min-max):")
+    for phase in ("import_ms", "create_app_ms", "first_response_ms", "total_ms", "process_ms"):
+        stats = report[phase]
+        print(f"  {phase:<20} {stats['median']:>8.1f}  ({stats['min']:.1f}-{stats['max']:.1f})")
+    print(f"  first run (migrates schema): {report['first_run_with_migration_ms']:.1f} ms")
+    if args.gunicorn:
+        stats = report["gunicorn_first_response_ms"]
+        print(f"  gunicorn spawn -> first 200: {stats['median']:.1f} ms ({stats['min']:.1f}-{stats['max']:.1f})")
+    print("Paid later, on first use:")
+    for name, ms in report["deferred_import_ms"].items():
+        print(f"  {name:<20} {ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
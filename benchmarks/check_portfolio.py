@@ -0,0 +1,76 @@
+"""
+Regression check for batch scoring: runs the score-users job
+(backend.scoring, on the vectorized backend.portfolio engine) over a small
+seeded corpus and compares every user's stored score with
+finance.calculate_analysis. Exits non-zero on any mismatch.
+
+Uses the same awkward-case corpus as bench_portfolio.py, small enough to
+run in a few seconds, with a chunk size that puts users on chunk edges.
+
+Usage:
+    python benchmarks/check_portfolio.py --records 20000 --users 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import models
+from backend.scoring import run_batch_scoring
+from bench_portfolio import seed, scalar_scores
+
+
+def stored_scores():
+    """user_scores rows, rounded the way calculate_analysis rounds"""
+    conn = sqlite3.connect(models.DB_PATH)
+    rows = conn.execute("""
+        SELECT user_email, total_outstanding, monthly_obligation, upcoming_dues, debt_ratio,
+               risk_score, risk_level, transaction_count, salary
+        FROM user_scores
+    """).fetchall()
+    conn.close()
+    return {
+        email: {
+            "total_outstanding": round(total, 2),
+            "monthly_obligation": round(monthly, 2),
+            "upcoming_dues": round(upcoming, 2),
+            "debt_ratio": round(ratio, 4),
+            "risk_score": risk_score,
+            "risk_level": risk_level,
+            "transaction_count": count,
+            "salary": salary
+        }
+        for email, total, monthly, upcoming, ratio, risk_score, risk_level, count, salary in rows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--chunk-users", type=int, default=97)
+    args = parser.parse_args()
+
+    now = datetime.now()
+    models.DB_PATH = os.path.join(tempfile.mkdtemp(), "check.db")
+    models.init_db()
+    seed(args.records, args.users, now)
+
+    run_batch_scoring(chunk_users=args.chunk_users, resume=False, now=now)
+    batch = stored_scores()
+    reference = scalar_scores(now)
+
+    mismatches = [email for email in reference.keys() | batch.keys() if reference.get(email) != batch.get(email)]
+    print(f"{len(reference)} users, {len(mismatches)} mismatched")
+    if mismatches:
+        email = sorted(mismatches)[0]
+        print("First mismatch:", email, reference.get(email), batch.get(email))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
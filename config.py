@@ -1,7 +1,53 @@
 import os
+from datetime import timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
+
+    # Paid records older than this many days move to the archive table
+    ARCHIVE_MIN_AGE_DAYS = int(os.getenv("ARCHIVE_MIN_AGE_DAYS", "90"))
+    # Seconds between background compaction passes (0 disables the thread)
+    ARCHIVE_COMPACTION_INTERVAL = int(os.getenv("ARCHIVE_COMPACTION_INTERVAL", "0"))
+
+    # Process pool size for the repayment stress simulator (1 = in-process)
+    SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", "1"))
+
+    # Process pool size for parsing mailbox archives (1 = in-process), and the
+    # largest request body accepted (Flask answers 413 above it), i.e. uploads
+    # to /api/ingest/mailbox
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+    MAX_CONTENT_LENGTH = int(os.getenv("INGEST_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
+    # Gmail calls per second allowed per linked account during a sync (0 = unlimited)
+    GMAIL_ACCOUNT_CALLS_PER_SECOND = float(os.getenv("GMAIL_ACCOUNT_CALLS_PER_SECOND", "20"))
+
+    # Secret the stored Gmail credentials of linked accounts are encrypted
+    # with (unset = SECRET_KEY); changing it means linking accounts again
+    CREDENTIALS_KEY = os.getenv("CREDENTIALS_KEY")
+
+    # Logging: minimum level, "json" or "text", and DEBUG records allowed per message per second
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_DEBUG_RATE = int(os.getenv("LOG_DEBUG_RATE", "10"))
+
+    # Bearer token required by /api/metrics (unset = open, e.g. behind a private network)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # Request profiling: requests with "X-Profile: <token>" are profiled, and the
+    # same token (as a bearer token) opens /api/admin/profiles and switches
+    # per-user profiling on and off (/api/admin/profiled-users). Unset = off.
+    PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+    # Comma-separated user hashes (as in the logs) whose requests are always
+    # profiled, on top of those switched on through the admin API
+    PROFILE_USER_HASHES = [h.strip() for h in os.getenv("PROFILE_USER_HASHES", "").split(",") if h.strip()]
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    # Newest profiles kept on disk; older ones are deleted
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+    # Server-side sessions: days a session lives after its last write, and
+    # seconds each worker may serve one from its in-process cache
+    PERMANENT_SESSION_LIFETIME = timedelta(days=int(os.getenv("SESSION_LIFETIME_DAYS", "30")))
+    SESSION_CACHE_SECONDS = int(os.getenv("SESSION_CACHE_SECONDS", "30"))
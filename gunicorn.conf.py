@@ -0,0 +1,23 @@
+"""
+Gunicorn settings, loaded automatically from the working directory.
+
+Only the hooks needed for Prometheus multiprocess metrics live here; bind
+address, workers etc. keep coming from the command line / environment.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    """Start every master with an empty metrics directory so old workers' samples don't linger"""
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Let the multiprocess collector merge a dead worker's gauges correctly"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
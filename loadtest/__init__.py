@@ -0,0 +1,5 @@
+"""
+Offline load-test harness: a fake Gmail API (fake_gmail), a database
+seeder (seed), scenarios, and a runner that drives gunicorn and reports
+per-route latencies (run). See `python -m loadtest.run --help`.
+"""
@@ -0,0 +1,111 @@
+"""
+HTTP client side of the load test: authenticated sessions, a keep-alive
+client that times every request, and the latency report.
+"""
+import http.client
+import secrets
+import time
+from urllib.parse import urlsplit
+
+from flask.sessions import session_json_serializer
+
+from backend import models
+from backend.gmail_service import SCOPES
+from config import Config
+
+
+def create_session(user_email):
+    """
+    Store a signed-in session for user_email in models.DB_PATH (as
+    /auth/callback would) and return the Cookie header value for it.
+    The access token is the email itself, which the fake Gmail server maps
+    back to that user's mailbox.
+    """
+    sid = secrets.token_urlsafe(32)
+    models.save_session(sid, session_json_serializer.dumps({
+        "user_email": user_email,
+        "credentials": {
+            "token": user_email,
+            "refresh_token": "loadtest",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "client_id": "loadtest",
+            "client_secret": "loadtest",
+            "scopes": SCOPES,
+        },
+    }), time.time() + Config.PERMANENT_SESSION_LIFETIME.total_seconds())
+    return "session=" + sid
+
+
+class Client:
+    """One virtual user: a keep-alive connection and its own latency samples"""
+
+    def __init__(self, base_url, cookie):
+        url = urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port
+        self.cookie = cookie
+        self.samples = []  # (route, status, seconds)
+        self._conn = None
+
+    def request(self, method, path, route=None, headers=None, body=None):
+        """Send a request, record its latency under `route` (default: method + path); returns (status, headers, body)"""
+        all_headers = {"Cookie": self.cookie}
+        all_headers.update(headers or {})
+        route = route or f"{method} {path}"
+
+        started = time.perf_counter()
+        try:
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            self._conn.request(method, path, body=body, headers=all_headers)
+            response = self._conn.getresponse()
+            data = response.read()
+            status, response_headers = response.status, dict(response.getheaders())
+        except (OSError, http.client.HTTPException):
+            # Connection reset or timed out: count it as a failed request and reconnect next time
+            self.close()
+            status, response_headers, data = 0, {}, b""
+
+        self.samples.append((route, status, time.perf_counter() - started))
+        return status, response_headers, data
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _latency_stats(samples, elapsed):
+    latencies = sorted(seconds * 1000 for _, _, seconds in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, status, _ in samples if status == 0 or status >= 500),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+        "statuses": statuses,
+    }
+
+
+def latency_report(clients, elapsed):
+    """Throughput and p50/p95/p99 per route (and overall) over every client's samples"""
+    samples = [sample for client in clients for sample in client.samples]
+    by_route = {}
+    for sample in samples:
+        by_route.setdefault(sample[0], []).append(sample)
+    return {
+        "overall": _latency_stats(samples, elapsed),
+        "routes": {route: _latency_stats(route_samples, elapsed) for route, route_samples in sorted(by_route.items())},
+    }
@@ -0,0 +1,44 @@
+"""
+Compare two load-test result files route by route.
+
+Usage:
+    python -m loadtest.compare loadtest/results/mixed-A.json loadtest/results/mixed-B.json
+"""
+import argparse
+import json
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(before, after):
+    if before is None or after is None:
+        return "n/a"
+    if not before:
+        return f"{after}"
+    return f"{after} ({(after - before) / before * 100:+.1f}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["report"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["report"]
+
+    routes = sorted(set(baseline["routes"]) | set(candidate["routes"]))
+    rows = [(route, baseline["routes"].get(route), candidate["routes"].get(route)) for route in routes]
+    rows.append(("overall", baseline["overall"], candidate["overall"]))
+
+    for route, before, after in rows:
+        print(route)
+        for metric in METRICS:
+            print(f"  {metric:<15} {before.get(metric) if before else 'n/a'!s:>10} -> "
+                  f"{change(before.get(metric) if before else None, after.get(metric) if after else None)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+A local stand-in for the Gmail REST API, serving a synthetic mailbox.
+
+Implements the three calls the app makes (users.getProfile,
+users.messages.list and users.messages.get with format=full). The bearer
+token is taken as the user's email address, and each user gets a
+deterministic mailbox of --messages messages, a --bnpl-ratio share of which
+are BNPL reminders the parser accepts.
+
+Faults can be injected per request: added latency (--latency-ms plus up to
+--jitter-ms), 429 rate limiting (--rate-limit-ratio) and 500 errors
+(--error-ratio).
+
+Point the app at it with GMAIL_API_ROOT=http://127.0.0.1:<port>/
+
+Usage:
+    python -m loadtest.fake_gmail --port 8085 --messages 50 --latency-ms 40 --rate-limit-ratio 0.02
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+VENDORS = [
+    ("alerts@simpl.com", "Simpl"),
+    ("noreply@lazypay.in", "LazyPay"),
+    ("emi@hdfcbank.net", "HDFC Bank"),
+    ("statements@slicepay.in", "Slice"),
+    ("paylater@amazon.in", "Amazon Pay Later"),
+]
+
+PROMOTIONS = [
+    ("offers@shop.example", "Deal of the day: 60% off", "Limited time sale on bestsellers. Unsubscribe here."),
+    ("newsletter@news.example", "Your weekly digest", "Trending stories picked for you."),
+]
+
+MESSAGE_PATH = re.compile(r"^/gmail/v1/users/me/messages/([^/]+)$")
+
+
+def mailbox_for(user_email, messages, bnpl_ratio):
+    """Deterministic (message_id, payload) list for a user, newest first"""
+    user_seed = int(hashlib.sha1(user_email.encode("utf-8")).hexdigest()[:12], 16)
+    rng = random.Random(user_seed)
+    prefix = f"{user_seed:x}"[:8]
+    today = date.today()
+
+    mailbox = []
+    for k in range(messages):
+        message_id = f"{prefix}{k:06d}"
+        if rng.random() < bnpl_ratio:
+            sender, vendor = rng.choice(VENDORS)
+            amount = rng.randrange(500, 60000)
+            installments = rng.choice([1, 3, 6, 9, 12])
+            due = (today + timedelta(days=rng.randint(-10, 60))).strftime("%d/%m/%Y")
+            subject = f"{vendor} payment reminder: EMI due on {due}"
+            body = (f"Dear customer, amount due: ₹{amount:,}.00 on your {installments} EMIs plan. "
+                    f"Payment due on {due}. Please pay before the due date.")
+        else:
+            sender, subject, body = rng.choice(PROMOTIONS)
+        mailbox.append((message_id, _message_payload(message_id, sender, subject, body)))
+    return mailbox
+
+
+def _message_payload(message_id, sender, subject, body):
+    data = base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii")
+    return {
+        "id": message_id,
+        "threadId": message_id,
+        "payload": {
+            "mimeType": "multipart/alternative",
+            "headers": [{"name": "From", "value": sender}, {"name": "Subject", "value": subject}],
+            "parts": [{"mimeType": "text/plain", "body": {"size": len(body), "data": data}}],
+        },
+    }
+
+
+class FakeGmail:
+    """Mailbox settings, fault injection and per-call counters shared by the handler threads"""
+
+    def __init__(self, messages=50, bnpl_ratio=0.6, latency_ms=0, jitter_ms=0,
+                 rate_limit_ratio=0.0, error_ratio=0.0, seed=None):
+        self.messages = messages
+        self.bnpl_ratio = bnpl_ratio
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_ratio = rate_limit_ratio
+        self.error_ratio = error_ratio
+        self._rng = random.Random(seed)
+        self._mailboxes = {}
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def mailbox(self, user_email):
+        with self._lock:
+            if user_email not in self._mailboxes:
+                mailbox = mailbox_for(user_email, self.messages, self.bnpl_ratio)
+                self._mailboxes[user_email] = (mailbox, dict(mailbox))
+            return self._mailboxes[user_email]
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def inject(self):
+        """Sleep for the configured latency, then return an HTTP status to fail with (or None)"""
+        with self._lock:
+            delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+            roll = self._rng.random()
+        if delay:
+            time.sleep(delay / 1000)
+        if roll < self.rate_limit_ratio:
+            return 429
+        if roll < self.rate_limit_ratio + self.error_ratio:
+            return 500
+        return None
+
+
+class GmailHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        gmail = self.server.gmail
+        url = urlsplit(self.path)
+        auth = self.headers.get("Authorization", "")
+        if not auth.startswith("Bearer "):
+            return self._error(401, "Request had invalid authentication credentials.")
+        user_email = auth[len("Bearer "):]
+
+        if url.path == "/gmail/v1/users/me/profile":
+            call = "profile"
+        elif url.path == "/gmail/v1/users/me/messages":
+            call = "list"
+        elif MESSAGE_PATH.match(url.path):
+            call = "get"
+        else:
+            return self._error(404, "Not Found")
+
+        status = gmail.inject()
+        gmail.count(f"{call}:{status or 200}")
+        if status == 429:
+            return self._error(429, "Quota exceeded for quota metric 'Queries'.", retry_after=1)
+        if status:
+            return self._error(status, "Backend Error")
+
+        if call == "profile":
+            mailbox, _ = gmail.mailbox(user_email)
+            return self._json(200, {"emailAddress": user_email, "messagesTotal": len(mailbox)})
+
+        if call == "list":
+            params = parse_qs(url.query)
+            max_results = int(params.get("maxResults", ["100"])[0])
+            mailbox, _ = gmail.mailbox(user_email)
+            page = [{"id": message_id, "threadId": message_id} for message_id, _ in mailbox[:max_results]]
+            return self._json(200, {"messages": page, "resultSizeEstimate": len(page)})
+
+        _, by_id = gmail.mailbox(user_email)
+        message = by_id.get(MESSAGE_PATH.match(url.path).group(1))
+        if message is None:
+            return self._error(404, "Requested entity was not found.")
+        return self._json(200, message)
+
+    def _json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message, retry_after=None):
+        headers = {"Retry-After": str(retry_after)} if retry_after else None
+        self._json(status, {"error": {"code": status, "message": message}}, headers)
+
+
+def start_server(gmail, host="127.0.0.1", port=0):
+    """Serve `gmail` on a background thread; returns the server (server.server_address has the port)"""
+    server = ThreadingHTTPServer((host, port), GmailHandler)
+    server.daemon_threads = True
+    server.gmail = gmail
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--messages", type=int, default=50, help="Messages in each user's mailbox")
+    parser.add_argument("--bnpl-ratio", type=float, default=0.6, help="Share of messages that are BNPL reminders")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency per Gmail call")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Extra random latency, up to this much")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Share of Gmail calls answered with 429")
+    parser.add_argument("--error-ratio", type=float, default=0.0, help="Share of Gmail calls answered with 500")
+
+
+def from_arguments(args, seed=None):
+    return FakeGmail(
+        messages=args.messages, bnpl_ratio=args.bnpl_ratio, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, rate_limit_ratio=args.rate_limit_ratio,
+        error_ratio=args.error_ratio, seed=seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(from_arguments(args), args.host, args.port)
+    print(f"Fake Gmail API on http://{args.host}:{server.server_address[1]}/ (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
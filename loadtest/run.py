@@ -0,0 +1,182 @@
+"""
+Run a load-test scenario against gunicorn, end to end and offline.
+
+1. Seeds a throwaway database (loadtest.seed).
+2. Starts the fake Gmail server (loadtest.fake_gmail) in this process.
+3. Starts gunicorn "app:create_app()" with --workers/--threads, pointed
+   at both via the working directory and GMAIL_API_ROOT.
+4. Runs --concurrency virtual users, each signed in as its own seeded
+   user, looping the scenario for --duration seconds.
+5. Reports throughput and p50/p95/p99 per route and saves everything
+   (settings included) as JSON under loadtest/results/.
+
+Pass --url to target a server that is already running instead. Sessions
+for it are created in its database (--db), and it must already be pointed
+at a fake Gmail server (GMAIL_API_ROOT) for sync scenarios.
+
+Usage:
+    python -m loadtest.run --scenario mixed --workers 4 --concurrency 32 --duration 60
+    python -m loadtest.run --scenario sync --latency-ms 80 --rate-limit-ratio 0.05
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+from backend import models
+from loadtest import fake_gmail
+from loadtest.client import Client, create_session, latency_report
+from loadtest.scenarios import SCENARIOS
+from loadtest.seed import seed_database, user_email
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "loadtest", "results")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/api/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{base_url} did not come up within {timeout}s")
+
+
+def start_gunicorn(work_dir, port, workers, threads, env):
+    """gunicorn serving the repo's app with work_dir as its working directory (database/bnpl.db lives there)"""
+    log = open(os.path.join(work_dir, "gunicorn.log"), "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--threads", str(threads), "--timeout", "300",
+         "--pythonpath", REPO_ROOT, "--chdir", work_dir, "app:create_app()"],
+        cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def run_virtual_users(base_url, scenario, concurrency, users, duration, think_ms, seed):
+    """Loop `scenario` on `concurrency` threads for `duration` seconds; returns (clients, elapsed)"""
+    clients = [
+        Client(base_url, create_session(user_email(i % users)))
+        for i in range(concurrency)
+    ]
+    deadline = time.monotonic() + duration
+
+    def loop(index, client):
+        rng = random.Random(seed * 100003 + index)
+        state = {}
+        while time.monotonic() < deadline:
+            scenario(client, state, rng)
+            if think_ms:
+                time.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000)
+        client.close()
+
+    threads = [threading.Thread(target=loop, args=(i, client)) for i, client in enumerate(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients, time.monotonic() - started
+
+
+def print_report(result):
+    print(f"\n{result['scenario']}: {result['settings']['concurrency']} users, "
+          f"{result['settings']['workers']} worker(s) x {result['settings']['threads']} thread(s), "
+          f"{result['elapsed_s']}s")
+    print(f"{'route':<42} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    rows = list(result["report"]["routes"].items()) + [("overall", result["report"]["overall"])]
+    for route, stats in rows:
+        print(f"{route:<42} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+    if result.get("gmail_calls"):
+        print(f"Fake Gmail calls: {result['gmail_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users running at once")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run the scenario")
+    parser.add_argument("--think-ms", type=float, default=0, help="Average pause between iterations per user")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--users", type=int, default=200, help="Seeded users (virtual users cycle through them)")
+    parser.add_argument("--records", type=int, default=20000, help="Seeded BNPL records")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="Target an already running server instead of starting gunicorn")
+    parser.add_argument("--db", default=models.DB_PATH, help="Database of the --url server (sessions are created there)")
+    parser.add_argument("--out", help="Result file (default: loadtest/results/<scenario>-<timestamp>.json)")
+    fake_gmail.add_arguments(parser)
+    args = parser.parse_args()
+
+    gmail_server = None
+    gunicorn = None
+
+    with tempfile.TemporaryDirectory(prefix="bnpl-loadtest-") as work_dir:
+        try:
+            if args.url:
+                base_url = args.url.rstrip("/")
+                models.DB_PATH = args.db
+            else:
+                os.makedirs(os.path.join(work_dir, "database"))
+                seed_database(os.path.join(work_dir, "database", "bnpl.db"), args.users, args.records, args.seed)
+
+                gmail_server = fake_gmail.start_server(fake_gmail.from_arguments(args, seed=args.seed))
+                port = free_port()
+                base_url = f"http://127.0.0.1:{port}"
+                env = dict(
+                    os.environ,
+                    GMAIL_API_ROOT=f"http://127.0.0.1:{gmail_server.server_address[1]}/",
+                    LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"),
+                )
+                gunicorn = start_gunicorn(work_dir, port, args.workers, args.threads, env)
+            wait_until_up(base_url)
+
+            clients, elapsed = run_virtual_users(
+                base_url, SCENARIOS[args.scenario], args.concurrency,
+                args.users, args.duration, args.think_ms, args.seed
+            )
+        finally:
+            if gunicorn is not None:
+                gunicorn.terminate()
+                gunicorn.wait()
+            if gmail_server is not None:
+                gmail_server.shutdown()
+
+    result = {
+        "scenario": args.scenario,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("out", "db")},
+        "elapsed_s": round(elapsed, 2),
+        "report": latency_report(clients, elapsed),
+        "gmail_calls": dict(sorted(gmail_server.gmail.counts.items())) if gmail_server else None,
+    }
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{args.scenario}-{datetime.now():%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print_report(result)
+    print(f"Saved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Load-test scenarios. Each one is a function run in a loop by every virtual
+user: scenario(client, state, rng), where state is a per-user dict kept
+across iterations. Latencies are recorded by the client under a route
+label with ids collapsed, e.g. "PUT /api/bnpl/<id>/mark-paid".
+"""
+import json
+
+
+def sync(client, state, rng):
+    """A user pressing "Sync" over and over (the first run stores, later ones mostly skip)"""
+    client.request("GET", "/api/emails/sync")
+
+
+def dashboard(client, state, rng):
+    """
+    A dashboard tab polling like a browser: revalidates with the ETag it
+    last got, and now and then refreshes the side panels.
+    """
+    etags = state.setdefault("etags", {})
+    paths = ["/api/dashboard"]
+    if rng.random() < 0.3:
+        paths += ["/api/upcoming-dues", "/api/risk-score"]
+
+    for path in paths:
+        headers = {"If-None-Match": etags[path]} if path in etags else None
+        status, response_headers, _ = client.request("GET", path, headers=headers)
+        if status == 200 and response_headers.get("ETag"):
+            etags[path] = response_headers["ETag"]
+
+
+def _active_record_ids(client):
+    status, _, body = client.request("GET", "/api/bnpl/records?status=active&fields=id&limit=100",
+                                     route="GET /api/bnpl/records?status=active")
+    if status != 200:
+        return []
+    return [record["id"] for record in json.loads(body)["records"]]
+
+
+def mark_paid(client, state, rng):
+    """A mark-paid storm: the user pays off active records one after another, as fast as possible"""
+    if not state.get("pending"):
+        state["pending"] = _active_record_ids(client)
+        rng.shuffle(state["pending"])
+        if not state["pending"]:
+            return
+    record_id = state["pending"].pop()
+    client.request("PUT", f"/api/bnpl/{record_id}/mark-paid", route="PUT /api/bnpl/<id>/mark-paid")
+
+
+def mixed(client, state, rng):
+    """Mostly dashboard polling, with some payments and the occasional sync"""
+    roll = rng.random()
+    if roll < 0.7:
+        dashboard(client, state, rng)
+    elif roll < 0.95:
+        mark_paid(client, state, rng)
+    else:
+        sync(client, state, rng)
+
+
+SCENARIOS = {
+    "sync": sync,
+    "dashboard": dashboard,
+    "mark-paid": mark_paid,
+    "mixed": mixed,
+}
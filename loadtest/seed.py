@@ -0,0 +1,90 @@
+"""
+Fill a database with synthetic users and BNPL records for load tests.
+
+Users are user<i>@loadtest.local, each with a profile. Records are spread
+over the users with a mix of vendors, amounts, installment counts, active
+and paid statuses, and due dates around today. The per-user aggregates are
+rebuilt at the end, as `flask verify-aggregates --fix` would.
+
+Usage:
+    python -m loadtest.seed --users 1000 --records 50000 [--db database/bnpl.db]
+"""
+import argparse
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from backend import models
+
+VENDORS = ["Simpl", "LazyPay", "HDFC Bank", "Slice", "Amazon Pay Later", "ZestMoney"]
+
+# Rows per executemany batch
+SEED_BATCH_ROWS = 10000
+
+
+def user_email(index):
+    return f"user{index}@loadtest.local"
+
+
+def seed_database(db_path, users, records, seed=7):
+    """Create the schema at db_path (if needed) and add `users` users and `records` records"""
+    models.DB_PATH = db_path
+    models.init_db()
+    rng = random.Random(seed)
+    today = date.today()
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany("""
+        INSERT OR IGNORE INTO users (email, full_name, salary, monthly_rent, other_expenses, city)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (
+        (user_email(u), f"Load Test {u}", rng.choice([25000, 40000, 60000, 120000]),
+         rng.choice([0, 8000, 15000]), rng.choice([2000, 5000, 10000]), "Bengaluru")
+        for u in range(users)
+    ))
+
+    def rows(start, stop):
+        for i in range(start, stop):
+            status = "active" if rng.random() < 0.7 else "paid"
+            created = today - timedelta(days=rng.randint(0, 365))
+            yield (
+                user_email(rng.randrange(users)),
+                f"seed-{i}",
+                rng.choice(VENDORS),
+                float(rng.randrange(500, 60000)),
+                rng.choice([1, 3, 6, 9, 12]),
+                (today + timedelta(days=rng.randint(-30, 90))).strftime("%d/%m/%Y"),
+                "EMI reminder",
+                status,
+                f"{created.isoformat()} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+                f"{created.isoformat()} 12:00:00" if status == "paid" else None
+            )
+
+    for start in range(0, records, SEED_BATCH_ROWS):
+        conn.executemany("""
+            INSERT OR IGNORE INTO bnpl_records
+                (user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status, created_at, paid_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows(start, min(start + SEED_BATCH_ROWS, records)))
+        conn.commit()
+    conn.close()
+
+    models.verify_user_aggregates(fix=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--db", default=models.DB_PATH)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    seed_database(args.db, args.users, args.records, args.seed)
+    print(f"Seeded {args.users} users and {args.records} records into {args.db} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
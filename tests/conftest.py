@@ -0,0 +1,49 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import models
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SECRET_KEY = "test-secret"
+    LOG_LEVEL = "WARNING"
+    ARCHIVE_COMPACTION_INTERVAL = 0
+    PROFILING_TOKEN = None
+    PROFILE_USER_HASHES = []
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh database at the current schema"""
+    monkeypatch.setattr(models, "DB_PATH", str(tmp_path / "bnpl.db"))
+    models.init_db()
+    return models.DB_PATH
+
+
+@pytest.fixture
+def user_email():
+    # Per-user caches outlive a test's database, so every test gets its own user
+    return f"user-{uuid.uuid4().hex[:8]}@example.com"
+
+
+@pytest.fixture
+def app(db):
+    from app import create_app
+
+    return create_app(TestConfig)
+
+
+@pytest.fixture
+def client(app, user_email):
+    """Test client signed in as user_email"""
+    test_client = app.test_client()
+    with test_client.session_transaction() as session:
+        session["user_email"] = user_email
+    return test_client
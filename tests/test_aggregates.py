@@ -0,0 +1,100 @@
+import sqlite3
+
+from backend import models
+
+
+def record(gmail_message_id, amount, installments, due_date, vendor="Simpl"):
+    return {
+        "gmail_message_id": gmail_message_id, "vendor": vendor, "amount": amount,
+        "installments": installments, "due_date": due_date, "email_subject": f"{vendor} EMI"
+    }
+
+
+def record_ids(user_email):
+    conn = sqlite3.connect(models.DB_PATH)
+    ids = {row[1]: row[0] for row in conn.execute(
+        "SELECT id, gmail_message_id FROM bnpl_records WHERE user_email = ?", (user_email,)
+    )}
+    conn.close()
+    return ids
+
+
+def assert_aggregates(user_email, total, monthly, count, next_due):
+    assert models.verify_user_aggregates() == []
+    aggregates = models.get_user_aggregates(user_email)
+    assert round(aggregates["total_outstanding"], 2) == total
+    assert round(aggregates["monthly_obligation"], 2) == monthly
+    assert aggregates["active_count"] == count
+    assert aggregates["next_due_date"] == next_due
+
+
+def test_aggregates_follow_inserts_status_changes_archive_and_restore(db, user_email):
+    assert models.insert_bnpl_record(user_email, **record("m1", 1200.0, 3, "15/12/2030")) == "stored"
+    assert_aggregates(user_email, 1200.0, 400.0, 1, "2030-12-15")
+
+    counts = models.bulk_insert_bnpl_records(user_email, [
+        record("m2", 500.0, 1, "01/11/2030", vendor="LazyPay"),
+        record("m3", 900.0, 3, "20/01/2031", vendor="ZestMoney"),
+        record("m3", 900.0, 3, "20/01/2031", vendor="ZestMoney"),
+    ])
+    assert counts == {"stored": 2, "folded": 0, "duplicate": 1}
+    assert_aggregates(user_email, 2600.0, 1200.0, 3, "2030-11-01")
+    ids = record_ids(user_email)
+
+    models.update_bnpl_status(ids["m2"], "paid")
+    assert_aggregates(user_email, 2100.0, 700.0, 2, "2030-12-15")
+
+    # Repeating a status is a no-op for the aggregates
+    models.update_bnpl_status(ids["m2"], "paid")
+    assert_aggregates(user_email, 2100.0, 700.0, 2, "2030-12-15")
+
+    assert models.update_bnpl_statuses(user_email, [(ids["m1"], "paid"), (ids["m3"], "paid")]) == (
+        True, None, [ids["m1"], ids["m3"]]
+    )
+    assert_aggregates(user_email, 0, 0, 0, None)
+
+    # Age the paid records past the archive cutoff
+    conn = sqlite3.connect(models.DB_PATH)
+    conn.execute("UPDATE bnpl_records SET paid_at = datetime('now', '-10 days') WHERE user_email = ?", (user_email,))
+    conn.commit()
+    conn.close()
+    assert models.archive_paid_records(min_age_days=1) == 3
+    assert record_ids(user_email) == {}
+    assert_aggregates(user_email, 0, 0, 0, None)
+    assert models.get_bnpl_record_by_id(ids["m1"])["status"] == "paid"
+
+    # Reopening archived records moves them back into the hot table
+    models.update_bnpl_status(ids["m1"], "active")
+    assert record_ids(user_email) == {"m1": ids["m1"]}
+    assert_aggregates(user_email, 1200.0, 400.0, 1, "2030-12-15")
+
+    assert models.update_bnpl_statuses(user_email, [(ids["m2"], "active"), (ids["m3"], "active")])[0]
+    assert record_ids(user_email) == ids
+    assert_aggregates(user_email, 2600.0, 1200.0, 3, "2030-11-01")
+
+
+def test_update_bnpl_statuses_rejects_other_users_records(db, user_email):
+    models.bulk_insert_bnpl_records(user_email, [record("m1", 600.0, 2, "01/12/2030")])
+    models.bulk_insert_bnpl_records("other@example.com", [record("m1", 300.0, 1, "01/12/2030")])
+    mine, theirs = record_ids(user_email)["m1"], record_ids("other@example.com")["m1"]
+
+    assert models.update_bnpl_statuses(user_email, [(mine, "paid"), (theirs, "paid")]) == (False, "forbidden", [theirs])
+    assert models.update_bnpl_statuses(user_email, [(mine, "paid"), (theirs + 1000, "paid")]) == (
+        False, "not_found", [theirs + 1000]
+    )
+    assert_aggregates(user_email, 600.0, 300.0, 1, "2030-12-01")
+
+
+def test_verify_user_aggregates_reports_and_fixes_drift(db, user_email):
+    models.bulk_insert_bnpl_records(user_email, [record("m1", 600.0, 2, "01/12/2030")])
+
+    conn = sqlite3.connect(models.DB_PATH)
+    conn.execute("UPDATE user_aggregates SET total_outstanding = 1, active_count = 5 WHERE user_email = ?", (user_email,))
+    conn.commit()
+    conn.close()
+
+    drift = models.verify_user_aggregates(fix=True)
+    assert {(entry["field"], entry["expected"], entry["actual"]) for entry in drift} == {
+        ("total_outstanding", 600.0, 1.0), ("active_count", 1, 5)
+    }
+    assert_aggregates(user_email, 600.0, 300.0, 1, "2030-12-01")
@@ -0,0 +1,108 @@
+import sqlite3
+
+from app import encode_records_cursor, decode_records_cursor
+from backend import models
+
+
+def seed_records(user_email, count):
+    models.bulk_insert_bnpl_records(user_email, [
+        {
+            "gmail_message_id": f"m{i}", "vendor": "Simpl", "amount": 100.0 + i,
+            "installments": 1, "due_date": "01/12/2030", "email_subject": "EMI"
+        }
+        for i in range(count)
+    ])
+    # Pairs of records share a timestamp, so pages have to break ties on id
+    conn = sqlite3.connect(models.DB_PATH)
+    conn.execute(
+        "UPDATE bnpl_records SET created_at = datetime('2030-01-01', '+' || (id / 2) || ' hours') WHERE user_email = ?",
+        (user_email,)
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_records_cursor_round_trips():
+    cursor = encode_records_cursor({"created_at": "2030-01-01 10:00:00", "id": 42})
+    assert decode_records_cursor(cursor) == ("2030-01-01 10:00:00", 42)
+
+
+def test_keyset_pagination_visits_every_record_once(client, user_email):
+    seed_records(user_email, 7)
+    everything = client.get("/api/bnpl/records").get_json()
+    assert everything["count"] == 7
+    assert everything["next_cursor"] is None
+    expected = [record["id"] for record in everything["records"]]
+
+    seen = []
+    cursor = None
+    while True:
+        query = {"limit": 2}
+        if cursor:
+            query["cursor"] = cursor
+        page = client.get("/api/bnpl/records", query_string=query).get_json()
+        seen += [record["id"] for record in page["records"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        assert page["count"] == 2
+
+    assert seen == expected
+
+
+def test_paginated_fields_keep_the_cursor_columns(client, user_email):
+    seed_records(user_email, 3)
+    page = client.get("/api/bnpl/records", query_string={"limit": 2, "fields": "vendor"}).get_json()
+    assert set(page["records"][0]) == {"vendor", "id", "created_at"}
+
+    rest = client.get("/api/bnpl/records", query_string={"limit": 2, "cursor": page["next_cursor"]}).get_json()
+    assert rest["count"] == 1
+    assert rest["next_cursor"] is None
+
+
+def test_bad_cursor_is_rejected(client):
+    response = client.get("/api/bnpl/records", query_string={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_records_require_a_session(app):
+    response = app.test_client().get("/api/bnpl/records")
+    assert response.status_code == 401
+    assert "ETag" not in response.headers
+
+
+def test_etag_revalidation(client, user_email):
+    seed_records(user_email, 2)
+
+    first = client.get("/api/bnpl/records")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    unchanged = client.get("/api/bnpl/records", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["ETag"] == etag
+    assert unchanged.data == b""
+
+    # Different query params are a different resource
+    assert client.get("/api/bnpl/records?status=active", headers={"If-None-Match": etag}).status_code == 200
+
+    # Any write moves the user's data version on
+    models.insert_bnpl_record(user_email, "m-new", "LazyPay", 250.0, 1, "01/12/2030", "EMI")
+    changed = client.get("/api/bnpl/records", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.get_json()["count"] == 3
+
+
+def test_cached_body_is_replayed_until_a_write(client, user_email):
+    seed_records(user_email, 1)
+
+    first = client.get("/api/dashboard?fields=records")
+    assert first.status_code == 200
+    assert len(first.get_json()["records"]) == 1
+    assert client.get("/api/dashboard?fields=records").data == first.data
+
+    record_id = first.get_json()["records"][0]["id"]
+    models.update_bnpl_status(record_id, "paid")
+    assert client.get("/api/dashboard?fields=records").get_json()["records"] == []
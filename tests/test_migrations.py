@@ -0,0 +1,148 @@
+import sqlite3
+
+from backend import models
+
+
+def columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def create_v4_database(path):
+    """The message tables as schema version 4 left them, with some rows"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE bnpl_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT,
+            gmail_message_id TEXT,
+            vendor TEXT,
+            amount REAL,
+            installments INTEGER,
+            due_date TEXT,
+            email_subject TEXT,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            paid_at TIMESTAMP,
+            UNIQUE(user_email, gmail_message_id)
+        );
+        CREATE INDEX idx_bnpl_user_status ON bnpl_records(user_email, status);
+        CREATE TABLE bnpl_records_archive (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT,
+            gmail_message_id TEXT,
+            vendor TEXT,
+            amount REAL,
+            installments INTEGER,
+            due_date TEXT,
+            email_subject TEXT,
+            status TEXT DEFAULT 'paid',
+            created_at TIMESTAMP,
+            paid_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_email, gmail_message_id)
+        );
+        CREATE TABLE bnpl_folded_messages (
+            user_email TEXT NOT NULL,
+            gmail_message_id TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            folded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_email, gmail_message_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE linked_accounts (
+            user_email TEXT NOT NULL,
+            account_email TEXT NOT NULL,
+            credentials TEXT NOT NULL,
+            sync_cursor REAL,
+            linked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_synced_at TIMESTAMP,
+            PRIMARY KEY (user_email, account_email)
+        );
+
+        INSERT INTO bnpl_records (id, user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject)
+        VALUES (1, 'a@x.com', 'm1', 'Simpl', 1200, 3, '01/12/2030', 'EMI'),
+               (5, 'a@x.com', 'm5', 'LazyPay', 500, 1, '01/11/2030', 'EMI');
+        INSERT INTO bnpl_records_archive (id, user_email, gmail_message_id, vendor, amount, installments, due_date, email_subject, status)
+        VALUES (3, 'a@x.com', 'm3', 'ZestMoney', 900, 3, '01/10/2020', 'EMI', 'paid');
+        INSERT INTO bnpl_folded_messages (user_email, gmail_message_id, record_id) VALUES ('a@x.com', 'm2', 1);
+        INSERT INTO linked_accounts (user_email, account_email, credentials)
+        VALUES ('a@x.com', 'a@x.com', '{"token": "t", "refresh_token": "r"}');
+
+        PRAGMA user_version = 4;
+    """)
+    # A record with a higher id than any left was deleted; its id must never be reused
+    conn.execute("UPDATE sqlite_sequence SET seq = 9 WHERE name = 'bnpl_records'")
+    conn.commit()
+    conn.close()
+
+
+def test_init_db_creates_the_current_schema_once(db):
+    conn = sqlite3.connect(db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == models.SCHEMA_VERSION
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+    assert models.init_db() is False
+
+
+def test_v4_database_is_rebuilt_keyed_by_account(tmp_path, monkeypatch):
+    path = str(tmp_path / "v4.db")
+    create_v4_database(path)
+    monkeypatch.setattr(models, "DB_PATH", path)
+
+    assert models.init_db() is True
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == models.SCHEMA_VERSION
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    for table in ("bnpl_records", models.ARCHIVE_TABLE, "bnpl_folded_messages"):
+        assert "account_email" in columns(conn, table)
+        assert not [name for name in columns(conn, table) if name.endswith("_unkeyed")]
+
+    # Rows, ids and the id sequence survive the rebuild
+    assert conn.execute("SELECT id, account_email, gmail_message_id FROM bnpl_records ORDER BY id").fetchall() == [
+        (1, "", "m1"), (5, "", "m5")
+    ]
+    assert conn.execute(f"SELECT id, account_email FROM {models.ARCHIVE_TABLE}").fetchall() == [(3, "")]
+    assert conn.execute("SELECT account_email, gmail_message_id, record_id FROM bnpl_folded_messages").fetchall() == [
+        ("", "m2", 1)
+    ]
+    assert conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'bnpl_records'").fetchone()[0] == 9
+
+    # Indexes dropped with the old table are back
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_bnpl_user_status", "idx_bnpl_user_created", "idx_archive_user_created"} <= indexes
+
+    # Plaintext credentials are gone; aggregates were backfilled
+    assert conn.execute("SELECT credentials FROM linked_accounts").fetchone()[0] == ""
+    conn.close()
+    assert models.verify_user_aggregates() == []
+
+    # Unattributed message ids count as seen from every account
+    assert models.is_gmail_message_processed("a@x.com", "m1", "inbox@x.com")
+    assert models.is_gmail_message_processed("a@x.com", "m2", "inbox@x.com")
+    assert models.is_gmail_message_processed("a@x.com", "m3", "inbox@x.com")
+
+    # New message ids are scoped to their account
+    record = dict(vendor="Simpl", amount=300.0, installments=1, due_date="01/01/2031", email_subject="EMI")
+    assert models.insert_bnpl_record("a@x.com", "m9", account_email="one@x.com", **record) == "stored"
+    assert models.insert_bnpl_record("a@x.com", "m9", account_email="two@x.com", **record) == "stored"
+    assert models.insert_bnpl_record("a@x.com", "m9", account_email="two@x.com", **record) == "duplicate"
+
+    conn = sqlite3.connect(path)
+    new_ids = [row[0] for row in conn.execute("SELECT id FROM bnpl_records WHERE gmail_message_id = 'm9'")]
+    conn.close()
+    assert min(new_ids) > 9
+
+
+def test_rebuild_leaves_a_current_table_alone(db):
+    conn = sqlite3.connect(db)
+    conn.execute(
+        "INSERT INTO bnpl_records (user_email, account_email, gmail_message_id) VALUES ('a@x.com', 'b@x.com', 'm1')"
+    )
+    before = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'bnpl_records'").fetchone()
+
+    models._rebuild_keyed_by_account(conn.cursor(), "bnpl_records", models.RECORDS_TABLE_SQL)
+
+    assert conn.execute("SELECT sql FROM sqlite_master WHERE name = 'bnpl_records'").fetchone() == before
+    assert conn.execute("SELECT account_email, gmail_message_id FROM bnpl_records").fetchall() == [("b@x.com", "m1")]
+    conn.close()